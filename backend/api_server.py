@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import asyncio
 import json
+import logging
 import os
 from pathlib import Path
 from urllib.parse import quote
@@ -21,20 +22,31 @@ from backend.services import (
     batch_generate,
     build_prompt,
     clear_vectorstore,
+    delete_knowledge_source,
     delete_vectorstore_chapter,
     enrich,
     generate_architecture,
     generate_blueprint,
     generate_draft,
+    get_entity,
+    get_vectorstore_index,
     get_vectorstore_summary,
     import_knowledge,
+    list_entities,
+    list_knowledge_sources,
+    rebuild_entity_index,
+    register_entities,
+    replace_knowledge_source,
     run_consistency_check,
     save_upload_to_temp,
     finalize,
+    update_vectorstore_index,
 )
 from backend.task_runtime import TaskConflictError, TaskManager
 from novel_generator.common import normalize_chapter_text
-from embedding_adapters import create_embedding_adapter
+from novel_generator.entity_index import ENTITY_KINDS
+from novel_generator.llm_cache import clear_llm_cache, configure_llm_cache, get_llm_cache_stats
+from embedding_adapters import LOCAL_EMBEDDING_FORMATS, create_embedding_adapter
 from llm_adapters import create_llm_adapter
 from utils import read_file, save_string_to_txt
 
@@ -73,6 +85,7 @@ class BlueprintRequest(BaseModel):
     number_of_chapters: int
     user_guidance: Optional[str] = ""
     llm_config_name: Optional[str] = None
+    parallel_workers: Optional[int] = None
 
 
 class BuildPromptRequest(BaseModel):
@@ -86,10 +99,15 @@ class BuildPromptRequest(BaseModel):
     llm_config_name: Optional[str] = None
     embedding_config_name: Optional[str] = None
     retrieval_k: Optional[int] = None
+    retrieval_mode: Optional[str] = None
+    # 构建提示词默认重新生成（结果仍会保存供生成草稿复用）；显式传 true 时复用输入未变化的上次结果
+    reuse_artifacts: Optional[bool] = False
 
 
 class DraftRequest(BuildPromptRequest):
     custom_prompt_text: Optional[str] = None
+    # 生成草稿默认复用“构建提示词”保存的产物（输入与 LLM 配置均一致时）
+    reuse_artifacts: Optional[bool] = True
 
 
 class FinalizeRequest(BaseModel):
@@ -122,6 +140,7 @@ class BatchRequest(BaseModel):
     llm_config_name: Optional[str] = None
     embedding_config_name: Optional[str] = None
     retrieval_k: Optional[int] = None
+    retrieval_mode: Optional[str] = None
 
 
 class ConsistencyRequest(BaseModel):
@@ -133,6 +152,25 @@ class ConsistencyRequest(BaseModel):
     llm_config_name: Optional[str] = None
 
 
+class VectorIndexRequest(BaseModel):
+    mode: Optional[str] = None
+    M: Optional[int] = None
+    construction_ef: Optional[int] = None
+    search_ef: Optional[int] = None
+    num_threads: Optional[int] = None
+    batch_size: Optional[int] = None
+    sync_threshold: Optional[int] = None
+
+
+class EntityEntry(BaseModel):
+    name: str
+    kind: str = "character"
+
+
+class EntityRegisterRequest(BaseModel):
+    entities: list[EntityEntry] = Field(default_factory=list)
+
+
 class ConfigTestRequest(BaseModel):
     entry: Dict[str, Any] = Field(default_factory=dict)
     prompt: Optional[str] = None
@@ -150,6 +188,10 @@ app.add_middleware(
 project_store = ProjectStore()
 config_store = ConfigStore()
 task_manager = TaskManager()
+try:
+    configure_llm_cache(config_store.get_llm_cache_settings())
+except Exception as exc:  # 配置文件异常时保持缓存关闭，不影响启动
+    logging.warning(f"Failed to load LLM cache settings, response cache stays disabled: {exc}")
 CHAPTER_GENERATION_MUTEX_GROUP = "chapter_generation"
 ACCESS_KEY_HEADER_NAME = "x-access-key"
 ACCESS_KEY_QUERY_NAME = "access_key"
@@ -666,9 +708,11 @@ async def api_import_knowledge(
     contents = await file.read()
     temp_path = save_upload_to_temp(contents, suffix=os.path.splitext(file.filename or "")[1])
 
+    source_name = os.path.basename(file.filename or "") or None
+
     def runner(log):
         try:
-            return import_knowledge(project_root, temp_path, embedding_config, log)
+            return import_knowledge(project_root, temp_path, embedding_config, log, source_name=source_name)
         finally:
             try:
                 os.remove(temp_path)
@@ -679,6 +723,58 @@ async def api_import_knowledge(
     return TaskResponse(task_id=task_id)
 
 
+@app.get("/api/projects/{project_id}/knowledge/sources")
+def api_list_knowledge_sources(project_id: str) -> Dict[str, Any]:
+    """列出已导入的知识来源"""
+    project_root = _get_project_root(project_id)
+    return list_knowledge_sources(project_root)["result"]
+
+
+@app.put("/api/projects/{project_id}/knowledge/sources/{source_id}", response_model=TaskResponse)
+async def api_replace_knowledge_source(
+    project_id: str,
+    source_id: str,
+    file: UploadFile = File(...),
+    embedding_config_name: Optional[str] = Form(default=None),
+) -> TaskResponse:
+    """用新文件替换单个知识来源"""
+    project_root = _get_project_root(project_id)
+    embedding_config = _resolve_embedding_config(embedding_config_name)
+    contents = await file.read()
+    temp_path = save_upload_to_temp(contents, suffix=os.path.splitext(file.filename or "")[1])
+    source_name = os.path.basename(file.filename or "") or None
+
+    def runner(log):
+        try:
+            return replace_knowledge_source(
+                project_root, source_id, temp_path, embedding_config, log, source_name=source_name
+            )
+        finally:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    task_id = task_manager.create_task("knowledge_replace", runner)
+    return TaskResponse(task_id=task_id)
+
+
+@app.delete("/api/projects/{project_id}/knowledge/sources/{source_id}", response_model=TaskResponse)
+def api_delete_knowledge_source(
+    project_id: str,
+    source_id: str,
+    embedding_config_name: Optional[str] = None
+) -> TaskResponse:
+    """删除单个知识来源的全部向量文档"""
+    project_root = _get_project_root(project_id)
+    embedding_config = _resolve_embedding_config(embedding_config_name)
+    task_id = task_manager.create_task(
+        "knowledge_delete",
+        lambda log: delete_knowledge_source(project_root, source_id, embedding_config, log),
+    )
+    return TaskResponse(task_id=task_id)
+
+
 @app.post("/api/projects/{project_id}/vectorstore/clear", response_model=TaskResponse)
 def api_clear_vectorstore(project_id: str) -> TaskResponse:
     project_root = _get_project_root(project_id)
@@ -700,6 +796,30 @@ def api_get_vectorstore_summary(
     return get_vectorstore_summary(project_root, embedding_config, lambda msg: None)["result"]
 
 
+@app.get("/api/projects/{project_id}/vectorstore/index")
+def api_get_vectorstore_index(project_id: str) -> Dict[str, Any]:
+    """获取向量库索引配置"""
+    project_root = _get_project_root(project_id)
+    return get_vectorstore_index(project_root)["result"]
+
+
+@app.put("/api/projects/{project_id}/vectorstore/index", response_model=TaskResponse)
+def api_update_vectorstore_index(project_id: str, payload: VectorIndexRequest) -> TaskResponse:
+    """更新向量库索引配置（建图参数变化时后台重建索引）"""
+    project_root = _get_project_root(project_id)
+    options = payload.model_dump(exclude_none=True)
+    try:
+        task_id = task_manager.create_task(
+            "vectorstore_index",
+            lambda log: update_vectorstore_index(project_root, options, log),
+            project_id=project_id,
+            mutex_group=CHAPTER_GENERATION_MUTEX_GROUP,
+        )
+    except TaskConflictError as exc:
+        _raise_task_mutex_conflict(exc)
+    return TaskResponse(task_id=task_id)
+
+
 @app.delete("/api/projects/{project_id}/vectorstore/chapters/{chapter_number}", response_model=TaskResponse)
 def api_delete_vectorstore_chapter(
     project_id: str,
@@ -716,6 +836,46 @@ def api_delete_vectorstore_chapter(
     return TaskResponse(task_id=task_id)
 
 
+@app.get("/api/projects/{project_id}/entities")
+def api_list_entities(project_id: str, kind: Optional[str] = None) -> Dict[str, Any]:
+    """列出实体索引（角色/物品/地点）及出现统计，可按类型筛选"""
+    project_root = _get_project_root(project_id)
+    if kind and kind not in ENTITY_KINDS:
+        raise HTTPException(status_code=400, detail="Invalid entity kind.")
+    return list_entities(project_root, kind)["result"]
+
+
+@app.get("/api/projects/{project_id}/entities/{name}")
+def api_get_entity(project_id: str, name: str) -> Dict[str, Any]:
+    """获取实体出现的章节与位置（字符偏移）"""
+    project_root = _get_project_root(project_id)
+    entity = get_entity(project_root, name)["result"]
+    if entity is None:
+        raise HTTPException(status_code=404, detail="Entity not found.")
+    return entity
+
+
+@app.post("/api/projects/{project_id}/entities")
+def api_register_entities(project_id: str, payload: EntityRegisterRequest) -> Dict[str, Any]:
+    """手动登记实体，新实体回填已有章节的出现记录"""
+    project_root = _get_project_root(project_id)
+    entries = [entry.model_dump() for entry in payload.entities]
+    if any(entry["kind"] not in ENTITY_KINDS for entry in entries):
+        raise HTTPException(status_code=400, detail="Invalid entity kind.")
+    return register_entities(project_root, entries)["result"]
+
+
+@app.post("/api/projects/{project_id}/entities/rebuild", response_model=TaskResponse)
+def api_rebuild_entity_index(project_id: str) -> TaskResponse:
+    """按当前词表重新扫描全部章节，重建实体索引"""
+    project_root = _get_project_root(project_id)
+    task_id = task_manager.create_task(
+        "entity_index_rebuild",
+        lambda log: rebuild_entity_index(project_root, log),
+    )
+    return TaskResponse(task_id=task_id)
+
+
 @app.get("/api/config/llm")
 def get_llm_configs() -> Dict[str, Any]:
     return {"configs": config_store.get_llm_configs()}
@@ -829,7 +989,7 @@ def test_embedding_config(payload: ConfigTestRequest) -> Dict[str, Any]:
     api_key = str(entry.get("api_key", "")).strip()
     if not interface_format or not model_name:
         return {"ok": False, "message": "缺少 interface_format 或 model_name。"}
-    if not api_key:
+    if not api_key and interface_format.lower() not in LOCAL_EMBEDDING_FORMATS:
         return {"ok": False, "message": "缺少 api_key。"}
     try:
         adapter = create_embedding_adapter(
@@ -888,6 +1048,28 @@ def update_webdav_config(payload: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
     return {"ok": True}
 
 
+@app.get("/api/config/llm-cache")
+def get_llm_cache_config() -> Dict[str, Any]:
+    """获取 LLM 响应缓存配置与命中统计"""
+    return get_llm_cache_stats()
+
+
+@app.put("/api/config/llm-cache")
+def update_llm_cache_config(payload: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
+    """更新 LLM 响应缓存配置（enabled / purposes / ttl_seconds / max_size_mb / cache_dir）"""
+    settings = configure_llm_cache(payload)
+    config = config_store.load_raw()
+    config["llm_cache"] = settings
+    config_store.save(config)
+    return {"ok": True, "settings": settings}
+
+
+@app.post("/api/config/llm-cache/clear")
+def api_clear_llm_cache() -> Dict[str, Any]:
+    """清空 LLM 响应缓存"""
+    return {"ok": True, "deleted": clear_llm_cache()}
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -38,6 +38,10 @@ class ConfigStore:
     def get_choose_configs(self, *, apply_env: bool = False) -> Dict[str, str]:
         return self.load(apply_env=apply_env).get("choose_configs", {})
 
+    def get_llm_cache_settings(self, *, apply_env: bool = False) -> Dict[str, Any]:
+        settings = self.load(apply_env=apply_env).get("llm_cache", {})
+        return settings if isinstance(settings, dict) else {}
+
     def resolve_llm_config(self, purpose: str, name_override: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
         config = self.load(apply_env=True)
         llm_configs = config.get("llm_configs", {})
@@ -10,7 +10,7 @@ from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Dict, List
 
-from chapter_directory_parser import parse_chapter_blueprint
+from chapter_directory_parser import BLUEPRINT_FILE, load_blueprint_index
 from utils import read_file
 
 
@@ -56,14 +56,8 @@ def _list_chapter_numbers(project_root: str) -> List[int]:
 
 
 def _load_chapter_titles(project_root: str) -> Dict[int, str]:
-    directory_path = os.path.join(project_root, "Novel_directory.txt")
-    directory_text = read_file(directory_path).strip()
-    if not directory_text:
-        return {}
-
     chapter_titles: Dict[int, str] = {}
-    for item in parse_chapter_blueprint(directory_text):
-        chapter_number = int(item.get("chapter_number") or 0)
+    for chapter_number, item in load_blueprint_index(project_root).items():
         chapter_title = str(item.get("chapter_title") or "").strip()
         if chapter_number > 0 and chapter_title:
             chapter_titles[chapter_number] = chapter_title
@@ -71,6 +65,10 @@ def _load_chapter_titles(project_root: str) -> Dict[int, str]:
     if chapter_titles:
         return chapter_titles
 
+    directory_text = read_file(os.path.join(project_root, BLUEPRINT_FILE)).strip()
+    if not directory_text:
+        return {}
+
     # 回退策略：仅按“第X章 - 标题”提取。
     fallback_pattern = re.compile(r"^第\s*(\d+)\s*章\s*-\s*\[?(.*?)\]?\s*$", re.MULTILINE)
     for match in fallback_pattern.finditer(directory_text):
@@ -7,26 +7,39 @@ from typing import Any, Callable, Dict, List, Optional
 from consistency_checker import check_consistency
 from novel_generator.architecture import Novel_architecture_generate
 from novel_generator.blueprint import Chapter_blueprint_generate
-from novel_generator.chapter import build_chapter_prompt, generate_chapter_draft
+from novel_generator.chapter import build_chapter_prompt_artifacts, generate_chapter_draft
 from novel_generator.common import normalize_chapter_text, sleep_with_cancel
 from novel_generator.finalization import enrich_chapter_text, finalize_chapter
-from novel_generator.knowledge import import_knowledge_file
+from novel_generator.entity_index import EntityIndex, collect_store_entities, register_chapter_fields
+from novel_generator.knowledge import (
+    delete_knowledge_source as delete_kn_source,
+    import_knowledge_file,
+    list_knowledge_sources as list_kn_sources,
+    replace_knowledge_source as replace_kn_source,
+)
 from novel_generator.vectorstore_manager import (
+    apply_vector_index_options,
     delete_vectorstore_by_chapter,
     get_vectorstore_summary as get_vs_summary,
 )
-from novel_generator.vectorstore_utils import clear_vector_store
+from novel_generator.token_budget import resolve_context_window
+from novel_generator.vectorstore_utils import (
+    RETRIEVAL_MODES,
+    clear_vector_store,
+    load_vector_index_options,
+)
 from utils import read_file, save_string_to_txt
 
 from backend.file_keys import resolve_chapter_path
 from backend.task_runtime import TaskCancelledError
-from embedding_adapters import create_embedding_adapter
+from embedding_adapters import get_embedding_adapter
 
 
 DEFAULT_TEMPERATURE = 0.7
 DEFAULT_MAX_TOKENS = 2048
 DEFAULT_TIMEOUT = 900
 DEFAULT_RETRIEVAL_K = 2
+DEFAULT_RETRIEVAL_MODE = "vector"
 
 
 def _raise_if_cancelled(
@@ -59,6 +72,12 @@ def _resolve_retrieval_k(payload: Dict[str, Any], embedding_config: Dict[str, An
     return int(retrieval_k)
 
 
+def _resolve_retrieval_mode(payload: Dict[str, Any], embedding_config: Dict[str, Any]) -> str:
+    retrieval_mode = payload.get("retrieval_mode") or embedding_config.get("retrieval_mode")
+    retrieval_mode = str(retrieval_mode or DEFAULT_RETRIEVAL_MODE).strip().lower()
+    return retrieval_mode if retrieval_mode in RETRIEVAL_MODES else DEFAULT_RETRIEVAL_MODE
+
+
 def _common_llm_kwargs(
     llm_config: Dict[str, Any],
     *,
@@ -89,6 +108,8 @@ def _chapter_generation_kwargs(
     payload: Dict[str, Any],
     llm_config: Dict[str, Any],
     embedding_config: Dict[str, Any],
+    *,
+    reuse_artifacts_default: bool = True,
 ) -> Dict[str, Any]:
     return {
         **_common_llm_kwargs(llm_config),
@@ -102,6 +123,9 @@ def _chapter_generation_kwargs(
         "scene_location": payload.get("scene_location", ""),
         "time_constraint": payload.get("time_constraint", ""),
         "embedding_retrieval_k": _resolve_retrieval_k(payload, embedding_config),
+        "retrieval_mode": _resolve_retrieval_mode(payload, embedding_config),
+        "reuse_artifacts": bool(payload.get("reuse_artifacts", reuse_artifacts_default)),
+        "context_window": resolve_context_window(llm_config.get("context_window")),
     }
 
 
@@ -180,6 +204,8 @@ def generate_blueprint(
         temperature=llm_config.get("temperature", DEFAULT_TEMPERATURE),
         max_tokens=llm_config.get("max_tokens", 4096),
         timeout=llm_config.get("timeout", DEFAULT_TIMEOUT),
+        parallel_workers=int(payload.get("parallel_workers") or llm_config.get("blueprint_parallel_workers", 1)),
+        context_window=resolve_context_window(llm_config.get("context_window")),
     )
     log("Blueprint completed.")
     return {"output_files": ["directory"]}
@@ -196,16 +222,55 @@ def build_prompt(
     _raise_if_cancelled(should_cancel, log, message="提示词任务已取消。", with_interrupt_hint=True)
     log("Building chapter prompt...")
     try:
-        prompt_text = build_chapter_prompt(
-            **_chapter_generation_kwargs(project_root, payload, llm_config, embedding_config),
+        artifacts = build_chapter_prompt_artifacts(
+            **_chapter_generation_kwargs(
+                project_root, payload, llm_config, embedding_config, reuse_artifacts_default=False
+            ),
             should_cancel=should_cancel,
         )
     except TaskCancelledError:
         log("取消已接收，正在中断模型调用。")
         raise
     _raise_if_cancelled(should_cancel, log, message="提示词任务已取消。", with_interrupt_hint=True)
+    if artifacts["reused"]:
+        log("Reused prompt artifacts from a previous build with identical inputs.")
+    timings = artifacts.get("timings", {})
+    if timings:
+        log("Prompt stage timings: " + ", ".join(f"{name}={seconds}s" for name, seconds in timings.items()))
+    token_budget = artifacts.get("token_budget") or {}
+    if token_budget:
+        log(
+            f"Prompt tokens: {token_budget['prompt_tokens']} / input budget {token_budget['input_budget']}"
+            + (f", trimmed: {', '.join(token_budget['trimmed'])}" if token_budget["trimmed"] else "")
+        )
     log("Prompt ready.")
-    return {"result": {"prompt_text": prompt_text}}
+    return {
+        "result": {
+            "prompt_text": artifacts["prompt_text"],
+            "short_summary": artifacts["short_summary"],
+            "keyword_groups": artifacts["keyword_groups"],
+            "filtered_context": artifacts["filtered_context"],
+            "reused": artifacts["reused"],
+            "timings": timings,
+            "token_budget": token_budget,
+        }
+    }
+
+
+def _register_chapter_entities(project_root: str, payload: Dict[str, Any], log) -> None:
+    """把本章填写的出场角色/关键道具/场景地点登记到实体索引（新实体回填已有章节），失败不影响草稿"""
+    try:
+        added = register_chapter_fields(
+            project_root,
+            payload.get("characters_involved", ""),
+            payload.get("key_items", ""),
+            payload.get("scene_location", ""),
+        )
+    except Exception as exc:
+        log(f"Failed to register chapter entities: {exc}")
+        return
+    if added:
+        log(f"Registered {len(added)} new entities: {', '.join(added)}")
 
 
 def generate_draft(
@@ -232,6 +297,7 @@ def generate_draft(
     chapter_path = resolve_chapter_path(project_root, int(payload["novel_number"]))
     os.makedirs(os.path.dirname(chapter_path), exist_ok=True)
     save_string_to_txt(normalize_chapter_text(chapter_text), chapter_path)
+    _register_chapter_entities(project_root, payload, log)
     log("Draft completed.")
     return {
         "result": {"chapter_text": chapter_text},
@@ -318,6 +384,7 @@ def batch_generate(
         "time_constraint": payload.get("time_constraint", ""),
         "user_guidance": payload.get("user_guidance", ""),
         "retrieval_k": _resolve_retrieval_k(payload, embedding_config),
+        "retrieval_mode": _resolve_retrieval_mode(payload, embedding_config),
     }
     results: List[Dict[str, Any]] = []
 
@@ -440,18 +507,70 @@ def import_knowledge(
     temp_path: str,
     embedding_config: Dict[str, Any],
     log,
+    source_name: Optional[str] = None,
 ) -> Dict[str, Any]:
     log("Importing knowledge file...")
-    import_knowledge_file(
+    result = import_knowledge_file(
         embedding_api_key=embedding_config["api_key"],
         embedding_url=embedding_config["base_url"],
         embedding_interface_format=embedding_config["interface_format"],
         embedding_model_name=embedding_config["model_name"],
         file_path=temp_path,
         filepath=project_root,
+        progress_callback=log,
+        source_name=source_name,
     )
     log("Knowledge import completed.")
-    return {"output_files": ["vectorstore"]}
+    return {"result": result, "output_files": ["vectorstore"]}
+
+
+def list_knowledge_sources(project_root: str) -> Dict[str, Any]:
+    """列出已导入的知识来源"""
+    return {"result": {"sources": list_kn_sources(project_root)}}
+
+
+def delete_knowledge_source(
+    project_root: str,
+    source_id: str,
+    embedding_config: Dict[str, Any],
+    log,
+) -> Dict[str, Any]:
+    """删除单个知识来源的全部向量文档"""
+    log(f"Deleting knowledge source {source_id} from vectorstore...")
+    embedding_adapter = get_embedding_adapter(
+        embedding_config["interface_format"],
+        embedding_config["api_key"],
+        embedding_config["base_url"],
+        embedding_config["model_name"],
+    )
+    deleted_count = delete_kn_source(embedding_adapter, project_root, source_id)
+    log(f"Deleted {deleted_count} documents for knowledge source {source_id}.")
+    return {"result": {"deleted_count": deleted_count}, "output_files": ["vectorstore"]}
+
+
+def replace_knowledge_source(
+    project_root: str,
+    source_id: str,
+    temp_path: str,
+    embedding_config: Dict[str, Any],
+    log,
+    source_name: Optional[str] = None,
+) -> Dict[str, Any]:
+    """用新文件替换单个知识来源"""
+    log(f"Replacing knowledge source {source_id}...")
+    result = replace_kn_source(
+        embedding_api_key=embedding_config["api_key"],
+        embedding_url=embedding_config["base_url"],
+        embedding_interface_format=embedding_config["interface_format"],
+        embedding_model_name=embedding_config["model_name"],
+        source_id=source_id,
+        file_path=temp_path,
+        filepath=project_root,
+        progress_callback=log,
+        source_name=source_name,
+    )
+    log("Knowledge source replaced.")
+    return {"result": result, "output_files": ["vectorstore"]}
 
 
 def clear_vectorstore(project_root: str, log) -> Dict[str, Any]:
@@ -476,7 +595,7 @@ def get_vectorstore_summary(
 ) -> Dict[str, Any]:
     """获取向量库摘要，按来源分组统计"""
     log("Getting vectorstore summary...")
-    embedding_adapter = create_embedding_adapter(
+    embedding_adapter = get_embedding_adapter(
         embedding_config["interface_format"],
         embedding_config["api_key"],
         embedding_config["base_url"],
@@ -495,7 +614,7 @@ def delete_vectorstore_chapter(
 ) -> Dict[str, Any]:
     """删除指定章节的所有向量文档"""
     log(f"Deleting chapter {chapter_number} from vectorstore...")
-    embedding_adapter = create_embedding_adapter(
+    embedding_adapter = get_embedding_adapter(
         embedding_config["interface_format"],
         embedding_config["api_key"],
         embedding_config["base_url"],
@@ -504,3 +623,53 @@ def delete_vectorstore_chapter(
     deleted_count = delete_vectorstore_by_chapter(embedding_adapter, project_root, chapter_number)
     log(f"Deleted {deleted_count} documents for chapter {chapter_number}.")
     return {"result": {"deleted_count": deleted_count}}
+
+
+def get_vectorstore_index(project_root: str) -> Dict[str, Any]:
+    """获取项目向量库的索引配置"""
+    return {"result": {"options": load_vector_index_options(project_root)}}
+
+
+def update_vectorstore_index(
+    project_root: str,
+    options: Dict[str, Any],
+    log,
+) -> Dict[str, Any]:
+    """保存索引配置，必要时在后台任务中重建向量索引"""
+    log("Applying vectorstore index options...")
+    report = apply_vector_index_options(project_root, options, progress_callback=log)
+    if report["rebuilt"]:
+        log(f"Vector index rebuilt with {report['documents']} documents.")
+    else:
+        log("Vector index options applied.")
+    return {"result": report, "output_files": ["vectorstore"]}
+
+
+def list_entities(project_root: str, kind: Optional[str] = None) -> Dict[str, Any]:
+    """列出实体索引中的角色/物品/地点及出现统计"""
+    return {"result": {"entities": EntityIndex(project_root).list_entities(kind)}}
+
+
+def get_entity(project_root: str, name: str) -> Dict[str, Any]:
+    """获取单个实体的全部出现位置，未登记时 result 为 None"""
+    return {"result": EntityIndex(project_root).get_entity(name)}
+
+
+def register_entities(project_root: str, entries: List[Dict[str, str]]) -> Dict[str, Any]:
+    """手动登记实体（以手动指定的类型为准），新实体回填已有章节"""
+    added = EntityIndex(project_root).register(
+        [(entry["name"], entry["kind"]) for entry in entries],
+        source="manual",
+        overwrite=True,
+    )
+    return {"result": {"added": added}}
+
+
+def rebuild_entity_index(project_root: str, log) -> Dict[str, Any]:
+    """从角色状态补登实体后，按词表重新扫描全部章节"""
+    log("Rebuilding entity index...")
+    index = EntityIndex(project_root)
+    added = index.register(collect_store_entities(project_root), source="character_state")
+    report = index.rebuild()
+    log(f"Entity index rebuilt: {report['chapters']} chapters, {report['mentions']} mentions.")
+    return {"result": {**report, "new_entities": len(added)}}
@@ -1,6 +1,144 @@
 # chapter_blueprint_parser.py
 # -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import os
 import re
+import threading
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple, Union
+
+BLUEPRINT_FILE = "Novel_directory.txt"
+# 结构化蓝图索引，与 Novel_directory.txt 同目录，按源文件 mtime/size 失效
+BLUEPRINT_INDEX_FILE = "Novel_directory.index.json"
+
+_index_cache: Dict[str, tuple] = {}
+_index_lock = threading.Lock()
+
+# 单一组合模式（按 UTF-8 字节匹配，直接得到字节偏移）：章节标题行或任一字段行。
+# 兼容是否使用方括号包裹，例如：
+#   第1章 - 紫极光下的预兆
+#   第1章 - [紫极光下的预兆]
+#   本章定位：[角色/事件/主题]
+_BLUEPRINT_LINE_PATTERN = re.compile(
+    (
+        '^(?:[ \t]|\u3000|\ufeff)*(?:'
+        r'第[ \t]*(?P<number>\d+)[ \t]*章[ \t]*(?:-|–|—)(?P<title>[^\r\n]*)'
+        r'|(?P<label>本章定位|核心作用|悬念密度|伏笔操作|认知颠覆|本章简述)[ \t]*(?:：|:)(?P<value>[^\r\n]*)'
+        r')\r?$'
+    ).encode("utf-8"),
+    re.MULTILINE,
+)
+_FIELD_KEYS = {
+    "本章定位".encode("utf-8"): "chapter_role",
+    "核心作用".encode("utf-8"): "chapter_purpose",
+    "悬念密度".encode("utf-8"): "suspense_level",
+    "伏笔操作".encode("utf-8"): "foreshadowing",
+    "认知颠覆".encode("utf-8"): "plot_twist_level",
+    "本章简述".encode("utf-8"): "chapter_summary",
+}
+# 宽松的章节标题行（仅用于定位已有目录写到第几章）：允许 Markdown 标题/加粗/引用/列表前缀，
+# 章号后可接 - – — ： : 或空白，例如“### 第1章 - A”“**第1章 - A**”“第1章：A”
+_LENIENT_HEADER_PATTERN = re.compile(
+    (
+        '^(?:[ \t#*>•·-]|\u3000|\ufeff)*'
+        r'第[ \t]*(\d+)[ \t]*章(?:[ \t]|-|–|—|：|:|\*|\r?$)'
+    ).encode("utf-8"),
+    re.MULTILINE,
+)
+# 流式读取时每次读入的字节数（按换行对齐后再匹配）
+_STREAM_BLOCK_SIZE = 1 << 20
+# 追加前记录文件末尾这么多字节的摘要，恢复时据此确认文件未被改动
+_PENDING_TAIL_BYTES = 4096
+
+
+def _decode_value(raw: bytes) -> str:
+    value = raw.decode("utf-8", errors="replace").strip()
+    if value[:1] != "[" and value[-1:] != "]":
+        return value
+    if value[:1] == "[":
+        value = value[1:-1] if value[-1:] == "]" else value[1:]
+    elif "[" not in value:
+        value = value[:-1]
+    return value.strip()
+
+
+def _iter_blocks(source) -> Iterator[bytes]:
+    if isinstance(source, str):
+        yield source.encode("utf-8")
+        return
+    if isinstance(source, (bytes, bytearray)):
+        yield bytes(source)
+        return
+    pending = b""
+    while True:
+        block = source.read(_STREAM_BLOCK_SIZE)
+        if not block:
+            break
+        block = pending + block
+        cut = block.rfind(b"\n") + 1
+        if cut == 0:
+            pending = block
+            continue
+        yield block[:cut]
+        pending = block[cut:]
+    if pending:
+        yield pending
+
+
+def iter_chapter_blueprint(source: Union[str, bytes, BinaryIO], with_offsets: bool = True) -> Iterator[dict]:
+    """
+    单遍扫描章节蓝图，按出现顺序逐章产出 dict（字段同 parse_chapter_blueprint），
+    with_offsets 为 True 时另含 byte_start/byte_end：该章在 UTF-8 源文件中的字节区间，可用于随机读取。
+    source 可以是文本、字节串，或以二进制模式打开的文件（按块流式读取）。
+    章节标题行可出现在任意位置（不要求前有空行）；标题行之前的内容与无法识别的行被忽略。
+    """
+    current: Optional[dict] = None
+    base = 0
+    for block in _iter_blocks(source):
+        for match in _BLUEPRINT_LINE_PATTERN.finditer(block):
+            number, title, label, value = match.groups()
+            if number is not None:
+                if current is not None:
+                    yield current
+                current = {
+                    "chapter_number": int(number),
+                    "chapter_title": _decode_value(title),
+                    "chapter_role": "",
+                    "chapter_purpose": "",
+                    "suspense_level": "",
+                    "foreshadowing": "",
+                    "plot_twist_level": "",
+                    "chapter_summary": "",
+                }
+                if with_offsets:
+                    current["byte_start"] = base + match.start()
+                    current["byte_end"] = base + match.end()
+            elif current is not None:
+                current[_FIELD_KEYS[label]] = _decode_value(value)
+                if with_offsets:
+                    current["byte_end"] = base + match.end()
+        base += len(block)
+    if current is not None:
+        yield current
+
+
+def iter_lenient_headers(source: Union[str, bytes, BinaryIO]) -> Iterator[Tuple[int, int]]:
+    """按宽松的标题格式扫描蓝图，逐个产出 (章号, 标题行在 UTF-8 源中的字节偏移)。"""
+    base = 0
+    for block in _iter_blocks(source):
+        for match in _LENIENT_HEADER_PATTERN.finditer(block):
+            yield int(match.group(1)), base + match.start()
+        base += len(block)
+
+
+def max_chapter_number_lenient(source: Union[str, bytes, BinaryIO]) -> int:
+    """
+    按宽松的标题格式扫描蓝图，返回出现过的最大章号（无章节时为 0）。
+    用于续写定位：标题格式不规范（iter_chapter_blueprint 无法识别）时也不会从第 1 章重新生成。
+    """
+    return max((number for number, _ in iter_lenient_headers(source)), default=0)
+
 
 def parse_chapter_blueprint(blueprint_text: str):
     """
@@ -16,95 +154,7 @@ def parse_chapter_blueprint(blueprint_text: str):
       "chapter_summary": str     # 本章简述
     }
     """
-
-    # 先按空行进行分块，以免多章之间混淆
-    chunks = re.split(r'\n\s*\n', blueprint_text.strip())
-    results = []
-
-    # 兼容是否使用方括号包裹章节标题
-    # 例如：
-    #   第1章 - 紫极光下的预兆
-    # 或
-    #   第1章 - [紫极光下的预兆]
-    chapter_number_pattern = re.compile(r'^第\s*(\d+)\s*章\s*-\s*\[?(.*?)\]?$')
-
-    role_pattern     = re.compile(r'^本章定位：\s*\[?(.*)\]?$')
-    purpose_pattern  = re.compile(r'^核心作用：\s*\[?(.*)\]?$')
-    suspense_pattern = re.compile(r'^悬念密度：\s*\[?(.*)\]?$')
-    foreshadow_pattern = re.compile(r'^伏笔操作：\s*\[?(.*)\]?$')
-    twist_pattern       = re.compile(r'^认知颠覆：\s*\[?(.*)\]?$')
-    summary_pattern = re.compile(r'^本章简述：\s*\[?(.*)\]?$')
-
-    for chunk in chunks:
-        lines = chunk.strip().splitlines()
-        if not lines:
-            continue
-
-        chapter_number   = None
-        chapter_title    = ""
-        chapter_role     = ""
-        chapter_purpose  = ""
-        suspense_level   = ""
-        foreshadowing    = ""
-        plot_twist_level = ""
-        chapter_summary  = ""
-
-        # 先匹配第一行（或前几行），找到章号和标题
-        header_match = chapter_number_pattern.match(lines[0].strip())
-        if not header_match:
-            # 不符合“第X章 - 标题”的格式，跳过
-            continue
-
-        chapter_number = int(header_match.group(1))
-        chapter_title  = header_match.group(2).strip()
-
-        # 从后面的行匹配其他字段
-        for line in lines[1:]:
-            line_stripped = line.strip()
-            if not line_stripped:
-                continue
-
-            m_role = role_pattern.match(line_stripped)
-            if m_role:
-                chapter_role = m_role.group(1).strip()
-                continue
-
-            m_purpose = purpose_pattern.match(line_stripped)
-            if m_purpose:
-                chapter_purpose = m_purpose.group(1).strip()
-                continue
-
-            m_suspense = suspense_pattern.match(line_stripped)
-            if m_suspense:
-                suspense_level = m_suspense.group(1).strip()
-                continue
-
-            m_foreshadow = foreshadow_pattern.match(line_stripped)
-            if m_foreshadow:
-                foreshadowing = m_foreshadow.group(1).strip()
-                continue
-
-            m_twist = twist_pattern.match(line_stripped)
-            if m_twist:
-                plot_twist_level = m_twist.group(1).strip()
-                continue
-
-            m_summary = summary_pattern.match(line_stripped)
-            if m_summary:
-                chapter_summary = m_summary.group(1).strip()
-                continue
-
-        results.append({
-            "chapter_number": chapter_number,
-            "chapter_title": chapter_title,
-            "chapter_role": chapter_role,
-            "chapter_purpose": chapter_purpose,
-            "suspense_level": suspense_level,
-            "foreshadowing": foreshadowing,
-            "plot_twist_level": plot_twist_level,
-            "chapter_summary": chapter_summary
-        })
-
+    results = list(iter_chapter_blueprint(blueprint_text, with_offsets=False))
     # 按照 chapter_number 排序后返回
     results.sort(key=lambda x: x["chapter_number"])
     return results
@@ -115,11 +165,13 @@ def get_chapter_info_from_blueprint(blueprint_text: str, target_chapter_number:
     在已经加载好的章节蓝图文本中，找到对应章号的结构化信息，返回一个 dict。
     若找不到则返回一个默认的结构。
     """
-    all_chapters = parse_chapter_blueprint(blueprint_text)
-    for ch in all_chapters:
+    for ch in iter_chapter_blueprint(blueprint_text, with_offsets=False):
         if ch["chapter_number"] == target_chapter_number:
             return ch
-    # 默认返回
+    return _default_chapter_info(target_chapter_number)
+
+
+def _default_chapter_info(target_chapter_number: int) -> dict:
     return {
         "chapter_number": target_chapter_number,
         "chapter_title": f"第{target_chapter_number}章",
@@ -130,3 +182,246 @@ def get_chapter_info_from_blueprint(blueprint_text: str, target_chapter_number:
         "plot_twist_level": "",
         "chapter_summary": ""
     }
+
+
+def _source_signature(blueprint_path: str):
+    try:
+        stat = os.stat(blueprint_path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _read_index_data(index_path: str) -> Optional[dict]:
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _index_from_data(data: Optional[dict]):
+    if not data:
+        return None
+    chapters = data.get("chapters")
+    offsets = data.get("offsets")
+    if not isinstance(chapters, dict) or not isinstance(offsets, dict):
+        return None
+    return (
+        {int(number): info for number, info in chapters.items()},
+        {int(number): tuple(span) for number, span in offsets.items()},
+    )
+
+
+def _write_index_file(
+    index_path: str,
+    signature,
+    chapters: Dict[int, dict],
+    offsets: Dict[int, tuple],
+    pending: Optional[dict] = None,
+) -> None:
+    temp_path = index_path + ".tmp"
+    payload = {
+        "source_signature": signature,
+        "chapters": {str(n): info for n, info in chapters.items()},
+        "offsets": {str(n): list(span) for n, span in offsets.items()},
+    }
+    if pending is not None:
+        payload.update(pending)
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, index_path)
+    except OSError as e:
+        logging.warning(f"Failed to write blueprint index {index_path}: {e}")
+
+
+def _index_path_for(blueprint_path: str) -> str:
+    return os.path.join(os.path.dirname(blueprint_path), BLUEPRINT_INDEX_FILE)
+
+
+def _load_index_entry(filepath: str):
+    blueprint_path = os.path.abspath(os.path.join(filepath, BLUEPRINT_FILE))
+    signature = _source_signature(blueprint_path)
+    if signature is None:
+        return blueprint_path, {}, {}
+    with _index_lock:
+        cached = _index_cache.get(blueprint_path)
+    if cached and cached[0] == signature:
+        return blueprint_path, cached[1], cached[2]
+
+    index_path = _index_path_for(blueprint_path)
+    data = _read_index_data(index_path)
+    loaded = _index_from_data(data) if data and data.get("source_signature") == signature else None
+    if loaded is None:
+        chapters: Dict[int, dict] = {}
+        offsets: Dict[int, tuple] = {}
+        try:
+            with open(blueprint_path, "rb") as f:
+                for info in iter_chapter_blueprint(f):
+                    # 重复章号以首次出现为准，与 get_chapter_info_from_blueprint 的线性查找一致
+                    if info["chapter_number"] in chapters:
+                        continue
+                    offsets[info["chapter_number"]] = (info.pop("byte_start"), info.pop("byte_end"))
+                    chapters[info["chapter_number"]] = info
+        except OSError as e:
+            logging.warning(f"Failed to read blueprint {blueprint_path}: {e}")
+            return blueprint_path, {}, {}
+        # 追加进行中（索引带 pending 标记）时不覆盖索引，留给 recover_blueprint_append 处理
+        if not (data and data.get("pending_from_size") is not None):
+            _write_index_file(index_path, signature, chapters, offsets)
+    else:
+        chapters, offsets = loaded
+    with _index_lock:
+        _index_cache[blueprint_path] = (signature, chapters, offsets)
+    return blueprint_path, chapters, offsets
+
+
+def _tail_digest(path: str, size: int) -> str:
+    """文件前 size 字节中最后 _PENDING_TAIL_BYTES 字节的 sha256。"""
+    start = max(0, size - _PENDING_TAIL_BYTES)
+    with open(path, "rb") as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(size - start)).hexdigest()
+
+
+def append_to_blueprint(filepath: str, text: str) -> list:
+    """
+    将一段章节目录追加到 Novel_directory.txt（与已有内容以空行分隔），返回新增章节信息列表。
+    提交顺序：先把 pending 标记写入索引，再追加并 fsync 正文，最后原子替换为包含新章节的索引；
+    进程在中途退出时，recover_blueprint_append 会把正文截断回追加前的长度。
+    pending 标记同时记录追加长度与追加前文件末尾的摘要，供恢复时确认文件此后未被改动。
+    """
+    text = text.strip()
+    if not text:
+        return []
+    blueprint_path, chapters, offsets = _load_index_entry(filepath)
+    chapters, offsets = dict(chapters), dict(offsets)
+    index_path = _index_path_for(blueprint_path)
+    signature = _source_signature(blueprint_path)
+    base_size = signature[1] if signature else 0
+    data = (("\n\n" if base_size else "") + text).encode("utf-8")
+    pending = {
+        "pending_from_size": base_size,
+        "pending_length": len(data),
+        "pending_tail_sha256": _tail_digest(blueprint_path, base_size) if base_size else "",
+    }
+    _write_index_file(index_path, signature, chapters, offsets, pending=pending)
+
+    with open(blueprint_path, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    added = []
+    for info in iter_chapter_blueprint(data):
+        start, end = base_size + info.pop("byte_start"), base_size + info.pop("byte_end")
+        if info["chapter_number"] not in chapters:
+            chapters[info["chapter_number"]] = info
+            offsets[info["chapter_number"]] = (start, end)
+        added.append(info)
+    signature = _source_signature(blueprint_path)
+    _write_index_file(index_path, signature, chapters, offsets)
+    with _index_lock:
+        _index_cache[blueprint_path] = (signature, chapters, offsets)
+    return added
+
+
+def _pending_append_matches(blueprint_path: str, data: dict) -> bool:
+    """
+    文件是否仍是“追加前内容 + 未完成追加的部分字节”：长度落在追加区间内，且追加前末尾摘要一致。
+    不一致说明中断后文件被编辑过，此时不能按记录的长度截断。
+    """
+    pending_from_size = data.get("pending_from_size")
+    pending_length = data.get("pending_length")
+    expected_digest = data.get("pending_tail_sha256")
+    if not isinstance(pending_length, int) or expected_digest is None:
+        return False
+    size = os.path.getsize(blueprint_path)
+    if not pending_from_size <= size <= pending_from_size + pending_length:
+        return False
+    actual_digest = _tail_digest(blueprint_path, pending_from_size) if pending_from_size else ""
+    return actual_digest == expected_digest
+
+
+def recover_blueprint_append(filepath: str) -> bool:
+    """
+    若上次追加未完成提交（索引带 pending 标记），把正文截断回追加前长度并清除标记。
+    文件在中断后被编辑过（长度或追加前末尾内容对不上）时不截断，只丢弃索引，按现有内容重新解析；返回是否截断。
+    """
+    blueprint_path = os.path.abspath(os.path.join(filepath, BLUEPRINT_FILE))
+    index_path = _index_path_for(blueprint_path)
+    data = _read_index_data(index_path)
+    pending_from_size = data.get("pending_from_size") if data else None
+    if pending_from_size is None:
+        return False
+    try:
+        if not _pending_append_matches(blueprint_path, data):
+            logging.warning(
+                f"Blueprint {blueprint_path} changed after an interrupted append; keeping its content "
+                "and rebuilding the index instead of truncating."
+            )
+            _discard_index(index_path, blueprint_path)
+            return False
+        if os.path.getsize(blueprint_path) > pending_from_size:
+            with open(blueprint_path, "r+b") as f:
+                f.truncate(pending_from_size)
+                f.flush()
+                os.fsync(f.fileno())
+            logging.warning(f"Truncated incomplete blueprint append in {blueprint_path} to {pending_from_size} bytes.")
+    except OSError as e:
+        logging.warning(f"Failed to recover blueprint {blueprint_path}: {e}")
+        return False
+    loaded = _index_from_data(data)
+    signature = _source_signature(blueprint_path)
+    if loaded is not None and signature is not None and signature[1] == pending_from_size:
+        _write_index_file(index_path, signature, *loaded)
+        with _index_lock:
+            _index_cache.pop(blueprint_path, None)
+    else:
+        _discard_index(index_path, blueprint_path)
+    return True
+
+
+def _discard_index(index_path: str, blueprint_path: str) -> None:
+    """删除磁盘索引与内存缓存，下次读取时按源文件重新解析。"""
+    try:
+        os.remove(index_path)
+    except OSError:
+        pass
+    with _index_lock:
+        _index_cache.pop(blueprint_path, None)
+
+
+def load_blueprint_index(filepath: str) -> Dict[int, dict]:
+    """
+    读取项目的结构化蓝图索引 {章号: 章节信息}。
+    依次命中内存缓存、磁盘索引（Novel_directory.index.json）；源文件 mtime/size 变化时重新流式解析并回写。
+    返回的 dict 为共享缓存，调用方不应修改。
+    """
+    return _load_index_entry(filepath)[1]
+
+
+def get_chapter_info(filepath: str, target_chapter_number: int) -> dict:
+    """按章号从缓存的蓝图索引中 O(1) 取章节信息，找不到时返回默认结构。"""
+    info = load_blueprint_index(filepath).get(int(target_chapter_number))
+    return dict(info) if info else _default_chapter_info(target_chapter_number)
+
+
+def read_chapter_blueprint_text(filepath: str, target_chapter_number: int) -> str:
+    """按索引中的字节偏移直接读取某一章的蓝图原文，找不到时返回空字符串。"""
+    blueprint_path, _, offsets = _load_index_entry(filepath)
+    span = offsets.get(int(target_chapter_number))
+    if not span:
+        return ""
+    start, end = span
+    try:
+        with open(blueprint_path, "rb") as f:
+            f.seek(start)
+            return f.read(end - start).decode("utf-8", errors="replace").strip()
+    except OSError as e:
+        logging.warning(f"Failed to read blueprint {blueprint_path}: {e}")
+        return ""
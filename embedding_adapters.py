@@ -1,10 +1,33 @@
 # embedding_adapters.py
 # -*- coding: utf-8 -*-
+import asyncio
+import hashlib
 import logging
+import math
+import re
+import threading
+import time
 import traceback
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
 import requests
-from langchain_openai import AzureOpenAIEmbeddings, OpenAIEmbeddings
+from requests.adapters import HTTPAdapter
+
+# 单次批量请求的最大条数（Gemini batchEmbedContents 上限为 100）
+GEMINI_BATCH_SIZE = 100
+SILICONFLOW_BATCH_SIZE = 32
+# 多个批次并发请求时的最大并发数
+EMBEDDING_MAX_CONCURRENCY = 4
+# 每个适配器共享的 HTTP 连接池大小：覆盖批次线程与直接在调用方线程发出的单批/查询请求
+EMBEDDING_HTTP_POOL_SIZE = 16
+EMBEDDING_REQUEST_TIMEOUT = 60
+# 适配器池：空闲超过该秒数的实例会被回收；连续失败达到阈值的实例下次获取时重建
+EMBEDDING_POOL_IDLE_SECONDS = 600
+EMBEDDING_POOL_MAX_FAILURES = 3
+# 本地哈希 embedding：interface_format 取值与默认维度（model_name 形如 "hash-768" 时取其中的数字）
+LOCAL_EMBEDDING_FORMATS = ("local", "local hash")
+LOCAL_EMBEDDING_DEFAULT_DIM = 512
+LOCAL_EMBEDDING_NGRAM_SIZES = (1, 2, 3)
 
 
 def ensure_openai_base_url_has_v1(url: str) -> str:
@@ -22,17 +45,87 @@ def ensure_openai_base_url_has_v1(url: str) -> str:
     return url
 
 
+def create_http_session(pool_size: int = EMBEDDING_HTTP_POOL_SIZE) -> requests.Session:
+    """
+    创建带连接池的 requests.Session，复用 keep-alive 连接，避免每次请求重新握手。
+    Session 在适配器内被多线程共享：请求体与请求头每次单独构造，连接由 urllib3 连接池（线程安全）分配。
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _chunked(items: List[str], size: int) -> List[List[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
 class BaseEmbeddingAdapter:
     """
     Embedding 接口统一基类
+    同步方法为必需实现；异步方法默认在线程中执行同步实现。
+    多批请求在实例持有的长期线程池中执行（惰性创建，最多 max_concurrency 个线程），
+    线程与其 keep-alive 连接跨调用复用。
     """
 
+    max_concurrency = EMBEDDING_MAX_CONCURRENCY
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    def _batch_executor(self) -> ThreadPoolExecutor:
+        executor = self._executor
+        if executor is None:
+            with self._executor_lock:
+                executor = self._executor
+                if executor is None:
+                    executor = ThreadPoolExecutor(
+                        max_workers=max(1, self.max_concurrency),
+                        thread_name_prefix=f"embedding-{type(self).__name__}",
+                    )
+                    self._executor = executor
+        return executor
+
+    def close(self) -> None:
+        """释放线程池与 HTTP 连接（适配器池回收空闲实例时调用）。"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+        session = getattr(self, "_session", None)
+        if session is not None:
+            session.close()
+
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         raise NotImplementedError
 
     def embed_query(self, query: str) -> List[float]:
         raise NotImplementedError
 
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, query: str) -> List[float]:
+        return await asyncio.to_thread(self.embed_query, query)
+
+    def _fan_out(self, batches: List[List[str]], embed_batch: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """
+        按批调用 embed_batch，多批时提交到实例的长期线程池并发执行，结果按输入顺序拼接。
+        多个调用方共享同一线程池，同一适配器同时在途的批次数不超过 max_concurrency。
+        """
+        if not batches:
+            return []
+        if len(batches) == 1:
+            return embed_batch(batches[0])
+        results = list(self._batch_executor().map(embed_batch, batches))
+        return [vec for batch_result in results for vec in batch_result]
+
+    async def _afan_out(self, batches: List[List[str]], embed_batch: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """_fan_out 的异步版本：批次同样在实例的长期线程池中执行。"""
+        loop = asyncio.get_running_loop()
+        executor = self._batch_executor()
+        results = await asyncio.gather(*(loop.run_in_executor(executor, embed_batch, batch) for batch in batches))
+        return [vec for batch_result in results for vec in batch_result]
+
 
 class OpenAIEmbeddingAdapter(BaseEmbeddingAdapter):
     """
@@ -40,6 +133,9 @@ class OpenAIEmbeddingAdapter(BaseEmbeddingAdapter):
     """
 
     def __init__(self, api_key: str, base_url: str, model_name: str):
+        # 延迟导入 LangChain，仅在实际使用 OpenAI embedding 时付出导入开销
+        from langchain_openai import OpenAIEmbeddings
+
         self._embedding = OpenAIEmbeddings(
             openai_api_key=api_key,
             openai_api_base=ensure_openai_base_url_has_v1(base_url),
@@ -52,6 +148,12 @@ class OpenAIEmbeddingAdapter(BaseEmbeddingAdapter):
     def embed_query(self, query: str) -> List[float]:
         return self._embedding.embed_query(query)
 
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._embedding.aembed_documents(texts)
+
+    async def aembed_query(self, query: str) -> List[float]:
+        return await self._embedding.aembed_query(query)
+
 
 class AzureOpenAIEmbeddingAdapter(BaseEmbeddingAdapter):
     """
@@ -74,6 +176,8 @@ class AzureOpenAIEmbeddingAdapter(BaseEmbeddingAdapter):
         else:
             raise ValueError("Invalid Azure OpenAI base_url format")
 
+        from langchain_openai import AzureOpenAIEmbeddings
+
         self._embedding = AzureOpenAIEmbeddings(
             azure_endpoint=self.azure_endpoint,
             azure_deployment=self.azure_deployment,
@@ -88,12 +192,18 @@ class AzureOpenAIEmbeddingAdapter(BaseEmbeddingAdapter):
     def embed_query(self, query: str) -> List[float]:
         return self._embedding.embed_query(query)
 
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._embedding.aembed_documents(texts)
+
+    async def aembed_query(self, query: str) -> List[float]:
+        return await self._embedding.aembed_query(query)
+
 
 class GeminiEmbeddingAdapter(BaseEmbeddingAdapter):
     """
     基于 Google Generative AI (Gemini) 接口的 Embedding 适配器
-    使用直接 POST 请求方式，URL 示例：
-    https://generativelanguage.googleapis.com/v1beta/models/text-embedding-004:embedContent?key=YOUR_API_KEY
+    使用直接 POST 请求方式，批量文本走 batchEmbedContents，URL 示例：
+    https://generativelanguage.googleapis.com/v1beta/models/text-embedding-004:batchEmbedContents?key=YOUR_API_KEY
     """
 
     def __init__(self, api_key: str, model_name: str, base_url: str):
@@ -105,17 +215,56 @@ class GeminiEmbeddingAdapter(BaseEmbeddingAdapter):
         self.api_key = api_key
         self.model_name = model_name
         self.base_url = base_url.rstrip("/")
+        self._session = create_http_session()
+
+    def _model_path(self) -> str:
+        return self.model_name if self.model_name.startswith("models/") else f"models/{self.model_name}"
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        embeddings = []
-        for text in texts:
-            vec = self._embed_single(text)
-            embeddings.append(vec)
-        return embeddings
+        return self._fan_out(_chunked(list(texts), GEMINI_BATCH_SIZE), self._embed_batch)
 
     def embed_query(self, query: str) -> List[float]:
         return self._embed_single(query)
 
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._afan_out(_chunked(list(texts), GEMINI_BATCH_SIZE), self._embed_batch)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        调用 batchEmbedContents 一次获取多条文本的 embedding（按请求顺序返回）；
+        失败或条数不符时每条返回空列表。
+        """
+        url = f"{self.base_url}/{self.model_name}:batchEmbedContents?key={self.api_key}"
+        model_path = self._model_path()
+        payload = {
+            "requests": [
+                {"model": model_path, "content": {"parts": [{"text": text}]}}
+                for text in texts
+            ]
+        }
+
+        try:
+            response = self._session.post(url, json=payload, timeout=EMBEDDING_REQUEST_TIMEOUT)
+            response.raise_for_status()
+            result = response.json()
+            embeddings = result.get("embeddings", [])
+            if len(embeddings) != len(texts):
+                logging.error(
+                    f"Gemini batchEmbedContents returned {len(embeddings)} embeddings for {len(texts)} inputs."
+                )
+                return [[] for _ in texts]
+            return [item.get("values", []) for item in embeddings]
+        except requests.exceptions.RequestException as e:
+            logging.error(
+                f"Gemini batchEmbedContents request error: {e}\n{traceback.format_exc()}"
+            )
+            return [[] for _ in texts]
+        except Exception as e:
+            logging.error(
+                f"Gemini batchEmbedContents parse error: {e}\n{traceback.format_exc()}"
+            )
+            return [[] for _ in texts]
+
     def _embed_single(self, text: str) -> List[float]:
         """
         直接调用 Google Generative Language API (Gemini) 接口，获取文本 embedding
@@ -124,7 +273,7 @@ class GeminiEmbeddingAdapter(BaseEmbeddingAdapter):
         payload = {"model": self.model_name, "content": {"parts": [{"text": text}]}}
 
         try:
-            response = requests.post(url, json=payload, timeout=60)
+            response = self._session.post(url, json=payload, timeout=EMBEDDING_REQUEST_TIMEOUT)
             response.raise_for_status()
             result = response.json()
             embedding_data = result.get("embedding", {})
@@ -144,6 +293,8 @@ class GeminiEmbeddingAdapter(BaseEmbeddingAdapter):
 class SiliconFlowEmbeddingAdapter(BaseEmbeddingAdapter):
     """
     基于 SiliconFlow 的 embedding 适配器
+    批量文本以列表形式放入 input，一次请求返回多条 embedding。
+    实例只持有不可变配置与共享的连接池 Session，请求体每次调用单独构造，可在多线程间共享。
     """
 
     def __init__(self, api_key: str, base_url: str, model_name: str):
@@ -151,59 +302,99 @@ class SiliconFlowEmbeddingAdapter(BaseEmbeddingAdapter):
         if not base_url.startswith("http://") and not base_url.startswith("https://"):
             base_url = "https://" + base_url
         self.url = base_url if base_url else "https://api.siliconflow.cn/v1/embeddings"
-
-        self.payload = {
-            "model": model_name,
-            "input": "Silicon flow embedding online: fast, affordable, and high-quality embedding services. come try it out!",
-            "encoding_format": "float",
-        }
-        self.headers = {
-            "Authorization": "Bearer {api_key}".format(api_key=api_key),
-            "Content-Type": "application/json",
-        }
+        self.model_name = model_name
+        self.encoding_format = "float"
+        self._headers = (
+            ("Authorization", "Bearer {api_key}".format(api_key=api_key)),
+            ("Content-Type", "application/json"),
+        )
+        self._session = create_http_session()
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        embeddings = []
-        for text in texts:
-            try:
-                self.payload["input"] = text
-                response = requests.post(
-                    self.url, json=self.payload, headers=self.headers, timeout=60
-                )
-                response.raise_for_status()
-                result = response.json()
-                if not result or "data" not in result or not result["data"]:
-                    logging.error(
-                        f"Invalid response format from SiliconFlow API: {result}"
-                    )
-                    embeddings.append([])
-                    continue
-                emb = result["data"][0].get("embedding", [])
-                embeddings.append(emb)
-            except requests.exceptions.RequestException as e:
-                logging.error(f"SiliconFlow API request failed: {str(e)}")
-                embeddings.append([])
-            except (KeyError, IndexError, ValueError, TypeError) as e:
-                logging.error(f"Error parsing SiliconFlow API response: {str(e)}")
-                embeddings.append([])
-        return embeddings
+        return self._fan_out(_chunked(list(texts), SILICONFLOW_BATCH_SIZE), self._embed_batch)
 
     def embed_query(self, query: str) -> List[float]:
+        result = self._embed_batch([query])
+        return result[0] if result else []
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._afan_out(_chunked(list(texts), SILICONFLOW_BATCH_SIZE), self._embed_batch)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        一次请求嵌入一批文本，按响应中的 index 还原顺序并校验条数；
+        失败或条数不符时每条返回空列表。
+        """
+        payload = {
+            "model": self.model_name,
+            "input": list(texts),
+            "encoding_format": self.encoding_format,
+        }
         try:
-            self.payload["input"] = query
-            response = requests.post(self.url, json=self.payload, headers=self.headers, timeout=60)
+            response = self._session.post(
+                self.url, json=payload, headers=dict(self._headers), timeout=EMBEDDING_REQUEST_TIMEOUT
+            )
             response.raise_for_status()
             result = response.json()
             if not result or "data" not in result or not result["data"]:
                 logging.error(f"Invalid response format from SiliconFlow API: {result}")
-                return []
-            return result["data"][0].get("embedding", [])
+                return [[] for _ in texts]
+            data = sorted(result["data"], key=lambda item: item.get("index", 0))
+            if len(data) != len(texts):
+                logging.error(
+                    f"SiliconFlow API returned {len(data)} embeddings for {len(texts)} inputs."
+                )
+                return [[] for _ in texts]
+            return [item.get("embedding", []) for item in data]
         except requests.exceptions.RequestException as e:
             logging.error(f"SiliconFlow API request failed: {str(e)}")
-            return []
+            return [[] for _ in texts]
         except (KeyError, IndexError, ValueError, TypeError) as e:
             logging.error(f"Error parsing SiliconFlow API response: {str(e)}")
-            return []
+            return [[] for _ in texts]
+
+
+class LocalHashEmbeddingAdapter(BaseEmbeddingAdapter):
+    """
+    进程内确定性 embedding：字符 n-gram 特征哈希到固定维度（带符号哈希，次线性词频），
+    结果 L2 归一化。不依赖网络，用于离线测试、压测与无外网部署，也可作为零延迟兜底。
+    """
+
+    def __init__(self, model_name: str = "", dimension: int = None):
+        if dimension is None:
+            match = re.search(r"\d+", model_name or "")
+            dimension = int(match.group(0)) if match else LOCAL_EMBEDDING_DEFAULT_DIM
+        self.dimension = max(16, min(8192, int(dimension)))
+        self.ngram_sizes = LOCAL_EMBEDDING_NGRAM_SIZES
+
+    def _embed(self, text: str) -> List[float]:
+        normalized = " ".join((text or "").lower().split())
+        counts = {}
+        for size in self.ngram_sizes:
+            for i in range(len(normalized) - size + 1):
+                gram = normalized[i:i + size]
+                if gram.isspace():
+                    continue
+                counts[gram] = counts.get(gram, 0) + 1
+
+        vector = [0.0] * self.dimension
+        for gram, count in counts.items():
+            digest = hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            sign = 1.0 if value & 1 else -1.0
+            vector[(value >> 1) % self.dimension] += sign * (1.0 + math.log(count))
+        norm = math.sqrt(sum(x * x for x in vector))
+        if norm == 0:
+            # 空文本也返回合法向量，避免被校验层当作失败
+            vector[0] = 1.0
+            return vector
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, query: str) -> List[float]:
+        return self._embed(query)
 
 
 def create_embedding_adapter(
@@ -218,10 +409,171 @@ def create_embedding_adapter(
     elif fmt == "azure openai":
         return AzureOpenAIEmbeddingAdapter(api_key, base_url, model_name)
     elif fmt in ("ollama", "ml studio"):
-        raise ValueError("当前版本已移除本地向量接口（Ollama/ML Studio），请改用云端 Embedding 接口。")
+        raise ValueError("当前版本已移除本地向量接口（Ollama/ML Studio），请改用云端 Embedding 接口，或使用内置的 Local 哈希向量。")
     elif fmt == "gemini":
         return GeminiEmbeddingAdapter(api_key, model_name, base_url)
     elif fmt == "siliconflow":
         return SiliconFlowEmbeddingAdapter(api_key, base_url, model_name)
+    elif fmt in LOCAL_EMBEDDING_FORMATS:
+        return LocalHashEmbeddingAdapter(model_name)
     else:
         raise ValueError(f"Unknown embedding interface_format: {interface_format}")
+
+
+class PooledEmbeddingAdapter(BaseEmbeddingAdapter):
+    """
+    适配器池中的实例包装：透传调用并记录健康状态（异常或空向量计为失败）。
+    """
+
+    def __init__(self, adapter: BaseEmbeddingAdapter):
+        self.adapter = adapter
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.consecutive_failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        return self.consecutive_failures < EMBEDDING_POOL_MAX_FAILURES
+
+    def _record(self, ok: bool) -> None:
+        with self._lock:
+            self.last_used = time.monotonic()
+            self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+
+    def _call(self, func, argument, is_ok):
+        try:
+            result = func(argument)
+        except Exception:
+            self._record(False)
+            raise
+        self._record(is_ok(result))
+        return result
+
+    async def _acall(self, func, argument, is_ok):
+        try:
+            result = await func(argument)
+        except Exception:
+            self._record(False)
+            raise
+        self._record(is_ok(result))
+        return result
+
+    @staticmethod
+    def _documents_ok(result) -> bool:
+        return bool(result) and all(result)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return self.adapter.embed_documents(texts)
+        return self._call(self.adapter.embed_documents, texts, self._documents_ok)
+
+    def embed_query(self, query: str) -> List[float]:
+        return self._call(self.adapter.embed_query, query, bool)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return await self.adapter.aembed_documents(texts)
+        return await self._acall(self.adapter.aembed_documents, texts, self._documents_ok)
+
+    async def aembed_query(self, query: str) -> List[float]:
+        return await self._acall(self.adapter.aembed_query, query, bool)
+
+
+class EmbeddingAdapterPool:
+    """
+    按 (interface_format, base_url, model_name, api_key 哈希) 复用 embedding 适配器，
+    使各任务共享已建立的 HTTP 连接池。实例在首次获取时惰性创建，
+    连续失败过多时重建，空闲超时后回收。
+    """
+
+    def __init__(
+        self,
+        idle_seconds: float = EMBEDDING_POOL_IDLE_SECONDS,
+        factory: Callable[..., BaseEmbeddingAdapter] = None,
+    ):
+        self._idle_seconds = idle_seconds
+        self._factory = factory or create_embedding_adapter
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(interface_format: str, api_key: str, base_url: str, model_name: str) -> tuple:
+        api_key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+        return (
+            (interface_format or "").strip().lower(),
+            (base_url or "").strip(),
+            (model_name or "").strip(),
+            api_key_hash,
+        )
+
+    def get(self, interface_format: str, api_key: str, base_url: str, model_name: str) -> PooledEmbeddingAdapter:
+        key = self.make_key(interface_format, api_key, base_url, model_name)
+        with self._lock:
+            evicted = self._evict_idle_locked()
+            entry = self._entries.get(key)
+            if entry is not None and not entry.healthy:
+                logging.warning("Embedding adapter %s marked unhealthy, recreating.", key[:3])
+                evicted.append(self._entries.pop(key))
+                entry = None
+            if entry is None:
+                entry = PooledEmbeddingAdapter(
+                    self._factory(interface_format, api_key, base_url, model_name)
+                )
+                self._entries[key] = entry
+            entry.last_used = time.monotonic()
+        self._close_entries(evicted)
+        return entry
+
+    def _evict_idle_locked(self) -> List[PooledEmbeddingAdapter]:
+        now = time.monotonic()
+        expired = [
+            key for key, entry in self._entries.items()
+            if now - entry.last_used > self._idle_seconds
+        ]
+        return [self._entries.pop(key) for key in expired]
+
+    @staticmethod
+    def _close_entries(entries: List[PooledEmbeddingAdapter]) -> None:
+        """在池锁外释放被移出的实例的线程池与连接，关闭失败只记录日志。"""
+        for entry in entries:
+            close = getattr(entry.adapter, "close", None)
+            if not callable(close):
+                continue
+            try:
+                close()
+            except Exception as e:
+                logging.warning(f"Failed to close embedding adapter: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        self._close_entries(entries)
+
+    def stats(self) -> List[dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "interface_format": key[0],
+                    "base_url": key[1],
+                    "model_name": key[2],
+                    "healthy": entry.healthy,
+                    "consecutive_failures": entry.consecutive_failures,
+                    "idle_seconds": round(now - entry.last_used, 1),
+                }
+                for key, entry in self._entries.items()
+            ]
+
+
+_adapter_pool = EmbeddingAdapterPool()
+
+
+def get_embedding_adapter(
+    interface_format: str, api_key: str, base_url: str, model_name: str
+) -> BaseEmbeddingAdapter:
+    """
+    从全局适配器池获取（或惰性创建）embedding 适配器，参数与 create_embedding_adapter 相同。
+    """
+    return _adapter_pool.get(interface_format, api_key, base_url, model_name)
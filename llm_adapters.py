@@ -1,11 +1,84 @@
 # llm_adapters.py
 # -*- coding: utf-8 -*-
+import asyncio
+import hashlib
 import logging
+import os
 import re
-from typing import Any, Optional
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
 
-from langchain_openai import ChatOpenAI
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except (TypeError, ValueError):
+        return default
+
+
+# 进程级 HTTP 连接池参数，可通过环境变量调整。
+LLM_HTTP_MAX_CONNECTIONS = _env_int("AINOVEL_LLM_MAX_CONNECTIONS", 20)
+LLM_HTTP_MAX_KEEPALIVE = _env_int("AINOVEL_LLM_MAX_KEEPALIVE", 10)
+LLM_HTTP_KEEPALIVE_EXPIRY = float(_env_int("AINOVEL_LLM_KEEPALIVE_EXPIRY", 120))
+LLM_HTTP2_ENABLED = os.environ.get("AINOVEL_LLM_HTTP2", "1").strip().lower() not in ("0", "false", "no")
+LLM_ADAPTER_CACHE_SIZE = _env_int("AINOVEL_LLM_ADAPTER_CACHE_SIZE", 32)
+
+_http_clients: Dict[str, httpx.Client] = {}
+_http_clients_lock = threading.Lock()
+_adapter_cache: "OrderedDict[Tuple, BaseLLMAdapter]" = OrderedDict()
+_adapter_cache_lock = threading.Lock()
+
+
+def _http2_available() -> bool:
+    if not LLM_HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2 包
+    except ImportError:
+        return False
+    return True
+
+
+def get_shared_http_client(base_url: str) -> httpx.Client:
+    """
+    按 base_url 复用进程级 httpx.Client（keep-alive，安装 h2 时启用 HTTP/2），
+    同一服务端的顺序调用可复用已建立的连接，免去重复的 TLS 握手。
+    超时由 OpenAI 客户端按请求传入，这里不设置。
+    """
+    with _http_clients_lock:
+        client = _http_clients.get(base_url)
+        if client is None or client.is_closed:
+            client = httpx.Client(
+                http2=_http2_available(),
+                limits=httpx.Limits(
+                    max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+                ),
+                timeout=None,
+                follow_redirects=True,
+            )
+            _http_clients[base_url] = client
+        return client
+
+
+def close_shared_http_clients() -> None:
+    """关闭所有共享 HTTP 客户端并清空适配器缓存。"""
+    with _adapter_cache_lock:
+        _adapter_cache.clear()
+    with _http_clients_lock:
+        clients = list(_http_clients.values())
+        _http_clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception:
+            logging.debug("Failed to close shared http client.", exc_info=True)
 
 
 def check_base_url(url: str) -> str:
@@ -56,6 +129,14 @@ def _extract_openai_chunk_text(chunk: Any) -> str:
     return _normalize_stream_text(content)
 
 
+def _extract_openai_message_text(response: Any) -> str:
+    choices = getattr(response, "choices", None) or []
+    if not choices:
+        return ""
+    message = getattr(choices[0], "message", None)
+    return _normalize_stream_text(getattr(message, "content", None))
+
+
 def _stream_openai_chat_completions(
     client: OpenAI,
     *,
@@ -84,6 +165,34 @@ def _stream_openai_chat_completions(
             close_fn()
 
 
+async def _astream_openai_chat_completions(
+    client: AsyncOpenAI,
+    *,
+    model_name: str,
+    messages: list[dict[str, str]],
+    max_tokens: int,
+    temperature: float,
+    timeout: Optional[int],
+):
+    stream = await client.chat.completions.create(
+        model=model_name,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        timeout=timeout,
+        stream=True,
+    )
+    try:
+        async for chunk in stream:
+            text = _extract_openai_chunk_text(chunk)
+            if text:
+                yield text
+    finally:
+        close_fn = getattr(stream, "close", None)
+        if callable(close_fn):
+            await close_fn()
+
+
 class BaseLLMAdapter:
     def invoke(self, prompt: str) -> str:
         raise NotImplementedError("Subclasses must implement .invoke(prompt) method.")
@@ -96,6 +205,14 @@ class BaseLLMAdapter:
         result = self.invoke(prompt)
         yield result
 
+    async def ainvoke(self, prompt: str) -> str:
+        """异步调用；未实现原生异步的子类在线程中执行 invoke。"""
+        return await asyncio.to_thread(self.invoke, prompt)
+
+    async def astream(self, prompt: str):
+        """异步流式调用；默认回退为一次性返回 ainvoke 的结果。"""
+        yield await self.ainvoke(prompt)
+
 
 class OpenAIAdapter(BaseLLMAdapter):
     def __init__(
@@ -106,7 +223,9 @@ class OpenAIAdapter(BaseLLMAdapter):
         max_tokens: int,
         temperature: float = 0.7,
         timeout: Optional[int] = 600,
+        interface_format: str = "OpenAI",
     ):
+        self.interface_format = interface_format
         self.base_url = check_base_url(base_url)
         self.api_key = api_key
         self.model_name = model_name
@@ -114,23 +233,51 @@ class OpenAIAdapter(BaseLLMAdapter):
         self.temperature = temperature
         self.timeout = timeout
 
-        self._client = ChatOpenAI(
-            model=self.model_name,
-            api_key=self.api_key,
-            base_url=self.base_url,
-            max_tokens=self.max_tokens,
-            temperature=self.temperature,
-            timeout=self.timeout,
-        )
-        self._stream_client = OpenAI(
+        # invoke 与 stream 共用同一个原生 OpenAI 客户端（及共享连接池），不再经过 LangChain。
+        self._client = OpenAI(
             base_url=self.base_url,
             api_key=self.api_key,
             timeout=self.timeout,
+            http_client=get_shared_http_client(self.base_url),
+        )
+        # AsyncOpenAI 的连接池绑定事件循环，按循环分别创建，循环结束后随之回收。
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = (
+            weakref.WeakKeyDictionary()
         )
+        self._async_clients_lock = threading.Lock()
+
+    def _get_async_client(self) -> AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+        with self._async_clients_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = AsyncOpenAI(
+                    base_url=self.base_url,
+                    api_key=self.api_key,
+                    timeout=self.timeout,
+                    http_client=httpx.AsyncClient(
+                        http2=_http2_available(),
+                        limits=httpx.Limits(
+                            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+                            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+                        ),
+                        timeout=None,
+                        follow_redirects=True,
+                    ),
+                )
+                self._async_clients[loop] = client
+            return client
 
     def invoke(self, prompt: str) -> str:
-        response = self._client.invoke(prompt)
-        content = getattr(response, "content", None) if response else None
+        response = self._client.chat.completions.create(
+            model=self.model_name,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            timeout=self.timeout,
+        )
+        content = _extract_openai_message_text(response)
         if not content:
             raise RuntimeError("OpenAIAdapter 未返回有效内容。")
         return content
@@ -139,7 +286,7 @@ class OpenAIAdapter(BaseLLMAdapter):
         has_yielded = False
         try:
             for chunk in _stream_openai_chat_completions(
-                self._stream_client,
+                self._client,
                 model_name=self.model_name,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=self.max_tokens,
@@ -155,6 +302,39 @@ class OpenAIAdapter(BaseLLMAdapter):
             logging.warning("OpenAI 流式调用失败，回退 invoke：%s", e)
             yield self.invoke(prompt)
 
+    async def ainvoke(self, prompt: str) -> str:
+        response = await self._get_async_client().chat.completions.create(
+            model=self.model_name,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            timeout=self.timeout,
+        )
+        content = _extract_openai_message_text(response)
+        if not content:
+            raise RuntimeError("OpenAIAdapter 未返回有效内容。")
+        return content
+
+    async def astream(self, prompt: str):
+        has_yielded = False
+        try:
+            async for chunk in _astream_openai_chat_completions(
+                self._get_async_client(),
+                model_name=self.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                timeout=self.timeout,
+            ):
+                has_yielded = True
+                yield chunk
+        except Exception as e:
+            if has_yielded:
+                logging.warning("OpenAI 异步流式调用中断，取消回退以避免文本重复：%s", e)
+                raise
+            logging.warning("OpenAI 异步流式调用失败，回退 ainvoke：%s", e)
+            yield await self.ainvoke(prompt)
+
 
 def create_llm_adapter(
     interface_format: str,
@@ -165,6 +345,29 @@ def create_llm_adapter(
     max_tokens: int,
     timeout: int,
 ) -> BaseLLMAdapter:
-    # 保留 interface_format 入参以兼容现有调用，当前统一走 OpenAI 兼容协议。
-    _ = interface_format
-    return OpenAIAdapter(api_key, base_url, model_name, max_tokens, temperature, timeout)
+    """
+    按完整配置缓存适配器实例（LRU），相同配置的调用复用同一实例及其共享连接池。
+    适配器不持有请求级状态，可在线程间共享。
+    """
+    # 当前统一走 OpenAI 兼容协议；interface_format 仍作为适配器身份的一部分（响应缓存按其区分服务商）。
+    key = (
+        interface_format,
+        check_base_url(base_url),
+        model_name,
+        hashlib.sha256(str(api_key or "").encode("utf-8")).hexdigest(),
+        temperature,
+        max_tokens,
+        timeout,
+    )
+    with _adapter_cache_lock:
+        adapter = _adapter_cache.get(key)
+        if adapter is not None:
+            _adapter_cache.move_to_end(key)
+            return adapter
+    adapter = OpenAIAdapter(api_key, base_url, model_name, max_tokens, temperature, timeout, interface_format)
+    with _adapter_cache_lock:
+        _adapter_cache[key] = adapter
+        _adapter_cache.move_to_end(key)
+        while len(_adapter_cache) > LLM_ADAPTER_CACHE_SIZE:
+            _adapter_cache.popitem(last=False)
+    return adapter
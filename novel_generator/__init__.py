@@ -6,6 +6,7 @@ from .chapter import (
     summarize_recent_chapters,
     get_filtered_knowledge_context,
     build_chapter_prompt,
+    build_chapter_prompt_artifacts,
     generate_chapter_draft
 )
 from .finalization import finalize_chapter, enrich_chapter_text
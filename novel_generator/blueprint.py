@@ -5,11 +5,37 @@
 """
 import os
 import re
+import json
+import shutil
+import asyncio
 import logging
-from novel_generator.common import invoke_with_cleaning
+from typing import List, Optional, Tuple
+from collections import deque
+from chapter_directory_parser import (
+    append_to_blueprint,
+    iter_chapter_blueprint,
+    iter_lenient_headers,
+    load_blueprint_index,
+    max_chapter_number_lenient,
+    read_chapter_blueprint_text,
+    recover_blueprint_append,
+)
+from novel_generator.common import ainvoke_with_cleaning, invoke_with_cleaning
+from novel_generator.token_budget import (
+    DEFAULT_CONTEXT_WINDOW,
+    PromptSection,
+    assemble_prompt,
+    count_tokens,
+    resolve_context_window,
+)
 from llm_adapters import create_llm_adapter
-from prompt_definitions import chapter_blueprint_prompt, chunked_chapter_blueprint_prompt
-from utils import read_file, clear_file_content, save_string_to_txt
+from prompt_definitions import (
+    arc_chunked_chapter_blueprint_prompt,
+    blueprint_arc_skeleton_prompt,
+    chapter_blueprint_prompt,
+    chunked_chapter_blueprint_prompt,
+)
+from utils import read_file
 logging.basicConfig(
     filename='app.log',      # 日志文件名
     filemode='a',            # 追加模式（'w' 会覆盖）
@@ -20,16 +46,34 @@ logging.basicConfig(
 
 BLUEPRINT_MAX_TOKENS_CAP = 8192
 BLUEPRINT_MAX_CHUNK_SIZE = 30
+# 尚无已生成章节可供实测时，每章目录的估算 token 数
+BLUEPRINT_TOKENS_PER_CHAPTER = 200.0
+# 分块提示词中携带的最近章节数（滚动窗口）
+BLUEPRINT_ROLLING_CHAPTERS = 100
+# 并行模式：每个段落（分卷）包含的分块数，段落内串行、段落间并行
+BLUEPRINT_ARC_CHUNKS = 4
+# 并行模式的中间产物目录（段落骨架与各段落已生成的章节），全部合并后删除
+BLUEPRINT_PARTS_DIR = "blueprint_parts"
+BLUEPRINT_ARCS_FILE = "arcs.json"
+# 首个待生成段落从已有目录末尾带入的衔接章节数
+BLUEPRINT_BOUNDARY_CHAPTERS = 5
 
+_ARC_HEADER_PATTERN = re.compile(r"^\s*第\s*(\d+)\s*段", re.MULTILINE)
 
-def compute_chunk_size(number_of_chapters: int, max_tokens: int, max_chunk_size: int = BLUEPRINT_MAX_CHUNK_SIZE) -> int:
+
+def compute_chunk_size(
+    number_of_chapters: int,
+    max_tokens: int,
+    max_chunk_size: int = BLUEPRINT_MAX_CHUNK_SIZE,
+    tokens_per_chapter: float = BLUEPRINT_TOKENS_PER_CHAPTER,
+) -> int:
     """
-    基于“每章约100 tokens”的粗略估算，
+    基于每章目录的 token 数（已有目录时实测，否则按 BLUEPRINT_TOKENS_PER_CHAPTER 估算），
     再结合当前max_tokens，计算分块大小：
-      chunk_size = (floor(max_tokens/100/10)*10) - 10
+      chunk_size = (floor(max_tokens/tokens_per_chapter/10)*10) - 10
     并确保 chunk_size 不会小于1或大于实际章节数。
     """
-    tokens_per_chapter = 200.0
+    tokens_per_chapter = tokens_per_chapter if tokens_per_chapter > 0 else BLUEPRINT_TOKENS_PER_CHAPTER
     ratio = max_tokens / tokens_per_chapter
     ratio_rounded_to_10 = int(ratio // 10) * 10
     chunk_size = ratio_rounded_to_10 - 10
@@ -54,6 +98,325 @@ def limit_chapter_blueprint(blueprint_text: str, limit_chapters: int = 100) -> s
     selected = chapters[-limit_chapters:]
     return "\n\n".join(selected).strip()
 
+def _measure_tokens_per_chapter(blocks) -> float:
+    """按已有章节原文实测每章目录的平均 token 数，无样本时返回估算值。"""
+    blocks = [block for block in blocks if block]
+    if not blocks:
+        return BLUEPRINT_TOKENS_PER_CHAPTER
+    return count_tokens("\n\n".join(blocks)) / len(blocks)
+
+def _max_chapter_number(blueprint_text: str) -> int:
+    """已有目录写到的最大章号；按宽松的标题格式识别，格式不规范的标题同样计入。"""
+    return max_chapter_number_lenient(blueprint_text)
+
+def _drop_chapters_before(text: str, first_chapter: int) -> str:
+    """去掉第一个章号不小于 first_chapter 的标题之前的内容（含更早的章节）；没有这样的章节时返回空串。"""
+    data = text.encode("utf-8")
+    for number, offset in iter_lenient_headers(data):
+        if number >= first_chapter:
+            return data[offset:].decode("utf-8", errors="replace").strip()
+    return ""
+
+def _split_chapter_blocks(text: str) -> List[str]:
+    """按章节标题把一段目录切成逐章原文；无可识别章节时整体作为一块。"""
+    data = text.encode("utf-8")
+    blocks = [
+        data[ch["byte_start"]:ch["byte_end"]].decode("utf-8", errors="replace").strip()
+        for ch in iter_chapter_blueprint(data)
+    ]
+    return blocks or ([text.strip()] if text.strip() else [])
+
+def _append_blueprint_text(filename: str, text: str) -> None:
+    """把一段章节目录追加到文件末尾（与已有内容以空行分隔），写入后 fsync。"""
+    text = text.strip()
+    if not text:
+        return
+    prefix = "\n\n" if os.path.exists(filename) and os.path.getsize(filename) > 0 else ""
+    with open(filename, "a", encoding="utf-8") as f:
+        f.write(prefix + text)
+        f.flush()
+        os.fsync(f.fileno())
+
+def plan_blueprint_arcs(
+    start_chapter: int,
+    number_of_chapters: int,
+    chunk_size: int,
+    arc_chunks: int = BLUEPRINT_ARC_CHUNKS,
+) -> List[Tuple[int, int]]:
+    """将 [start_chapter, number_of_chapters] 按 chunk_size * arc_chunks 划分为段落区间。"""
+    arc_size = max(1, chunk_size) * max(1, arc_chunks)
+    return [
+        (arc_start, min(arc_start + arc_size - 1, number_of_chapters))
+        for arc_start in range(start_chapter, number_of_chapters + 1, arc_size)
+    ]
+
+def _split_arc_outlines(skeleton_text: str, arcs: List[Tuple[int, int]]) -> List[str]:
+    matches = list(_ARC_HEADER_PATTERN.finditer(skeleton_text))
+    outlines = [""] * len(arcs)
+    for i, match in enumerate(matches):
+        arc_index = int(match.group(1)) - 1
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(skeleton_text)
+        if 0 <= arc_index < len(arcs) and not outlines[arc_index]:
+            outlines[arc_index] = skeleton_text[match.start():end].strip()
+    for arc_index, (arc_start, arc_end) in enumerate(arcs):
+        if not outlines[arc_index]:
+            outlines[arc_index] = f"第{arc_index + 1}段\n章节范围：第{arc_start}章-第{arc_end}章"
+    return outlines
+
+def _load_arc_skeleton(parts_dir: str, number_of_chapters: int) -> Optional[Tuple[List[Tuple[int, int]], List[str]]]:
+    try:
+        with open(os.path.join(parts_dir, BLUEPRINT_ARCS_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("number_of_chapters") != number_of_chapters:
+            return None
+        arcs = [(int(a), int(b)) for a, b in data["arcs"]]
+        outlines = [str(x) for x in data["outlines"]]
+        return (arcs, outlines) if arcs and len(arcs) == len(outlines) else None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _create_arc_skeleton(
+    llm_adapter,
+    parts_dir: str,
+    architecture_text: str,
+    user_guidance: str,
+    number_of_chapters: int,
+    arcs: List[Tuple[int, int]],
+    context_window: int = DEFAULT_CONTEXT_WINDOW,
+    max_tokens: int = BLUEPRINT_MAX_TOKENS_CAP,
+) -> List[str]:
+    arc_ranges = "\n".join(
+        f"第{i + 1}段：第{arc_start}章-第{arc_end}章" for i, (arc_start, arc_end) in enumerate(arcs)
+    )
+    prompt, _ = assemble_prompt(
+        blueprint_arc_skeleton_prompt,
+        [PromptSection("novel_architecture", architecture_text, priority=0)],
+        context_window,
+        max_tokens,
+        number_of_chapters=number_of_chapters,
+        arc_count=len(arcs),
+        arc_ranges=arc_ranges,
+        user_guidance=user_guidance,
+    )
+    logging.info(f"Generating arc skeleton for {len(arcs)} arcs...")
+    outlines = _split_arc_outlines(invoke_with_cleaning(llm_adapter, prompt, cache_purpose="blueprint"), arcs)
+    path = os.path.join(parts_dir, BLUEPRINT_ARCS_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(
+            {"number_of_chapters": number_of_chapters, "arcs": arcs, "outlines": outlines},
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+    os.replace(path + ".tmp", path)
+    return outlines
+
+async def _generate_arc_chapters(
+    llm_adapter,
+    architecture_text: str,
+    user_guidance: str,
+    number_of_chapters: int,
+    chunk_size: int,
+    arcs: List[Tuple[int, int]],
+    outlines: List[str],
+    arc_index: int,
+    first_chapter: int,
+    part_path: str,
+    boundary_text: str = "",
+    context_window: int = DEFAULT_CONTEXT_WINDOW,
+    max_tokens: int = BLUEPRINT_MAX_TOKENS_CAP,
+) -> bool:
+    """
+    串行生成单个段落内的各分块，结果逐块追加到段落文件 part_path。
+    已有段落文件时从其最后一章之后续写；任一分块为空返回 False。
+    各段落作为协程在同一事件循环上并发，文件读写放到线程中执行。
+    """
+    arc_start, arc_end = arcs[arc_index]
+    arc_text = (await asyncio.to_thread(read_file, part_path)).strip()
+    # 段落文件可能来自更早的并行运行，其间串行模式已把主目录写到 first_chapter - 1：
+    # 丢弃这些已写入主目录的章节，否则合并时会重复
+    kept_text = _drop_chapters_before(arc_text, first_chapter)
+    if kept_text != arc_text:
+        logging.warning(
+            f"[arc {arc_index + 1}] Dropping stale chapters before {first_chapter} from {os.path.basename(part_path)}."
+        )
+        await asyncio.to_thread(_replace_part_text, part_path, kept_text)
+        arc_text = kept_text
+    current_start = max(arc_start, first_chapter, _max_chapter_number(arc_text) + 1)
+    while current_start <= arc_end:
+        current_end = min(current_start + chunk_size - 1, arc_end)
+        chapter_list = "\n\n".join(part for part in (boundary_text, arc_text) if part)
+        chunk_prompt, _ = assemble_prompt(
+            arc_chunked_chapter_blueprint_prompt,
+            [
+                PromptSection(
+                    "chapter_list",
+                    limit_chapter_blueprint(chapter_list, BLUEPRINT_ROLLING_CHAPTERS),
+                    priority=0,
+                    keep="tail",
+                ),
+                PromptSection("novel_architecture", architecture_text, priority=1),
+            ],
+            context_window,
+            max_tokens,
+            number_of_chapters=number_of_chapters,
+            arc_start=arc_start,
+            arc_end=arc_end,
+            previous_arc_outline=outlines[arc_index - 1] if arc_index > 0 else "",
+            arc_outline=outlines[arc_index],
+            next_arc_outline=outlines[arc_index + 1] if arc_index + 1 < len(outlines) else "",
+            n=current_start,
+            m=current_end,
+            user_guidance=user_guidance,
+        )
+        logging.info(f"[arc {arc_index + 1}] Generating chapters [{current_start}..{current_end}] in a chunk...")
+        chunk_result = (await ainvoke_with_cleaning(llm_adapter, chunk_prompt, cache_purpose="blueprint")).strip()
+        if not chunk_result:
+            logging.warning(f"[arc {arc_index + 1}] Chunk generation for chapters [{current_start}..{current_end}] is empty.")
+            return False
+        await asyncio.to_thread(_append_blueprint_text, part_path, chunk_result)
+        arc_text = f"{arc_text}\n\n{chunk_result}" if arc_text else chunk_result
+        current_start = current_end + 1
+    return True
+
+def _replace_part_text(part_path: str, text: str) -> None:
+    with open(part_path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(part_path + ".tmp", part_path)
+
+def _merge_arc_part(filepath: str, part_path: str) -> None:
+    append_to_blueprint(filepath, read_file(part_path))
+    os.remove(part_path)
+
+async def _generate_and_merge_arcs(
+    llm_adapter,
+    filepath: str,
+    architecture_text: str,
+    user_guidance: str,
+    number_of_chapters: int,
+    chunk_size: int,
+    arcs: List[Tuple[int, int]],
+    outlines: List[str],
+    pending: List[int],
+    start_chapter: int,
+    part_paths: dict,
+    boundary_text: str,
+    parallel_workers: int,
+    context_window: int,
+    max_tokens: int,
+) -> Tuple[bool, Optional[Exception]]:
+    """
+    在一个事件循环上并发展开各段落，同时进行的段落数不超过 parallel_workers；
+    按段落顺序合并，返回 (是否全部合并, 首个异常)。
+    """
+    semaphore = asyncio.Semaphore(max(1, parallel_workers))
+
+    async def run_arc(i: int) -> bool:
+        async with semaphore:
+            return await _generate_arc_chapters(
+                llm_adapter,
+                architecture_text,
+                user_guidance,
+                number_of_chapters,
+                chunk_size,
+                arcs,
+                outlines,
+                i,
+                start_chapter,
+                part_paths[i],
+                boundary_text if i == pending[0] else "",
+                context_window,
+                max_tokens,
+            )
+
+    tasks = {i: asyncio.create_task(run_arc(i)) for i in pending}
+    merged_all = True
+    first_error = None
+    # 按段落顺序合并：前面的段落全部完成后才追加后面的段落，目录文件始终是连续前缀
+    for i in pending:
+        try:
+            completed = await tasks[i]
+        except Exception as e:
+            logging.error(f"[arc {i + 1}] Blueprint generation failed: {e}")
+            first_error = first_error or e
+            completed = False
+        if not completed or not merged_all:
+            merged_all = False
+            continue
+        await asyncio.to_thread(_merge_arc_part, filepath, part_paths[i])
+        logging.info(f"[arc {i + 1}] Merged chapters [{max(arcs[i][0], start_chapter)}..{arcs[i][1]}] into the blueprint.")
+    return merged_all, first_error
+
+def _generate_blueprint_parallel(
+    llm_adapter,
+    filepath: str,
+    architecture_text: str,
+    user_guidance: str,
+    number_of_chapters: int,
+    chunk_size: int,
+    existing_blueprint: str,
+    parallel_workers: int,
+    arc_chunks: int = BLUEPRINT_ARC_CHUNKS,
+    context_window: int = DEFAULT_CONTEXT_WINDOW,
+    max_tokens: int = BLUEPRINT_MAX_TOKENS_CAP,
+) -> None:
+    """
+    并行分块生成：先生成段落级骨架，再在事件循环上并发展开各段落（段落内串行），
+    每个段落以自身骨架及前后段落骨架为衔接条件；按段落顺序合并进目录文件。
+    中间结果保存在 blueprint_parts/，中断后再次调用可从断点继续。
+    """
+    start_chapter = _max_chapter_number(existing_blueprint) + 1
+    parts_dir = os.path.join(filepath, BLUEPRINT_PARTS_DIR)
+    os.makedirs(parts_dir, exist_ok=True)
+
+    skeleton = _load_arc_skeleton(parts_dir, number_of_chapters)
+    if skeleton and skeleton[0][0][0] <= start_chapter:
+        arcs, outlines = skeleton
+        logging.info(f"Resuming parallel blueprint generation with {len(arcs)} saved arcs.")
+    else:
+        arcs = plan_blueprint_arcs(start_chapter, number_of_chapters, chunk_size, arc_chunks)
+        outlines = _create_arc_skeleton(
+            llm_adapter,
+            parts_dir,
+            architecture_text,
+            user_guidance,
+            number_of_chapters,
+            arcs,
+            context_window,
+            max_tokens,
+        )
+
+    pending = [i for i, (_, arc_end) in enumerate(arcs) if arc_end >= start_chapter]
+    boundary_text = limit_chapter_blueprint(existing_blueprint, BLUEPRINT_BOUNDARY_CHAPTERS) if existing_blueprint else ""
+    part_paths = {i: os.path.join(parts_dir, f"arc_{i + 1}.txt") for i in pending}
+    merged_all, first_error = asyncio.run(
+        _generate_and_merge_arcs(
+            llm_adapter,
+            filepath,
+            architecture_text,
+            user_guidance,
+            number_of_chapters,
+            chunk_size,
+            arcs,
+            outlines,
+            pending,
+            start_chapter,
+            part_paths,
+            boundary_text,
+            parallel_workers,
+            context_window,
+            max_tokens,
+        )
+    )
+
+    if first_error is not None:
+        raise first_error
+    if merged_all:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        logging.info("Novel_directory.txt (chapter blueprint) has been generated successfully (parallel).")
+    else:
+        logging.warning("Parallel blueprint generation stopped early; completed arcs are kept for resume.")
+
 def Chapter_blueprint_generate(
     interface_format: str,
     api_key: str,
@@ -64,7 +427,9 @@ def Chapter_blueprint_generate(
     user_guidance: str = "",  # 新增参数
     temperature: float = 0.7,
     max_tokens: int = 4096,
-    timeout: int = 900
+    timeout: int = 900,
+    parallel_workers: int = 1,
+    context_window: int = DEFAULT_CONTEXT_WINDOW,
 ) -> None:
     """
     若 Novel_directory.txt 已存在且内容非空，则表示可能是之前的部分生成结果；
@@ -73,6 +438,9 @@ def Chapter_blueprint_generate(
     否则：
       - 若章节数 <= chunk_size，直接一次性生成
       - 若章节数 > chunk_size，进行分块生成
+      - parallel_workers > 1 且待生成章节多于一个分块时，按段落并行生成（见 _generate_blueprint_parallel）
+    分块大小按实测的每章 token 数与输出预算（不超过 context_window 的一半）计算；
+    提示词按 context_window 组装，超出时先裁剪已有目录的较早章节，再裁剪架构。
     生成完成后输出至 Novel_directory.txt。
     """
     arch_file = os.path.join(filepath, "Novel_architecture.txt")
@@ -107,89 +475,106 @@ def Chapter_blueprint_generate(
     filename_dir = os.path.join(filepath, "Novel_directory.txt")
     if not os.path.exists(filename_dir):
         open(filename_dir, "w", encoding="utf-8").close()
+    recover_blueprint_append(filepath)
 
-    existing_blueprint = read_file(filename_dir).strip()
-    chunk_size = compute_chunk_size(number_of_chapters, max_tokens)
-    logging.info(f"Number of chapters = {number_of_chapters}, computed chunk_size = {chunk_size}.")
-
-    if existing_blueprint:
-        logging.info("Detected existing blueprint content. Will resume chunked generation from that point.")
-        pattern = r"第\s*(\d+)\s*章"
-        existing_chapter_numbers = re.findall(pattern, existing_blueprint)
-        existing_chapter_numbers = [int(x) for x in existing_chapter_numbers if x.isdigit()]
-        max_existing_chap = max(existing_chapter_numbers) if existing_chapter_numbers else 0
-        logging.info(f"Existing blueprint indicates up to chapter {max_existing_chap} has been generated.")
-        final_blueprint = existing_blueprint
-        current_start = max_existing_chap + 1
-        while current_start <= number_of_chapters:
-            current_end = min(current_start + chunk_size - 1, number_of_chapters)
-            limited_blueprint = limit_chapter_blueprint(final_blueprint, 100)
-            chunk_prompt = chunked_chapter_blueprint_prompt.format(
-                novel_architecture=architecture_text,
-                chapter_list=limited_blueprint,
-                number_of_chapters=number_of_chapters,
-                n=current_start,
-                m=current_end,
-                user_guidance=user_guidance  # 新增参数
+    chapter_index = load_blueprint_index(filepath)
+    max_existing_chap = max(chapter_index, default=0)
+    has_existing = os.path.getsize(filename_dir) > 0
+    if has_existing:
+        # 标题格式不规范（如“### 第1章 - A”“第1章：A”）时严格解析可能少计，按宽松格式确定续写起点
+        with open(filename_dir, "rb") as f:
+            lenient_max = max_chapter_number_lenient(f)
+        if lenient_max > max_existing_chap:
+            logging.warning(
+                f"Blueprint has non-standard chapter headers up to chapter {lenient_max} "
+                f"(strictly parsed up to {max_existing_chap}); resuming after chapter {lenient_max}."
+            )
+            max_existing_chap = lenient_max
+        if max_existing_chap == 0:
+            raise ValueError(
+                "Novel_directory.txt 已有内容，但无法识别任何章节标题（应为“第N章 - 标题”）。"
+                "为避免重复生成目录，已停止续写，请修正标题格式或清空该文件后重试。"
             )
-            logging.info(f"Generating chapters [{current_start}..{current_end}] in a chunk...")
-            chunk_result = invoke_with_cleaning(llm_adapter, chunk_prompt)
-            if not chunk_result.strip():
-                logging.warning(f"Chunk generation for chapters [{current_start}..{current_end}] is empty.")
-                clear_file_content(filename_dir)
-                save_string_to_txt(final_blueprint.strip(), filename_dir)
-                return
-            final_blueprint += "\n\n" + chunk_result.strip()
-            clear_file_content(filename_dir)
-            save_string_to_txt(final_blueprint.strip(), filename_dir)
-            current_start = current_end + 1
-
-        logging.info("All chapters blueprint have been generated (resumed chunked).")
+    # 最近 BLUEPRINT_ROLLING_CHAPTERS 章的滚动窗口：只在启动时按索引偏移读取一次，之后随分块追加更新
+    window = deque(
+        (read_chapter_blueprint_text(filepath, number) for number in sorted(chapter_index)[-BLUEPRINT_ROLLING_CHAPTERS:]),
+        maxlen=BLUEPRINT_ROLLING_CHAPTERS,
+    )
+    context_window = resolve_context_window(context_window)
+    tokens_per_chapter = _measure_tokens_per_chapter(window)
+    chunk_size = compute_chunk_size(
+        number_of_chapters,
+        min(max_tokens, context_window // 2),
+        tokens_per_chapter=tokens_per_chapter,
+    )
+    logging.info(
+        f"Number of chapters = {number_of_chapters}, tokens per chapter = {tokens_per_chapter:.0f}, "
+        f"computed chunk_size = {chunk_size}."
+    )
+
+    if parallel_workers > 1 and number_of_chapters - max_existing_chap > chunk_size:
+        _generate_blueprint_parallel(
+            llm_adapter,
+            filepath,
+            architecture_text,
+            user_guidance,
+            number_of_chapters,
+            chunk_size,
+            read_file(filename_dir).strip(),
+            parallel_workers,
+            context_window=context_window,
+            max_tokens=max_tokens,
+        )
         return
 
-    if chunk_size >= number_of_chapters:
-        prompt = chapter_blueprint_prompt.format(
-            novel_architecture=architecture_text,
+    if not has_existing and chunk_size >= number_of_chapters:
+        prompt, _ = assemble_prompt(
+            chapter_blueprint_prompt,
+            [PromptSection("novel_architecture", architecture_text, priority=0)],
+            context_window,
+            max_tokens,
             number_of_chapters=number_of_chapters,
             user_guidance=user_guidance  # 新增参数
         )
-        blueprint_text = invoke_with_cleaning(llm_adapter, prompt)
+        blueprint_text = invoke_with_cleaning(llm_adapter, prompt, cache_purpose="blueprint")
         if not blueprint_text.strip():
             logging.warning("Chapter blueprint generation result is empty.")
             return
 
-        clear_file_content(filename_dir)
-        save_string_to_txt(blueprint_text, filename_dir)
+        append_to_blueprint(filepath, blueprint_text)
         logging.info("Novel_directory.txt (chapter blueprint) has been generated successfully (single-shot).")
         return
 
-    logging.info("Will generate chapter blueprint in chunked mode from scratch.")
-    final_blueprint = ""
-    current_start = 1
+    if has_existing:
+        logging.info("Detected existing blueprint content. Will resume chunked generation from that point.")
+        logging.info(f"Existing blueprint indicates up to chapter {max_existing_chap} has been generated.")
+    else:
+        logging.info("Will generate chapter blueprint in chunked mode from scratch.")
+
+    current_start = max_existing_chap + 1
     while current_start <= number_of_chapters:
         current_end = min(current_start + chunk_size - 1, number_of_chapters)
-        limited_blueprint = limit_chapter_blueprint(final_blueprint, 100)
-        chunk_prompt = chunked_chapter_blueprint_prompt.format(
-            novel_architecture=architecture_text,
-            chapter_list=limited_blueprint,
+        chunk_prompt, _ = assemble_prompt(
+            chunked_chapter_blueprint_prompt,
+            [
+                PromptSection("chapter_list", "\n\n".join(window), priority=0, keep="tail"),
+                PromptSection("novel_architecture", architecture_text, priority=1),
+            ],
+            context_window,
+            max_tokens,
             number_of_chapters=number_of_chapters,
             n=current_start,
             m=current_end,
             user_guidance=user_guidance  # 新增参数
         )
         logging.info(f"Generating chapters [{current_start}..{current_end}] in a chunk...")
-        chunk_result = invoke_with_cleaning(llm_adapter, chunk_prompt)
-        if not chunk_result.strip():
+        chunk_result = invoke_with_cleaning(llm_adapter, chunk_prompt, cache_purpose="blueprint").strip()
+        if not chunk_result:
             logging.warning(f"Chunk generation for chapters [{current_start}..{current_end}] is empty.")
-            clear_file_content(filename_dir)
-            save_string_to_txt(final_blueprint.strip(), filename_dir)
             return
-        if final_blueprint.strip():
-            final_blueprint += "\n\n" + chunk_result.strip()
-        else:
-            final_blueprint = chunk_result.strip()
-        clear_file_content(filename_dir)
-        save_string_to_txt(final_blueprint.strip(), filename_dir)
+        # 仅追加本分块（fsync + 原子索引），不再整文件重写
+        append_to_blueprint(filepath, chunk_result)
+        window.extend(_split_chapter_blocks(chunk_result))
         current_start = current_end + 1
 
     logging.info("Novel_directory.txt (chapter blueprint) has been generated successfully (chunked).")
@@ -7,6 +7,8 @@ import os
 import json
 import logging
 import re  # 添加re模块导入
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from llm_adapters import create_llm_adapter
 from prompt_definitions import (
     first_chapter_draft_prompt, 
@@ -15,7 +17,7 @@ from prompt_definitions import (
     knowledge_filter_prompt,
     knowledge_search_prompt
 )
-from chapter_directory_parser import get_chapter_info_from_blueprint
+from chapter_directory_parser import get_chapter_info
 from novel_generator.common import (
     is_cancelled_exception,
     invoke_with_cleaning_streaming,
@@ -27,6 +29,22 @@ from novel_generator.vectorstore_utils import (
     get_relevant_context_from_vector_store,
     load_vector_store  # 添加导入
 )
+from novel_generator.prompt_artifacts import (
+    compute_prompt_input_hash,
+    load_prompt_artifacts,
+    save_prompt_artifacts,
+)
+from novel_generator.entity_index import ENTITY_INDEX_FILE, EntityIndex, split_entity_field
+from novel_generator.summary_store import select_summary_context
+from novel_generator.token_budget import (
+    DEFAULT_CONTEXT_WINDOW,
+    PromptSection,
+    assemble_prompt,
+    count_tokens,
+    fit_sections,
+    input_token_budget,
+    truncate_to_tokens,
+)
 logging.basicConfig(
     filename='app.log',      # 日志文件名
     filemode='a',            # 追加模式（'w' 会覆盖）
@@ -35,6 +53,14 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
+# 各段落不随上下文窗口增长的绝对上限（tokens，中文约 1 token/字），窗口预算更小时以预算为准：
+# 前文摘要的输入与输出、前一章结尾、单次检索结果、知识过滤中的单条检索文本
+SUMMARY_INPUT_MAX_TOKENS = 4000
+SUMMARY_OUTPUT_MAX_TOKENS = 1500
+PREVIOUS_EXCERPT_MAX_TOKENS = 800
+RETRIEVAL_MAX_TOKENS = 2000
+KNOWLEDGE_SNIPPET_MAX_TOKENS = 600
+
 def get_last_n_chapters_text(chapters_dir: str, current_chapter_num: int, n: int = 3) -> list:
     """
     从目录 chapters_dir 中获取最近 n 章的文本内容，返回文本列表。
@@ -63,9 +89,11 @@ def summarize_recent_chapters(
     next_chapter_info: dict,      # 新增参数
     timeout: int = 900,
     should_cancel=None,
+    context_window: int = DEFAULT_CONTEXT_WINDOW,
 ) -> str:  # 修改返回值类型为 str，不再是 tuple
     """
     根据前三章内容生成当前章节的精准摘要。
+    前文按 context_window 的输入预算保留结尾部分，摘要不超过 SUMMARY_OUTPUT_MAX_TOKENS。
     如果解析失败，则返回空字符串。
     """
     try:
@@ -74,11 +102,6 @@ def summarize_recent_chapters(
         if not combined_text:
             return ""
             
-        # 限制组合文本长度
-        max_combined_length = 4000
-        if len(combined_text) > max_combined_length:
-            combined_text = combined_text[-max_combined_length:]
-            
         llm_adapter = create_llm_adapter(
             interface_format=interface_format,
             base_url=base_url,
@@ -93,8 +116,15 @@ def summarize_recent_chapters(
         chapter_info = chapter_info or {}
         next_chapter_info = next_chapter_info or {}
         
-        prompt = summarize_recent_chapters_prompt.format(
-            combined_text=combined_text,
+        prompt, _ = assemble_prompt(
+            summarize_recent_chapters_prompt,
+            [
+                PromptSection(
+                    "combined_text", combined_text, priority=0, keep="tail", max_tokens=SUMMARY_INPUT_MAX_TOKENS
+                )
+            ],
+            context_window,
+            max_tokens,
             novel_number=novel_number,
             chapter_title=chapter_info.get("chapter_title", "未命名"),
             chapter_role=chapter_info.get("chapter_role", "常规章节"),
@@ -117,15 +147,17 @@ def summarize_recent_chapters(
             llm_adapter,
             prompt,
             should_cancel=should_cancel,
+            cache_purpose="recent_summary",
         )
         raise_if_cancelled(should_cancel)
         summary = extract_summary_from_response(response_text)
         
         if not summary:
             logging.warning("Failed to extract summary, using full response")
-            return response_text[:2000]  # 限制长度
-            
-        return summary[:2000]  # 限制摘要长度
+            summary = response_text
+
+        # 按 token 限制摘要长度；写入章节提示词时还会按该段落的预算再裁剪
+        return truncate_to_tokens(summary, SUMMARY_OUTPUT_MAX_TOKENS)
         
     except Exception as e:
         if is_cancelled_exception(e):
@@ -245,8 +277,9 @@ def get_filtered_knowledge_context(
     max_tokens: int = 2048,
     timeout: int = 900,
     should_cancel=None,
+    context_window: int = DEFAULT_CONTEXT_WINDOW,
 ) -> str:
-    """优化后的知识过滤处理"""
+    """优化后的知识过滤处理，检索文本按 context_window 的输入预算均分并截断"""
     if not retrieved_texts:
         return "（无相关知识库内容）"
 
@@ -263,14 +296,6 @@ def get_filtered_knowledge_context(
             timeout=timeout
         )
         
-        # 限制检索文本长度并格式化
-        formatted_texts = []
-        max_text_length = 600
-        for i, text in enumerate(processed_texts, 1):
-            if len(text) > max_text_length:
-                text = text[:max_text_length] + "..."
-            formatted_texts.append(f"[预处理结果{i}]\n{text}")
-
         # 使用格式化函数处理章节信息
         formatted_chapter_info = (
             f"当前章节定位：{chapter_info.get('chapter_role', '')}\n"
@@ -280,6 +305,28 @@ def get_filtered_knowledge_context(
             f"{chapter_info.get('scene_location', '')}"
         )
 
+        # 检索文本均分输入预算，总量超出时先裁剪排在后面的结果
+        sections = [
+            PromptSection(
+                f"retrieved_{i}",
+                text,
+                priority=-i,
+                share=1.0 / len(processed_texts),
+                max_tokens=KNOWLEDGE_SNIPPET_MAX_TOKENS,
+            )
+            for i, text in enumerate(processed_texts, 1)
+        ]
+        budget = input_token_budget(context_window, max_tokens) - count_tokens(
+            knowledge_filter_prompt.format(chapter_info=formatted_chapter_info, retrieved_texts="")
+        )
+        budget -= sum(count_tokens(f"[预处理结果{i}]\n\n\n") for i in range(1, len(sections) + 1))
+        fitted, _ = fit_sections(sections, budget)
+        formatted_texts = [
+            f"[预处理结果{i}]\n{fitted[section.name]}"
+            for i, section in enumerate(sections, 1)
+            if fitted[section.name]
+        ]
+
         prompt = knowledge_filter_prompt.format(
             chapter_info=formatted_chapter_info,
             retrieved_texts="\n\n".join(formatted_texts) if formatted_texts else "（无检索结果）"
@@ -289,6 +336,7 @@ def get_filtered_knowledge_context(
             llm_adapter,
             prompt,
             should_cancel=should_cancel,
+            cache_purpose="knowledge_filter",
         )
         raise_if_cancelled(should_cancel)
         return filtered_content if filtered_content else "（知识内容过滤失败）"
@@ -299,7 +347,69 @@ def get_filtered_knowledge_context(
         logging.error(f"Error in knowledge filtering: {str(e)}")
         return "（内容过滤过程出错）"
 
-def build_chapter_prompt(
+# 提示词构建的并行度：前文摘要、向量库预检索与关键词组检索共用
+PROMPT_BUILD_WORKERS = 6
+# 单条检索结果的预算份数：最多 5 组关键词 + 2 条蓝图预检索，共享知识过滤提示词的输入预算
+RETRIEVAL_BUDGET_SLOTS = 7
+# apply_content_rules 会跳过的最近章节数；按实体索引限定检索范围时直接排除这些章节
+RETRIEVAL_SKIP_RECENT_CHAPTERS = 2
+
+def _wait_future(future, should_cancel=None):
+    """等待后台阶段完成，期间轮询取消信号。"""
+    while not future.done():
+        raise_if_cancelled(should_cancel)
+        wait([future], timeout=0.2)
+    return future.result()
+
+def _blueprint_queries(chapter_info: dict, characters_involved: str, key_items: str, scene_location: str) -> list:
+    """由蓝图与用户填写的要素构造预检索查询（不依赖 LLM 关键词），与前文摘要并行执行。"""
+    queries = []
+    outline = " ".join(
+        part for part in (chapter_info.get("chapter_title", ""), chapter_info.get("chapter_summary", "")) if part
+    ).strip()
+    if outline:
+        queries.append(outline[:200])
+    elements = " ".join(part for part in (characters_involved, key_items, scene_location) if part).strip()
+    if elements:
+        queries.append(elements[:200])
+    return queries
+
+def _entity_retrieval_chapters(
+    filepath: str,
+    novel_number: int,
+    characters_involved: str,
+    key_items: str,
+    scene_location: str,
+    chapter_summary: str,
+):
+    """
+    由实体索引确定检索范围：本章填写的角色/道具/地点（未填写时取蓝图摘要中出现的已知实体）出现过的章节，
+    不含最近 RETRIEVAL_SKIP_RECENT_CHAPTERS 章。无可用记录时返回 None，表示不按章节过滤。
+    只读查询：填写的要素在生成草稿后才登记到词表（见 backend.services.generate_draft），不在构造提示词时写索引。
+    """
+    if not os.path.exists(os.path.join(filepath, ENTITY_INDEX_FILE)):
+        return None
+    try:
+        index = EntityIndex(filepath)
+        names = [
+            *split_entity_field(characters_involved),
+            *split_entity_field(key_items),
+            *split_entity_field(scene_location),
+        ] or index.match(chapter_summary)
+        chapters = index.chapters_for(names, before=novel_number - RETRIEVAL_SKIP_RECENT_CHAPTERS)
+    except Exception as e:
+        logging.warning(f"Entity index lookup failed: {e}")
+        return None
+    return chapters or None
+
+def _tag_context(group: str, context: str) -> str:
+    if any(kw in group.lower() for kw in ["技法", "手法", "模板"]):
+        return f"[TECHNIQUE] {context}"
+    if any(kw in group.lower() for kw in ["设定", "技术", "世界观"]):
+        return f"[SETTING] {context}"
+    return f"[GENERAL] {context}"
+
+def build_chapter_prompt_artifacts(
     api_key: str,
     base_url: str,
     model_name: str,
@@ -317,221 +427,388 @@ def build_chapter_prompt(
     embedding_interface_format: str,
     embedding_model_name: str,
     embedding_retrieval_k: int = 2,
+    retrieval_mode: str = "vector",
     interface_format: str = "openai",
     max_tokens: int = 2048,
     timeout: int = 900,
     should_cancel=None,
-) -> str:
+    reuse_artifacts: bool = True,
+    context_window: int = DEFAULT_CONTEXT_WINDOW,
+) -> dict:
     """
-    构造当前章节的请求提示词（完整实现版）
+    构造当前章节的请求提示词（完整实现版），返回提示词及中间产物：
+    {"prompt_text", "short_summary", "keyword_groups", "filtered_context", "token_budget",
+     "input_hash", "reused", "timings"}
     修改重点：
     1. 优化知识库检索流程
     2. 新增内容重复检测机制
     3. 集成提示词应用规则
+    4. 按 (项目, 章节, 输入哈希) 持久化产物，输入未变时直接复用，省去三次 LLM 调用
+    5. 各阶段按依赖并行：文件并行读取；前文摘要与打开向量库、蓝图预检索同时进行；
+       关键词组并行检索。timings 记录各阶段耗时（秒）
+    6. 按 context_window 与 max_tokens 计算输入预算，前文摘要、前章结尾、角色状态、知识上下文、
+       全局摘要按优先级分配，超出时从全局摘要开始裁剪；token_budget 为预算报告
+    7. 按实体索引把检索限定在本章角色/道具/地点出现过的章节（知识库文档不受限制），减少无关片段
     """
+    total_started = time.perf_counter()
+    timings = {}
     raise_if_cancelled(should_cancel)
-    # 读取基础文件
-    arch_file = os.path.join(filepath, "Novel_architecture.txt")
-    novel_architecture_text = read_file(arch_file)
-    directory_file = os.path.join(filepath, "Novel_directory.txt")
-    blueprint_text = read_file(directory_file)
-    global_summary_file = os.path.join(filepath, "global_summary.txt")
-    global_summary_text = read_file(global_summary_file)
-    character_state_file = os.path.join(filepath, "character_state.txt")
-    character_state_text = read_file(character_state_file)
-    
-    # 获取章节信息
-    chapter_info = get_chapter_info_from_blueprint(blueprint_text, novel_number)
-    chapter_title = chapter_info["chapter_title"]
-    chapter_role = chapter_info["chapter_role"]
-    chapter_purpose = chapter_info["chapter_purpose"]
-    suspense_level = chapter_info["suspense_level"]
-    foreshadowing = chapter_info["foreshadowing"]
-    plot_twist_level = chapter_info["plot_twist_level"]
-    chapter_summary = chapter_info["chapter_summary"]
-
-    # 获取下一章节信息
-    next_chapter_number = novel_number + 1
-    next_chapter_info = get_chapter_info_from_blueprint(blueprint_text, next_chapter_number)
-    next_chapter_title = next_chapter_info.get("chapter_title", "（未命名）")
-    next_chapter_role = next_chapter_info.get("chapter_role", "过渡章节")
-    next_chapter_purpose = next_chapter_info.get("chapter_purpose", "承上启下")
-    next_chapter_suspense = next_chapter_info.get("suspense_level", "中等")
-    next_chapter_foreshadow = next_chapter_info.get("foreshadowing", "无特殊伏笔")
-    next_chapter_twist = next_chapter_info.get("plot_twist_level", "★☆☆☆☆")
-    next_chapter_summary = next_chapter_info.get("chapter_summary", "衔接过渡内容")
-
-    # 创建章节目录
-    chapters_dir = os.path.join(filepath, "chapters")
-    os.makedirs(chapters_dir, exist_ok=True)
+    pool = ThreadPoolExecutor(max_workers=PROMPT_BUILD_WORKERS)
+    try:
+        # 阶段 1：并行读取基础文件与前文
+        stage_started = time.perf_counter()
+        chapters_dir = os.path.join(filepath, "chapters")
+        os.makedirs(chapters_dir, exist_ok=True)
+        file_futures = {
+            name: pool.submit(read_file, os.path.join(filepath, name))
+            for name in ("Novel_architecture.txt", "character_state.txt")
+        }
+        # 分层摘要：全书梗概 + 最近分卷 + 本卷已定稿章节（无分层存储时为 global_summary.txt）
+        file_futures["global_summary.txt"] = pool.submit(select_summary_context, filepath, novel_number)
+        recent_future = None
+        if novel_number != 1:
+            recent_future = pool.submit(get_last_n_chapters_text, chapters_dir, novel_number, 3)
+        novel_architecture_text = file_futures["Novel_architecture.txt"].result()
+        global_summary_text = file_futures["global_summary.txt"].result()
+        character_state_text = file_futures["character_state.txt"].result()
+        recent_texts = recent_future.result() if recent_future else []
+        timings["read_files_seconds"] = round(time.perf_counter() - stage_started, 3)
 
-    # 第一章特殊处理
-    if novel_number == 1:
-        raise_if_cancelled(should_cancel)
-        return first_chapter_draft_prompt.format(
-            novel_number=novel_number,
-            word_number=word_number,
-            chapter_title=chapter_title,
-            chapter_role=chapter_role,
-            chapter_purpose=chapter_purpose,
-            suspense_level=suspense_level,
-            foreshadowing=foreshadowing,
-            plot_twist_level=plot_twist_level,
-            chapter_summary=chapter_summary,
-            characters_involved=characters_involved,
-            key_items=key_items,
-            scene_location=scene_location,
-            time_constraint=time_constraint,
-            user_guidance=user_guidance,
-            novel_setting=novel_architecture_text
-        )
+        # 获取章节信息（缓存的结构化蓝图索引，按源文件 mtime 失效）
+        stage_started = time.perf_counter()
+        chapter_info = get_chapter_info(filepath, novel_number)
+        chapter_title = chapter_info["chapter_title"]
+        chapter_role = chapter_info["chapter_role"]
+        chapter_purpose = chapter_info["chapter_purpose"]
+        suspense_level = chapter_info["suspense_level"]
+        foreshadowing = chapter_info["foreshadowing"]
+        plot_twist_level = chapter_info["plot_twist_level"]
+        chapter_summary = chapter_info["chapter_summary"]
 
-    # 获取前文内容和摘要
-    recent_texts = get_last_n_chapters_text(chapters_dir, novel_number, n=3)
-    
-    try:
-        logging.info("Attempting to generate summary")
-        short_summary = summarize_recent_chapters(
-            interface_format=interface_format,
-            api_key=api_key,
-            base_url=base_url,
-            model_name=model_name,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            chapters_text_list=recent_texts,
-            novel_number=novel_number,
-            chapter_info=chapter_info,
-            next_chapter_info=next_chapter_info,
-            timeout=timeout,
-            should_cancel=should_cancel,
-        )
-        logging.info("Summary generated successfully")
-    except Exception as e:
-        if is_cancelled_exception(e):
-            raise
-        logging.error(f"Error in summarize_recent_chapters: {str(e)}")
-        short_summary = "（摘要生成失败）"
+        # 获取下一章节信息
+        next_chapter_number = novel_number + 1
+        next_chapter_info = get_chapter_info(filepath, next_chapter_number)
+        next_chapter_title = next_chapter_info.get("chapter_title", "（未命名）")
+        next_chapter_role = next_chapter_info.get("chapter_role", "过渡章节")
+        next_chapter_purpose = next_chapter_info.get("chapter_purpose", "承上启下")
+        next_chapter_suspense = next_chapter_info.get("suspense_level", "中等")
+        next_chapter_foreshadow = next_chapter_info.get("foreshadowing", "无特殊伏笔")
+        next_chapter_twist = next_chapter_info.get("plot_twist_level", "★☆☆☆☆")
+        next_chapter_summary = next_chapter_info.get("chapter_summary", "衔接过渡内容")
+        timings["blueprint_index_seconds"] = round(time.perf_counter() - stage_started, 3)
 
-    # 获取前一章结尾
-    previous_excerpt = ""
-    for text in reversed(recent_texts):
-        if text.strip():
-            previous_excerpt = text[-800:] if len(text) > 800 else text
-            break
+        # 第一章特殊处理
+        if novel_number == 1:
+            raise_if_cancelled(should_cancel)
+            prompt_text, token_budget = assemble_prompt(
+                first_chapter_draft_prompt,
+                [PromptSection("novel_setting", novel_architecture_text, priority=0)],
+                context_window,
+                max_tokens,
+                novel_number=novel_number,
+                word_number=word_number,
+                chapter_title=chapter_title,
+                chapter_role=chapter_role,
+                chapter_purpose=chapter_purpose,
+                suspense_level=suspense_level,
+                foreshadowing=foreshadowing,
+                plot_twist_level=plot_twist_level,
+                chapter_summary=chapter_summary,
+                characters_involved=characters_involved,
+                key_items=key_items,
+                scene_location=scene_location,
+                time_constraint=time_constraint,
+                user_guidance=user_guidance,
+            )
+            timings["total_seconds"] = round(time.perf_counter() - total_started, 3)
+            return {
+                "prompt_text": prompt_text,
+                "short_summary": "",
+                "keyword_groups": [],
+                "filtered_context": "",
+                "token_budget": token_budget,
+                "input_hash": "",
+                "reused": False,
+                "timings": timings,
+            }
 
-    # 知识库检索和处理
-    try:
-        raise_if_cancelled(should_cancel)
-        # 生成检索关键词
-        llm_adapter = create_llm_adapter(
-            interface_format=interface_format,
-            base_url=base_url,
-            model_name=model_name,
-            api_key=api_key,
-            temperature=0.3,
-            max_tokens=max_tokens,
-            timeout=timeout
-        )
-        
-        search_prompt = knowledge_search_prompt.format(
-            chapter_number=novel_number,
-            chapter_title=chapter_title,
-            characters_involved=characters_involved,
-            key_items=key_items,
-            scene_location=scene_location,
-            chapter_role=chapter_role,
-            chapter_purpose=chapter_purpose,
-            foreshadowing=foreshadowing,
-            short_summary=short_summary,
-            user_guidance=user_guidance,
-            time_constraint=time_constraint
+        stage_started = time.perf_counter()
+        entity_chapters = _entity_retrieval_chapters(
+            filepath, novel_number, characters_involved, key_items, scene_location, chapter_summary
         )
-        
-        search_response = invoke_with_cleaning_streaming(
-            llm_adapter,
-            search_prompt,
-            should_cancel=should_cancel,
-        )
-        raise_if_cancelled(should_cancel)
-        keyword_groups = parse_search_keywords(search_response)
-
-        # 执行向量检索
-        all_contexts = []
-        from embedding_adapters import create_embedding_adapter
-        embedding_adapter = create_embedding_adapter(
-            embedding_interface_format,
-            embedding_api_key,
-            embedding_url,
-            embedding_model_name
+        timings["entity_index_seconds"] = round(time.perf_counter() - stage_started, 3)
+
+        # 输入未变化时复用上一次构建的提示词与中间产物
+        input_hash = compute_prompt_input_hash(
+            filepath,
+            {
+                "novel_number": novel_number,
+                "word_number": word_number,
+                # 前文摘要、检索关键词与知识过滤均由 LLM 生成，换模型或温度后不复用
+                "llm": {
+                    "interface_format": interface_format,
+                    "base_url": base_url,
+                    "model_name": model_name,
+                    "temperature": temperature,
+                },
+                "user_guidance": user_guidance,
+                "characters_involved": characters_involved,
+                "key_items": key_items,
+                "scene_location": scene_location,
+                "time_constraint": time_constraint,
+                "embedding_interface_format": embedding_interface_format,
+                "embedding_model_name": embedding_model_name,
+                "embedding_retrieval_k": embedding_retrieval_k,
+                "retrieval_mode": retrieval_mode,
+                "context_window": context_window,
+                "max_tokens": max_tokens,
+                "entity_chapters": entity_chapters,
+            },
+            [
+                novel_architecture_text,
+                json.dumps([chapter_info, next_chapter_info], ensure_ascii=False, sort_keys=True),
+                global_summary_text,
+                character_state_text,
+                *recent_texts,
+            ],
         )
-        
-        store = load_vector_store(embedding_adapter, filepath)
-        if store:
-            collection_size = store._collection.count()
-            actual_k = min(embedding_retrieval_k, max(1, collection_size))
-            
-            for group in keyword_groups:
-                context = get_relevant_context_from_vector_store(
-                    embedding_adapter=embedding_adapter,
-                    query=group,
-                    filepath=filepath,
-                    k=actual_k
+        if reuse_artifacts:
+            cached = load_prompt_artifacts(filepath, novel_number, input_hash)
+            if cached:
+                logging.info(f"Reusing prompt artifacts for chapter {novel_number} ({input_hash[:12]}).")
+                timings["total_seconds"] = round(time.perf_counter() - total_started, 3)
+                return {
+                    "prompt_text": cached["prompt_text"],
+                    "short_summary": cached.get("short_summary", ""),
+                    "keyword_groups": cached.get("keyword_groups", []),
+                    "filtered_context": cached.get("filtered_context", ""),
+                    "token_budget": cached.get("token_budget", {}),
+                    "input_hash": input_hash,
+                    "reused": True,
+                    "timings": timings,
+                }
+
+        # 阶段 2：前文摘要（LLM）与打开向量库 + 基于蓝图的预检索并行
+        def run_summary() -> str:
+            started = time.perf_counter()
+            try:
+                return summarize_recent_chapters(
+                    interface_format=interface_format,
+                    api_key=api_key,
+                    base_url=base_url,
+                    model_name=model_name,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    chapters_text_list=recent_texts,
+                    novel_number=novel_number,
+                    chapter_info=chapter_info,
+                    next_chapter_info=next_chapter_info,
+                    timeout=timeout,
+                    should_cancel=should_cancel,
+                    context_window=context_window,
                 )
-                if context:
-                    if any(kw in group.lower() for kw in ["技法", "手法", "模板"]):
-                        all_contexts.append(f"[TECHNIQUE] {context}")
-                    elif any(kw in group.lower() for kw in ["设定", "技术", "世界观"]):
-                        all_contexts.append(f"[SETTING] {context}")
-                    else:
-                        all_contexts.append(f"[GENERAL] {context}")
-
-        # 应用内容规则
-        processed_contexts = apply_content_rules(all_contexts, novel_number)
-        
-        # 执行知识过滤
-        chapter_info_for_filter = {
-            "chapter_number": novel_number,
-            "chapter_title": chapter_title,
-            "chapter_role": chapter_role,
-            "chapter_purpose": chapter_purpose,
-            "characters_involved": characters_involved,
-            "key_items": key_items,
-            "scene_location": scene_location,
-            "foreshadowing": foreshadowing,  # 修复拼写错误
-            "suspense_level": suspense_level,
-            "plot_twist_level": plot_twist_level,
-            "chapter_summary": chapter_summary,
-            "time_constraint": time_constraint
-        }
-        
-        filtered_context = get_filtered_knowledge_context(
-            api_key=api_key,
-            base_url=base_url,
-            model_name=model_name,
-            interface_format=interface_format,
-            embedding_adapter=embedding_adapter,
-            filepath=filepath,
-            chapter_info=chapter_info_for_filter,
-            retrieved_texts=processed_contexts,
-            max_tokens=max_tokens,
-            timeout=timeout,
-            should_cancel=should_cancel,
+            finally:
+                timings["recent_summary_seconds"] = round(time.perf_counter() - started, 3)
+
+        def open_store():
+            started = time.perf_counter()
+            from embedding_adapters import get_embedding_adapter
+            embedding_adapter = get_embedding_adapter(
+                embedding_interface_format,
+                embedding_api_key,
+                embedding_url,
+                embedding_model_name
+            )
+            store = load_vector_store(embedding_adapter, filepath)
+            actual_k = 0
+            if store:
+                collection_size = store._collection.count()
+                actual_k = min(embedding_retrieval_k, max(1, collection_size))
+            timings["vector_store_open_seconds"] = round(time.perf_counter() - started, 3)
+            return embedding_adapter, actual_k
+
+        retrieval_tokens = max(
+            1, min(RETRIEVAL_MAX_TOKENS, input_token_budget(context_window, max_tokens) // RETRIEVAL_BUDGET_SLOTS)
         )
-        
-    except Exception as e:
-        if is_cancelled_exception(e):
-            raise
-        logging.error(f"知识处理流程异常：{str(e)}")
-        filtered_context = "（知识库处理失败）"
+
+        def retrieve(embedding_adapter, actual_k: int, query: str) -> str:
+            raise_if_cancelled(should_cancel)
+            return get_relevant_context_from_vector_store(
+                embedding_adapter=embedding_adapter,
+                query=query,
+                filepath=filepath,
+                k=actual_k,
+                retrieval_mode=retrieval_mode,
+                max_tokens=retrieval_tokens,
+                chapters=entity_chapters,
+            )
+
+        def speculative_retrieve():
+            embedding_adapter, actual_k = open_store()
+            started = time.perf_counter()
+            contexts = []
+            if actual_k:
+                queries = _blueprint_queries(chapter_info, characters_involved, key_items, scene_location)
+                contexts = [
+                    (query, retrieve(embedding_adapter, actual_k, query))
+                    for query in queries
+                ]
+            timings["speculative_retrieval_seconds"] = round(time.perf_counter() - started, 3)
+            return embedding_adapter, actual_k, contexts
+
+        summary_future = pool.submit(run_summary)
+        store_future = pool.submit(speculative_retrieve)
+
+        # 任一阶段失败时不持久化，避免后续复用降级结果
+        degraded = False
+        keyword_groups = []
+        try:
+            logging.info("Attempting to generate summary")
+            short_summary = _wait_future(summary_future, should_cancel)
+            logging.info("Summary generated successfully")
+        except Exception as e:
+            if is_cancelled_exception(e):
+                raise
+            logging.error(f"Error in summarize_recent_chapters: {str(e)}")
+            short_summary = "（摘要生成失败）"
+            degraded = True
+        if not short_summary and any(text.strip() for text in recent_texts):
+            degraded = True
+
+        # 获取前一章结尾（组装提示词时按预算保留结尾部分）
+        previous_excerpt = ""
+        for text in reversed(recent_texts):
+            if text.strip():
+                previous_excerpt = text
+                break
+
+        # 知识库检索和处理
+        try:
+            raise_if_cancelled(should_cancel)
+            # 生成检索关键词
+            stage_started = time.perf_counter()
+            llm_adapter = create_llm_adapter(
+                interface_format=interface_format,
+                base_url=base_url,
+                model_name=model_name,
+                api_key=api_key,
+                temperature=0.3,
+                max_tokens=max_tokens,
+                timeout=timeout
+            )
+            
+            search_prompt = knowledge_search_prompt.format(
+                chapter_number=novel_number,
+                chapter_title=chapter_title,
+                characters_involved=characters_involved,
+                key_items=key_items,
+                scene_location=scene_location,
+                chapter_role=chapter_role,
+                chapter_purpose=chapter_purpose,
+                foreshadowing=foreshadowing,
+                short_summary=short_summary,
+                user_guidance=user_guidance,
+                time_constraint=time_constraint
+            )
+            
+            search_response = invoke_with_cleaning_streaming(
+                llm_adapter,
+                search_prompt,
+                should_cancel=should_cancel,
+                cache_purpose="keyword_search",
+            )
+            raise_if_cancelled(should_cancel)
+            keyword_groups = parse_search_keywords(search_response)
+            timings["keyword_search_seconds"] = round(time.perf_counter() - stage_started, 3)
+
+            # 执行向量检索：关键词组并行检索，并合并蓝图预检索结果
+            embedding_adapter, actual_k, speculative_contexts = _wait_future(store_future, should_cancel)
+            stage_started = time.perf_counter()
+            retrieved = []
+            if actual_k:
+                group_futures = [
+                    (group, pool.submit(retrieve, embedding_adapter, actual_k, group))
+                    for group in keyword_groups
+                ]
+                retrieved = [(group, _wait_future(future, should_cancel)) for group, future in group_futures]
+            all_contexts = []
+            seen_contexts = set()
+            for group, context in retrieved + speculative_contexts:
+                if not context or context in seen_contexts:
+                    continue
+                seen_contexts.add(context)
+                all_contexts.append(_tag_context(group, context))
+            timings["retrieval_seconds"] = round(time.perf_counter() - stage_started, 3)
+
+            # 应用内容规则
+            processed_contexts = apply_content_rules(all_contexts, novel_number)
+            
+            # 执行知识过滤
+            chapter_info_for_filter = {
+                "chapter_number": novel_number,
+                "chapter_title": chapter_title,
+                "chapter_role": chapter_role,
+                "chapter_purpose": chapter_purpose,
+                "characters_involved": characters_involved,
+                "key_items": key_items,
+                "scene_location": scene_location,
+                "foreshadowing": foreshadowing,  # 修复拼写错误
+                "suspense_level": suspense_level,
+                "plot_twist_level": plot_twist_level,
+                "chapter_summary": chapter_summary,
+                "time_constraint": time_constraint
+            }
+            
+            stage_started = time.perf_counter()
+            filtered_context = get_filtered_knowledge_context(
+                api_key=api_key,
+                base_url=base_url,
+                model_name=model_name,
+                interface_format=interface_format,
+                embedding_adapter=embedding_adapter,
+                filepath=filepath,
+                chapter_info=chapter_info_for_filter,
+                retrieved_texts=processed_contexts,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                should_cancel=should_cancel,
+                context_window=context_window,
+            )
+            timings["knowledge_filter_seconds"] = round(time.perf_counter() - stage_started, 3)
+            if filtered_context in ("（知识内容过滤失败）", "（内容过滤过程出错）"):
+                degraded = True
+            
+        except Exception as e:
+            if is_cancelled_exception(e):
+                raise
+            logging.error(f"知识处理流程异常：{str(e)}")
+            filtered_context = "（知识库处理失败）"
+            degraded = True
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
 
     # 返回最终提示词
     raise_if_cancelled(should_cancel)
-    return next_chapter_draft_prompt.format(
+    prompt_text, token_budget = assemble_prompt(
+        next_chapter_draft_prompt,
+        [
+            PromptSection("short_summary", short_summary, priority=4, share=0.2, min_tokens=200),
+            PromptSection(
+                "previous_chapter_excerpt",
+                previous_excerpt,
+                priority=3,
+                share=0.05,
+                min_tokens=200,
+                keep="tail",
+                max_tokens=PREVIOUS_EXCERPT_MAX_TOKENS,
+            ),
+            PromptSection("character_state", character_state_text, priority=2, share=0.3, min_tokens=300),
+            PromptSection("filtered_context", filtered_context, priority=1, share=0.25),
+            PromptSection("global_summary", global_summary_text, priority=0, share=0.25, keep="tail"),
+        ],
+        context_window,
+        max_tokens,
         user_guidance=user_guidance if user_guidance else "无特殊指导",
-        global_summary=global_summary_text,
-        previous_chapter_excerpt=previous_excerpt,
-        character_state=character_state_text,
-        short_summary=short_summary,
         novel_number=novel_number,
         chapter_title=chapter_title,
         chapter_role=chapter_role,
@@ -553,8 +830,25 @@ def build_chapter_prompt(
         next_chapter_foreshadowing=next_chapter_foreshadow,
         next_chapter_plot_twist_level=next_chapter_twist,
         next_chapter_summary=next_chapter_summary,
-        filtered_context=filtered_context
     )
+    artifacts = {
+        "prompt_text": prompt_text,
+        "short_summary": short_summary,
+        "keyword_groups": keyword_groups,
+        "filtered_context": filtered_context,
+        "token_budget": token_budget,
+    }
+    if not degraded:
+        save_prompt_artifacts(filepath, novel_number, input_hash, artifacts)
+    timings["total_seconds"] = round(time.perf_counter() - total_started, 3)
+    logging.info(f"Chapter {novel_number} prompt built: {timings}")
+    return {**artifacts, "input_hash": input_hash, "reused": False, "timings": timings}
+
+def build_chapter_prompt(*args, **kwargs) -> str:
+    """
+    构造当前章节的请求提示词，参数同 build_chapter_prompt_artifacts，仅返回提示词文本。
+    """
+    return build_chapter_prompt_artifacts(*args, **kwargs)["prompt_text"]
 
 def generate_chapter_draft(
     api_key: str,
@@ -574,12 +868,15 @@ def generate_chapter_draft(
     embedding_interface_format: str,
     embedding_model_name: str,
     embedding_retrieval_k: int = 2,
+    retrieval_mode: str = "vector",
     interface_format: str = "openai",
     max_tokens: int = 2048,
     timeout: int = 900,
     custom_prompt_text: str = None,
     save_to_file: bool = True,
     should_cancel=None,
+    reuse_artifacts: bool = True,
+    context_window: int = DEFAULT_CONTEXT_WINDOW,
 ) -> str:
     """
     生成章节草稿，支持自定义提示词
@@ -604,10 +901,13 @@ def generate_chapter_draft(
             embedding_interface_format=embedding_interface_format,
             embedding_model_name=embedding_model_name,
             embedding_retrieval_k=embedding_retrieval_k,
+            retrieval_mode=retrieval_mode,
             interface_format=interface_format,
             max_tokens=max_tokens,
             timeout=timeout,
             should_cancel=should_cancel,
+            reuse_artifacts=reuse_artifacts,
+            context_window=context_window,
         )
     else:
         prompt_text = custom_prompt_text
@@ -631,6 +931,7 @@ def generate_chapter_draft(
             llm_adapter,
             prompt_text,
             should_cancel=should_cancel,
+            cache_purpose="draft",
         )
     )
     raise_if_cancelled(should_cancel)
@@ -662,11 +963,14 @@ def generate_chapter_draft_stream(
     embedding_interface_format: str,
     embedding_model_name: str,
     embedding_retrieval_k: int = 2,
+    retrieval_mode: str = "vector",
     interface_format: str = "openai",
     max_tokens: int = 2048,
     timeout: int = 900,
     custom_prompt_text: str = None,
     should_cancel=None,
+    reuse_artifacts: bool = True,
+    context_window: int = DEFAULT_CONTEXT_WINDOW,
 ):
     """
     流式生成章节草稿，返回生成器
@@ -691,10 +995,13 @@ def generate_chapter_draft_stream(
             embedding_interface_format=embedding_interface_format,
             embedding_model_name=embedding_model_name,
             embedding_retrieval_k=embedding_retrieval_k,
+            retrieval_mode=retrieval_mode,
             interface_format=interface_format,
             max_tokens=max_tokens,
             timeout=timeout,
             should_cancel=should_cancel,
+            reuse_artifacts=reuse_artifacts,
+            context_window=context_window,
         )
     else:
         prompt_text = custom_prompt_text
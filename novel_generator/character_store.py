@@ -0,0 +1,243 @@
+#novel_generator/character_store.py
+# -*- coding: utf-8 -*-
+"""
+结构化角色状态：按角色保存分栏条目（物品/能力/状态/关系/事件）于 character_state.json，
+定稿时只向 LLM 请求本章出场角色的变化字段（JSON 增量），本地合并后渲染为 character_state.txt。
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from novel_generator.common import raise_if_cancelled
+from prompt_definitions import character_state_delta_prompt, update_character_state_prompt
+from utils import read_file
+
+logging.basicConfig(
+    filename='app.log',      # 日志文件名
+    filemode='a',            # 追加模式（'w' 会覆盖）
+    level=logging.INFO,      # 记录 INFO 及以上级别的日志
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+CHARACTER_STORE_FILE = "character_state.json"
+CHARACTER_STATE_FILE = "character_state.txt"
+MINOR_CHARACTERS_HEADER = "新出场角色"
+
+_TREE_CHARS = "│├└─ \t"
+_KEY_VALUE_PATTERN = re.compile(r"^(.*?)\s*[：:]\s*(.*)$")
+_store_lock = threading.Lock()
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256((text or "").strip().encode("utf-8")).hexdigest()
+
+
+def _empty_store() -> Dict[str, Any]:
+    return {"characters": {}, "minor_characters": {}, "notes": [], "view_hash": ""}
+
+
+def _split_key_value(content: str):
+    match = _KEY_VALUE_PATTERN.match(content)
+    if not match or not match.group(1):
+        return content, ""
+    return match.group(1).strip(), match.group(2).strip()
+
+
+def parse_character_state_text(text: str) -> Dict[str, Any]:
+    """
+    把树形角色状态文本解析为结构化记录：
+    顶格的“名字：”开始一个角色，“├──分栏”为分栏，“│  ├──条目：描述”为条目；
+    “新出场角色：”下的“- 名字：描述”为次要角色。无法归类的行作为备注保留，避免丢失内容。
+    """
+    store = _empty_store()
+    character = None
+    section = None
+    in_minor = False
+    for raw_line in (text or "").replace("\r\n", "\n").split("\n"):
+        line = raw_line.rstrip()
+        content = line.lstrip(_TREE_CHARS).strip().strip("*")
+        if not content:
+            continue
+        if line[0] not in _TREE_CHARS:
+            name, rest = _split_key_value(content)
+            if name.startswith(MINOR_CHARACTERS_HEADER) and not rest:
+                in_minor, character, section = True, None, None
+                continue
+            if in_minor and content.startswith(("-", "•", "·")):
+                minor_name, desc = _split_key_value(content.lstrip("-•· ").strip())
+                store["minor_characters"][minor_name] = desc
+                continue
+            if line.endswith(("：", ":")) and not rest and len(name) <= 30:
+                in_minor, section = False, None
+                character = store["characters"].setdefault(name, {"sections": {}, "notes": []})
+                continue
+            target = character["notes"] if character else store["notes"]
+            target.append(content)
+            continue
+        if character is None:
+            store["notes"].append(content)
+            continue
+        # 以 ├/└ 开头为分栏；以 │ 或缩进开头、之后才出现 ├/└ 的为条目
+        if line[0] in "├└":
+            section_name, rest = _split_key_value(content)
+            section = character["sections"].setdefault(section_name, {})
+            if rest:
+                section[section_name] = rest
+            continue
+        if section is None:
+            character["notes"].append(content)
+            continue
+        key, value = _split_key_value(content)
+        section[key] = value
+    return store
+
+
+def render_character_state(store: Dict[str, Any], names: Optional[Iterable[str]] = None) -> str:
+    """渲染为原有树形文本格式；names 指定时只渲染这些角色（不含次要角色与备注）。"""
+    selected = list(names) if names is not None else list(store["characters"])
+    blocks = []
+    if names is None and store["notes"]:
+        blocks.append("\n".join(store["notes"]))
+    for name in selected:
+        record = store["characters"].get(name)
+        if not record:
+            continue
+        lines = [f"{name}："]
+        for section_name, entries in record["sections"].items():
+            lines.append(f"├──{section_name}")
+            items = list(entries.items())
+            for index, (key, value) in enumerate(items):
+                branch = "└──" if index == len(items) - 1 else "├──"
+                lines.append(f"│  {branch}{key}：{value}" if value else f"│  {branch}{key}")
+        lines.extend(record.get("notes", []))
+        blocks.append("\n".join(lines))
+    if names is None and store["minor_characters"]:
+        lines = [f"{MINOR_CHARACTERS_HEADER}："]
+        lines.extend(f"- {name}：{desc}" if desc else f"- {name}" for name, desc in store["minor_characters"].items())
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def load_character_store(filepath: str) -> Dict[str, Any]:
+    """
+    读取结构化角色状态。character_state.txt 与上次渲染结果不一致（首次使用或被手动编辑）时，
+    以文本为准重新解析。
+    """
+    text = read_file(os.path.join(filepath, CHARACTER_STATE_FILE))
+    store = None
+    try:
+        with open(os.path.join(filepath, CHARACTER_STORE_FILE), "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+        if isinstance(data, dict) and isinstance(data.get("characters"), dict):
+            store = {**_empty_store(), **data}
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.warning(f"Failed to read character store in {filepath}: {e}")
+    if store is None or store.get("view_hash") != _text_hash(text):
+        store = parse_character_state_text(text)
+        store["view_hash"] = _text_hash(text)
+    return store
+
+
+def save_character_store(filepath: str, store: Dict[str, Any]) -> str:
+    """保存结构化角色状态并返回渲染文本（调用方负责写入 character_state.txt）。"""
+    rendered = render_character_state(store)
+    store["view_hash"] = _text_hash(rendered)
+    path = os.path.join(filepath, CHARACTER_STORE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as handle:
+        json.dump(store, handle, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+    return rendered
+
+
+def parse_character_delta(response: str) -> Dict[str, Any]:
+    """从 LLM 回复中提取 JSON 增量，格式不合法时抛出 ValueError。"""
+    start, end = response.find("{"), response.rfind("}")
+    if start < 0 or end <= start:
+        raise ValueError("角色状态增量不是 JSON")
+    try:
+        delta = json.loads(response[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise ValueError(f"角色状态增量 JSON 解析失败：{e}") from e
+    if not isinstance(delta, dict):
+        raise ValueError("角色状态增量不是 JSON 对象")
+    return delta
+
+
+def apply_character_delta(store: Dict[str, Any], delta: Dict[str, Any], novel_number: int) -> List[str]:
+    """把增量合并进 store，值为 None 的条目被删除；返回发生变化的角色名。"""
+    changed = []
+    characters = delta.get("characters") if isinstance(delta.get("characters"), dict) else {}
+    for name, sections in characters.items():
+        if not isinstance(sections, dict) or not str(name).strip():
+            continue
+        record = store["characters"].setdefault(str(name).strip(), {"sections": {}, "notes": []})
+        for section_name, entries in sections.items():
+            if not isinstance(entries, dict):
+                continue
+            section = record["sections"].setdefault(str(section_name), {})
+            for key, value in entries.items():
+                if value is None:
+                    section.pop(str(key), None)
+                else:
+                    section[str(key)] = str(value).strip()
+            if not section:
+                record["sections"].pop(str(section_name), None)
+        record["updated_chapter"] = novel_number
+        changed.append(str(name).strip())
+    minor = delta.get("minor_characters") if isinstance(delta.get("minor_characters"), dict) else {}
+    for name, desc in minor.items():
+        if desc is None:
+            store["minor_characters"].pop(str(name), None)
+        elif str(name) not in store["characters"]:
+            store["minor_characters"][str(name)] = str(desc).strip()
+    return changed
+
+
+def update_character_store(
+    filepath: str,
+    novel_number: int,
+    chapter_text: str,
+    invoke: Callable[[str], str],
+    should_cancel: Optional[Callable[[], bool]] = None,
+) -> str:
+    """
+    定稿时更新角色状态，invoke(prompt) 返回 LLM 清洗后的文本，返回渲染后的角色状态文本。
+    已有角色状态无法解析为结构化记录时，回退为整篇重写一次（update_character_state_prompt）并以其结果建立记录。
+    """
+    with _store_lock:
+        store = load_character_store(filepath)
+    old_text = read_file(os.path.join(filepath, CHARACTER_STATE_FILE))
+    if old_text.strip() and not store["characters"]:
+        logging.info("Character state is not in the structured format; rewriting it once.")
+        rewritten = invoke(update_character_state_prompt.format(chapter_text=chapter_text, old_state=old_text)).strip()
+        raise_if_cancelled(should_cancel)
+        if not rewritten:
+            raise ValueError("角色状态重写结果为空")
+        store = parse_character_state_text(rewritten)
+        with _store_lock:
+            return save_character_store(filepath, store) if store["characters"] else rewritten
+
+    involved = [name for name in store["characters"] if name and name in chapter_text]
+    others = [name for name in store["characters"] if name not in involved]
+    response = invoke(
+        character_state_delta_prompt.format(
+            novel_number=novel_number,
+            chapter_text=chapter_text,
+            involved_state=render_character_state(store, involved) or "（无）",
+            other_characters="、".join(others) or "（无）",
+        )
+    )
+    raise_if_cancelled(should_cancel)
+    delta = parse_character_delta(response)
+    changed = apply_character_delta(store, delta, novel_number)
+    with _store_lock:
+        rendered = save_character_store(filepath, store)
+    logging.info(f"Character state delta for chapter {novel_number} applied to: {changed}")
+    return rendered
@@ -3,6 +3,7 @@
 """
 通用重试、清洗、日志工具
 """
+import asyncio
 import logging
 import os
 import re
@@ -11,6 +12,8 @@ import traceback
 from typing import Callable, Optional
 from json import JSONDecodeError
 
+from novel_generator.llm_cache import lookup_cached_response, store_cached_response
+
 try:
     from backend.task_runtime import TaskCancelledError
 except Exception:  # pragma: no cover - 兜底避免循环依赖或离线调用失败
@@ -157,40 +160,113 @@ def sleep_with_cancel(
         time.sleep(min(max(0.01, check_interval), remaining))
 
 
-def invoke_with_cleaning(llm_adapter, prompt: str, max_retries: int = 7) -> str:
-    """调用 LLM 并清理返回结果"""
+async def async_sleep_with_cancel(
+    seconds: float,
+    should_cancel: Optional[Callable[[], bool]],
+    *,
+    check_interval: float = 0.2,
+) -> None:
+    if seconds <= 0:
+        return
+    end_at = time.monotonic() + seconds
+    while True:
+        raise_if_cancelled(should_cancel)
+        remaining = end_at - time.monotonic()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(max(0.01, check_interval), remaining))
+
+
+def _clean_llm_output(text) -> str:
+    """清理结果中的特殊格式标记。"""
+    return str(text or "").replace("```", "").strip()
+
+
+class _LLMRetryState:
+    """同步/异步调用共用的重试计数：空结果或异常时给出退避秒数，次数用尽（或不可重试）时返回 None。"""
+
+    def __init__(self, max_retries: int, label: str):
+        self.max_retries = max_retries
+        self.label = label
+        self.retry_count = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.retry_count >= self.max_retries
+
+    def on_empty(self) -> Optional[float]:
+        self.retry_count += 1
+        if self.exhausted:
+            return None
+        sleep_seconds = _retry_backoff_seconds(self.retry_count)
+        logging.warning(
+            "Empty %s response, retrying (%s/%s) after %.1fs.",
+            self.label,
+            self.retry_count,
+            self.max_retries,
+            sleep_seconds,
+        )
+        return sleep_seconds
+
+    def on_error(self, error: Exception) -> Optional[float]:
+        self.retry_count += 1
+        logging.warning("%s invoke failed (%s/%s): %s", self.label, self.retry_count, self.max_retries, error)
+        if self.exhausted or not _is_retryable_error(error):
+            return None
+        return _retry_backoff_seconds(self.retry_count)
+
+
+def _collect_chunk(
+    chunk,
+    chunks: list,
+    should_cancel: Optional[Callable[[], bool]],
+    on_chunk: Optional[Callable[[str], None]],
+) -> None:
+    raise_if_cancelled(should_cancel)
+    if not chunk:
+        return
+    text_chunk = str(chunk)
+    chunks.append(text_chunk)
+    if on_chunk:
+        on_chunk(text_chunk)
+
+
+def _finish_streaming(chunks: list) -> str:
+    result = _clean_llm_output("".join(chunks))
+    _debug_print_block("LLM 返回的内容:", result)
+    return result
+
+
+def invoke_with_cleaning(
+    llm_adapter,
+    prompt: str,
+    max_retries: int = 7,
+    cache_purpose: Optional[str] = None,
+) -> str:
+    """调用 LLM 并清理返回结果；cache_purpose 对应的缓存开启时优先读取/写入响应缓存。"""
     _debug_print_block("发送到 LLM 的提示词:", prompt)
-    
+    cached = lookup_cached_response(llm_adapter, prompt, cache_purpose)
+    if cached is not None:
+        return cached
+
     result = ""
-    retry_count = 0
+    state = _LLMRetryState(max_retries, "LLM")
     logging.info("LLM 调用开始，prompt长度=%s，max_retries=%s", len(prompt), max_retries)
 
-    while retry_count < max_retries:
+    while not state.exhausted:
         try:
-            result = llm_adapter.invoke(prompt)
-            _debug_print_block("LLM 返回的内容:", result)
-
-            # 清理结果中的特殊格式标记
-            result = result.replace("```", "").strip()
+            raw = llm_adapter.invoke(prompt)
+            _debug_print_block("LLM 返回的内容:", raw)
+            result = _clean_llm_output(raw)
             if result:
+                store_cached_response(llm_adapter, prompt, cache_purpose, result)
                 return result
-
-            retry_count += 1
-            if retry_count < max_retries:
-                sleep_seconds = _retry_backoff_seconds(retry_count)
-                logging.warning(
-                    "Empty LLM response, retrying (%s/%s) after %.1fs.",
-                    retry_count,
-                    max_retries,
-                    sleep_seconds,
-                )
-                time.sleep(sleep_seconds)
+            sleep_seconds = state.on_empty()
         except Exception as e:
-            retry_count += 1
-            logging.warning("LLM invoke failed (%s/%s): %s", retry_count, max_retries, e)
-            if retry_count >= max_retries or not _is_retryable_error(e):
+            sleep_seconds = state.on_error(e)
+            if sleep_seconds is None:
                 raise
-            sleep_seconds = _retry_backoff_seconds(retry_count)
+        if sleep_seconds:
             time.sleep(sleep_seconds)
 
     return result
@@ -202,65 +278,146 @@ def invoke_with_cleaning_streaming(
     should_cancel: Optional[Callable[[], bool]] = None,
     max_retries: int = 7,
     on_chunk: Optional[Callable[[str], None]] = None,
+    cache_purpose: Optional[str] = None,
 ) -> str:
-    """流式调用 LLM 并支持取消中断。"""
+    """流式调用 LLM 并支持取消中断；缓存命中时一次性回调完整结果。"""
     _debug_print_block("发送到 LLM 的提示词:", prompt)
+    cached = lookup_cached_response(llm_adapter, prompt, cache_purpose)
+    if cached is not None:
+        if on_chunk:
+            on_chunk(cached)
+        return cached
 
     result = ""
-    retry_count = 0
+    state = _LLMRetryState(max_retries, "LLM streaming")
     logging.info(
         "LLM 流式调用开始，prompt长度=%s，max_retries=%s",
         len(prompt),
         max_retries,
     )
 
-    while retry_count < max_retries:
+    while not state.exhausted:
         raise_if_cancelled(should_cancel)
         try:
             chunks = []
             stream_iter = llm_adapter.stream(prompt)
             try:
                 for chunk in stream_iter:
-                    raise_if_cancelled(should_cancel)
-                    if not chunk:
-                        continue
-                    text_chunk = str(chunk)
-                    chunks.append(text_chunk)
-                    if on_chunk:
-                        on_chunk(text_chunk)
+                    _collect_chunk(chunk, chunks, should_cancel, on_chunk)
             finally:
                 close_fn = getattr(stream_iter, "close", None)
                 if callable(close_fn):
                     close_fn()
 
-            result = "".join(chunks).replace("```", "").strip()
-            _debug_print_block("LLM 返回的内容:", result)
+            result = _finish_streaming(chunks)
             if result:
+                store_cached_response(llm_adapter, prompt, cache_purpose, result)
                 return result
-
-            retry_count += 1
-            if retry_count < max_retries:
-                sleep_seconds = _retry_backoff_seconds(retry_count)
-                logging.warning(
-                    "Empty LLM streaming response, retrying (%s/%s) after %.1fs.",
-                    retry_count,
-                    max_retries,
-                    sleep_seconds,
-                )
-                sleep_with_cancel(sleep_seconds, should_cancel)
+            sleep_seconds = state.on_empty()
         except Exception as e:
             if is_cancelled_exception(e):
                 raise
-            retry_count += 1
-            logging.warning("LLM streaming invoke failed (%s/%s): %s", retry_count, max_retries, e)
-            if retry_count >= max_retries or not _is_retryable_error(e):
+            sleep_seconds = state.on_error(e)
+            if sleep_seconds is None:
                 raise
-            sleep_seconds = _retry_backoff_seconds(retry_count)
+        if sleep_seconds:
             sleep_with_cancel(sleep_seconds, should_cancel)
 
     return result
 
 
+async def ainvoke_with_cleaning(
+    llm_adapter,
+    prompt: str,
+    max_retries: int = 7,
+    cache_purpose: Optional[str] = None,
+) -> str:
+    """
+    invoke_with_cleaning 的异步版本，基于 llm_adapter.ainvoke；
+    响应缓存为同步 SQLite 读写，放到线程中执行，避免阻塞事件循环。
+    """
+    _debug_print_block("发送到 LLM 的提示词:", prompt)
+    cached = await asyncio.to_thread(lookup_cached_response, llm_adapter, prompt, cache_purpose)
+    if cached is not None:
+        return cached
+
+    result = ""
+    state = _LLMRetryState(max_retries, "LLM async")
+    logging.info("LLM 异步调用开始，prompt长度=%s，max_retries=%s", len(prompt), max_retries)
+
+    while not state.exhausted:
+        try:
+            raw = await llm_adapter.ainvoke(prompt)
+            _debug_print_block("LLM 返回的内容:", raw)
+            result = _clean_llm_output(raw)
+            if result:
+                await asyncio.to_thread(store_cached_response, llm_adapter, prompt, cache_purpose, result)
+                return result
+            sleep_seconds = state.on_empty()
+        except Exception as e:
+            sleep_seconds = state.on_error(e)
+            if sleep_seconds is None:
+                raise
+        if sleep_seconds:
+            await asyncio.sleep(sleep_seconds)
+
+    return result
+
+
+async def ainvoke_with_cleaning_streaming(
+    llm_adapter,
+    prompt: str,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    max_retries: int = 7,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    cache_purpose: Optional[str] = None,
+) -> str:
+    """invoke_with_cleaning_streaming 的异步版本，基于 llm_adapter.astream，支持取消中断。"""
+    _debug_print_block("发送到 LLM 的提示词:", prompt)
+    cached = await asyncio.to_thread(lookup_cached_response, llm_adapter, prompt, cache_purpose)
+    if cached is not None:
+        if on_chunk:
+            on_chunk(cached)
+        return cached
+
+    result = ""
+    state = _LLMRetryState(max_retries, "LLM async streaming")
+    logging.info(
+        "LLM 异步流式调用开始，prompt长度=%s，max_retries=%s",
+        len(prompt),
+        max_retries,
+    )
+
+    while not state.exhausted:
+        raise_if_cancelled(should_cancel)
+        try:
+            chunks = []
+            stream_iter = llm_adapter.astream(prompt)
+            try:
+                async for chunk in stream_iter:
+                    _collect_chunk(chunk, chunks, should_cancel, on_chunk)
+            finally:
+                close_fn = getattr(stream_iter, "aclose", None)
+                if callable(close_fn):
+                    await close_fn()
+
+            result = _finish_streaming(chunks)
+            if result:
+                await asyncio.to_thread(store_cached_response, llm_adapter, prompt, cache_purpose, result)
+                return result
+            sleep_seconds = state.on_empty()
+        except Exception as e:
+            if is_cancelled_exception(e):
+                raise
+            sleep_seconds = state.on_error(e)
+            if sleep_seconds is None:
+                raise
+        if sleep_seconds:
+            await async_sleep_with_cancel(sleep_seconds, should_cancel)
+
+    return result
+
+
 def normalize_chapter_text(text: str) -> str:
     """规范章节文本换行，最多保留一个空行作为段落分隔。"""
     if not text:
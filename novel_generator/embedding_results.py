@@ -0,0 +1,166 @@
+#novel_generator/embedding_results.py
+# -*- coding: utf-8 -*-
+"""
+Embedding 结果校验层：维度校验、空向量逐条重试、L2 归一化，
+向量统一以连续的 float32 数组传递。
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logging.basicConfig(
+    filename='app.log',      # 日志文件名
+    filemode='a',            # 追加模式（'w' 会覆盖）
+    level=logging.INFO,      # 记录 INFO 及以上级别的日志
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+EMBEDDING_ITEM_RETRIES = 2
+EMBEDDING_RETRY_SLEEP = 1.0
+
+_dimension_cache: Dict[str, int] = {}
+_dimension_lock = threading.Lock()
+
+
+class EmbeddingError(RuntimeError):
+    """Embedding 结果为空、维度不一致或包含非有限值。"""
+
+
+def _valid_vector(vector, expected_dim: Optional[int]) -> bool:
+    if vector is None:
+        return False
+    length = len(vector)
+    if length == 0:
+        return False
+    return expected_dim is None or length == expected_dim
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    """按行 L2 归一化（原地），零向量保持不变。"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def to_float32_matrix(vectors: Sequence, expected_dim: Optional[int] = None, normalize: bool = True) -> np.ndarray:
+    """
+    将适配器返回的向量列表转为 (n, dim) 的连续 float32 数组，并校验维度与数值。
+    """
+    if len(vectors) == 0:
+        return np.empty((0, expected_dim or 0), dtype=np.float32)
+    dims = {len(vector) for vector in vectors}
+    if len(dims) != 1 or 0 in dims:
+        raise EmbeddingError(f"Embedding dimensions are inconsistent: {sorted(dims)}")
+    dim = dims.pop()
+    if expected_dim is not None and dim != expected_dim:
+        raise EmbeddingError(f"Embedding dimension {dim} does not match collection dimension {expected_dim}.")
+    matrix = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+    if not np.isfinite(matrix).all():
+        raise EmbeddingError("Embedding contains NaN or infinite values.")
+    return l2_normalize(matrix) if normalize else matrix
+
+
+def embed_documents_checked(
+    embedding_adapter,
+    texts: Sequence[str],
+    expected_dim: Optional[int] = None,
+    max_item_retries: int = EMBEDDING_ITEM_RETRIES,
+) -> np.ndarray:
+    """
+    批量嵌入并校验：整批失败时重试一次，随后仅对空向量/维度不符的条目逐条重试，
+    仍失败则抛出 EmbeddingError，而不是把空向量写入向量库。
+    """
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, expected_dim or 0), dtype=np.float32)
+
+    try:
+        vectors = list(embedding_adapter.embed_documents(texts))
+    except Exception as e:
+        logging.warning(f"Embedding batch failed, retrying once: {e}")
+        time.sleep(EMBEDDING_RETRY_SLEEP)
+        vectors = list(embedding_adapter.embed_documents(texts))
+    if len(vectors) != len(texts):
+        logging.warning(f"Embedding returned {len(vectors)} vectors for {len(texts)} texts, retrying per item.")
+        vectors = (vectors + [[]] * len(texts))[:len(texts)]
+
+    if expected_dim is None:
+        expected_dim = next((len(vector) for vector in vectors if _valid_vector(vector, None)), None)
+    for index, vector in enumerate(vectors):
+        attempt = 0
+        while not _valid_vector(vector, expected_dim) and attempt < max_item_retries:
+            attempt += 1
+            time.sleep(EMBEDDING_RETRY_SLEEP)
+            try:
+                retried = embedding_adapter.embed_documents([texts[index]])
+                vector = retried[0] if retried else []
+            except Exception as e:
+                logging.warning(f"Embedding retry {attempt} for item {index} failed: {e}")
+                vector = []
+            if expected_dim is None and _valid_vector(vector, None):
+                expected_dim = len(vector)
+        if not _valid_vector(vector, expected_dim):
+            raise EmbeddingError(f"Embedding for item {index} is empty or has the wrong dimension.")
+        vectors[index] = vector
+    return to_float32_matrix(vectors, expected_dim)
+
+
+def embed_query_checked(embedding_adapter, query: str, expected_dim: Optional[int] = None) -> np.ndarray:
+    """嵌入单条查询并校验，返回归一化后的一维 float32 数组。"""
+    vector = embedding_adapter.embed_query(query)
+    if not _valid_vector(vector, expected_dim):
+        time.sleep(EMBEDDING_RETRY_SLEEP)
+        vector = embedding_adapter.embed_query(query)
+    if not _valid_vector(vector, expected_dim):
+        raise EmbeddingError("Query embedding is empty or has the wrong dimension.")
+    return to_float32_matrix([vector], expected_dim)[0]
+
+
+def collection_dimension(collection) -> Optional[int]:
+    """读取集合中已有向量的维度（按集合 id 缓存）；空集合返回 None。"""
+    cache_key = str(getattr(collection, "id", "") or id(collection))
+    with _dimension_lock:
+        if cache_key in _dimension_cache:
+            return _dimension_cache[cache_key]
+    try:
+        sample = collection.get(limit=1, include=["embeddings"])
+        embeddings = sample.get("embeddings") if sample else None
+        if embeddings is None or len(embeddings) == 0:
+            return None
+        dim = len(embeddings[0])
+    except Exception as e:
+        logging.warning(f"Failed to read collection embedding dimension: {e}")
+        return None
+    with _dimension_lock:
+        _dimension_cache[cache_key] = dim
+    return dim
+
+
+class CheckedEmbeddings:
+    """
+    供 LangChain Chroma 使用的 embedding 包装：输出经过校验与归一化的 float32 向量。
+    dimension 在绑定到已有集合后确定，空库则以首批向量的维度为准。
+    """
+
+    def __init__(self, embedding_adapter, dimension: Optional[int] = None):
+        self.embedding_adapter = embedding_adapter
+        self.dimension = dimension
+
+    def bind_collection(self, collection) -> None:
+        dim = collection_dimension(collection)
+        if dim is not None:
+            self.dimension = dim
+
+    def embed_documents(self, texts: List[str]) -> List[np.ndarray]:
+        matrix = embed_documents_checked(self.embedding_adapter, texts, self.dimension)
+        if self.dimension is None and matrix.shape[0]:
+            self.dimension = int(matrix.shape[1])
+        # 以行视图列表返回（共享同一块连续内存），兼容 LangChain 对 embeddings 的真值判断。
+        return list(matrix)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return embed_query_checked(self.embedding_adapter, query, self.dimension)
@@ -0,0 +1,313 @@
+#novel_generator/entity_index.py
+# -*- coding: utf-8 -*-
+"""
+实体索引：记录角色、物品、地点出现在哪些章节（含字符偏移），保存在项目根目录的 entity_index.sqlite3。
+词表来自结构化角色状态（角色、次要角色、物品栏条目）、章节参数中填写的出场角色/关键道具/场景地点与手动登记；
+定稿时按词表扫描本章建立出现记录，新登记的实体回填已有章节。
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from novel_generator.character_store import load_character_store
+from utils import read_file
+
+logging.basicConfig(
+    filename='app.log',      # 日志文件名
+    filemode='a',            # 追加模式（'w' 会覆盖）
+    level=logging.INFO,      # 记录 INFO 及以上级别的日志
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+ENTITY_INDEX_FILE = "entity_index.sqlite3"
+ENTITY_KINDS = ("character", "item", "location")
+# 角色状态中视为物品的分栏名
+ITEM_SECTIONS = ("物品",)
+# 实体名长度范围（字符），超出的多为描述性文字而非名称
+ENTITY_NAME_MIN_LENGTH = 2
+ENTITY_NAME_MAX_LENGTH = 20
+
+_FIELD_SEPARATOR_PATTERN = re.compile(r"[、,，;；/|\n]+")
+_PARENTHETICAL_PATTERN = re.compile(r"[（(【\[].*?[）)】\]]")
+_PLACEHOLDER_NAMES = {"未指定", "无", "暂无", "（无）", "无特殊", "待定"}
+_CHAPTER_FILE_PATTERN = re.compile(r"^chapter_(\d+)\.txt$")
+_index_locks: Dict[str, threading.Lock] = {}
+_index_locks_guard = threading.Lock()
+# 本进程内已建表的索引文件；文件被删除后重新建表
+_initialized_paths = set()
+
+
+def _get_lock(db_path: str) -> threading.Lock:
+    with _index_locks_guard:
+        lock = _index_locks.get(db_path)
+        if lock is None:
+            lock = threading.Lock()
+            _index_locks[db_path] = lock
+        return lock
+
+
+def normalize_entity_name(name: str) -> str:
+    """去掉括号注释、列表符号与首尾空白，不像名称的返回空字符串。"""
+    cleaned = _PARENTHETICAL_PATTERN.sub("", str(name or "")).strip().strip("-•·*：: \t")
+    if cleaned in _PLACEHOLDER_NAMES:
+        return ""
+    if not ENTITY_NAME_MIN_LENGTH <= len(cleaned) <= ENTITY_NAME_MAX_LENGTH:
+        return ""
+    return cleaned
+
+
+def split_entity_field(text: str) -> List[str]:
+    """把“出场角色/关键道具/场景地点”等自由文本按顿号、逗号等拆分为实体名。"""
+    names = (normalize_entity_name(part) for part in _FIELD_SEPARATOR_PATTERN.split(text or ""))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def _find_mentions(text: str, names: Sequence[str]) -> List[Tuple[str, int, int]]:
+    """在文本中查找实体名，同一位置优先匹配较长的名称，返回 [(name, start, end)]。"""
+    if not text or not names:
+        return []
+    ordered = sorted(set(names), key=len, reverse=True)
+    pattern = re.compile("|".join(re.escape(name) for name in ordered))
+    return [(match.group(0), match.start(), match.end()) for match in pattern.finditer(text)]
+
+
+def _list_chapter_files(chapters_dir: str) -> List[Tuple[int, str]]:
+    if not os.path.isdir(chapters_dir):
+        return []
+    chapters = []
+    for filename in os.listdir(chapters_dir):
+        match = _CHAPTER_FILE_PATTERN.match(filename)
+        if match:
+            chapters.append((int(match.group(1)), os.path.join(chapters_dir, filename)))
+    return sorted(chapters)
+
+
+class EntityIndex:
+    """
+    基于 SQLite 的实体索引：entities 为词表，mentions 为逐章出现位置（相对定稿时去除首尾空白后的章节文本）。
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.chapters_dir = os.path.join(filepath, "chapters")
+        self.db_path = os.path.join(filepath, ENTITY_INDEX_FILE)
+        self._lock = _get_lock(self.db_path)
+        if self.db_path in _initialized_paths and os.path.exists(self.db_path):
+            return
+        os.makedirs(filepath, exist_ok=True)
+        with self._lock, self._connect() as conn:
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS entities ("
+                "name TEXT PRIMARY KEY, kind TEXT NOT NULL, source TEXT NOT NULL, created_at REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS mentions ("
+                "name TEXT NOT NULL, chapter INTEGER NOT NULL, "
+                "start_offset INTEGER NOT NULL, end_offset INTEGER NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS idx_mentions_name ON mentions(name);"
+                "CREATE INDEX IF NOT EXISTS idx_mentions_chapter ON mentions(chapter);"
+            )
+        with _index_locks_guard:
+            _initialized_paths.add(self.db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def names(self, kinds: Optional[Iterable[str]] = None) -> List[str]:
+        query = "SELECT name FROM entities"
+        params: List[str] = []
+        if kinds is not None:
+            kinds = list(kinds)
+            if not kinds:
+                return []
+            query += f" WHERE kind IN ({','.join('?' for _ in kinds)})"
+            params = kinds
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(query, params).fetchall()]
+
+    def register(self, entries: Iterable[Tuple[str, str]], source: str, overwrite: bool = False) -> List[str]:
+        """
+        登记实体 [(name, kind)]，返回新增的名称；新增名称会回填已有章节的出现记录。
+        已存在的名称默认保留原类型，overwrite=True（手动登记）时以新类型为准。
+        """
+        rows = {}
+        for name, kind in entries:
+            name = normalize_entity_name(name)
+            if name and kind in ENTITY_KINDS:
+                rows.setdefault(name, kind)
+        if not rows:
+            return []
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            existing = {
+                row[0]
+                for row in conn.execute(
+                    f"SELECT name FROM entities WHERE name IN ({','.join('?' for _ in rows)})",
+                    list(rows),
+                ).fetchall()
+            }
+            added = [name for name in rows if name not in existing]
+            conn.executemany(
+                "INSERT INTO entities(name, kind, source, created_at) VALUES (?, ?, ?, ?)",
+                [(name, rows[name], source, now) for name in added],
+            )
+            if overwrite:
+                conn.executemany(
+                    "UPDATE entities SET kind = ?, source = ? WHERE name = ?",
+                    [(rows[name], source, name) for name in rows if name in existing],
+                )
+        if added:
+            self._backfill(added)
+        return added
+
+    def _backfill(self, names: Sequence[str]) -> None:
+        """新实体名只扫描已有章节中该名称的出现；与更长的已有名称重叠的位置以长名称为准。"""
+        vocabulary = self.names()
+        longer = [other for other in vocabulary if any(name in other and name != other for name in names)]
+        rows = []
+        for chapter, path in _list_chapter_files(self.chapters_dir):
+            text = read_file(path).strip()
+            rows.extend(
+                (name, chapter, start, end)
+                for name, start, end in _find_mentions(text, list(names) + longer)
+                if name in names
+            )
+        if rows:
+            with self._lock, self._connect() as conn:
+                conn.executemany(
+                    "INSERT INTO mentions(name, chapter, start_offset, end_offset) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+        logging.info(f"Entity index backfilled {len(names)} new entities with {len(rows)} mentions.")
+
+    def index_chapter(self, chapter: int, text: str) -> int:
+        """按当前词表重建某一章的出现记录，返回出现次数。"""
+        rows = [(name, int(chapter), start, end) for name, start, end in _find_mentions(text, self.names())]
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM mentions WHERE chapter = ?", (int(chapter),))
+            conn.executemany(
+                "INSERT INTO mentions(name, chapter, start_offset, end_offset) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def rebuild(self) -> Dict[str, int]:
+        """清空出现记录并按词表重新扫描全部章节文件。"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM mentions")
+        chapters = _list_chapter_files(self.chapters_dir)
+        mentions = sum(self.index_chapter(chapter, read_file(path).strip()) for chapter, path in chapters)
+        return {"chapters": len(chapters), "mentions": mentions}
+
+    def list_entities(self, kind: Optional[str] = None) -> List[dict]:
+        """列出实体及其出现统计（出现次数、章节数、首次与最近出现章节）。"""
+        query = (
+            "SELECT e.name, e.kind, e.source, COUNT(m.chapter), COUNT(DISTINCT m.chapter), "
+            "MIN(m.chapter), MAX(m.chapter) FROM entities e LEFT JOIN mentions m ON m.name = e.name"
+        )
+        params: List[str] = []
+        if kind:
+            query += " WHERE e.kind = ?"
+            params.append(kind)
+        query += " GROUP BY e.name ORDER BY COUNT(DISTINCT m.chapter) DESC, e.name"
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [
+            {
+                "name": name,
+                "kind": entity_kind,
+                "source": source,
+                "mentions": mentions,
+                "chapters": chapters,
+                "first_chapter": first,
+                "last_chapter": last,
+            }
+            for name, entity_kind, source, mentions, chapters, first, last in rows
+        ]
+
+    def get_entity(self, name: str) -> Optional[dict]:
+        """返回实体及其全部出现位置，未登记返回 None。"""
+        with self._connect() as conn:
+            entity = conn.execute("SELECT kind, source FROM entities WHERE name = ?", (name,)).fetchone()
+            if entity is None:
+                return None
+            mentions = conn.execute(
+                "SELECT chapter, start_offset, end_offset FROM mentions WHERE name = ? "
+                "ORDER BY chapter, start_offset",
+                (name,),
+            ).fetchall()
+        return {
+            "name": name,
+            "kind": entity[0],
+            "source": entity[1],
+            "occurrences": [
+                {"chapter": chapter, "start_offset": start, "end_offset": end}
+                for chapter, start, end in mentions
+            ],
+        }
+
+    def chapters_for(self, names: Iterable[str], before: Optional[int] = None) -> List[int]:
+        """出现过任一给定实体的章节号（升序）；before 指定时只返回小于该章节号的章节。"""
+        names = list(dict.fromkeys(names))
+        if not names:
+            return []
+        query = f"SELECT DISTINCT chapter FROM mentions WHERE name IN ({','.join('?' for _ in names)})"
+        params: List = list(names)
+        if before is not None:
+            query += " AND chapter < ?"
+            params.append(int(before))
+        with self._connect() as conn:
+            return sorted(row[0] for row in conn.execute(query, params).fetchall())
+
+    def match(self, text: str, kinds: Optional[Iterable[str]] = None) -> List[str]:
+        """返回词表中在 text 里出现的实体名（按首次出现顺序）。"""
+        return list(dict.fromkeys(name for name, _, _ in _find_mentions(text, self.names(kinds))))
+
+
+def collect_store_entities(filepath: str) -> List[Tuple[str, str]]:
+    """从结构化角色状态收集实体：角色与次要角色为 character，物品栏条目为 item。"""
+    store = load_character_store(filepath)
+    entries = [(name, "character") for name in store["characters"]]
+    entries.extend((name, "character") for name in store["minor_characters"])
+    for record in store["characters"].values():
+        for section_name, items in record.get("sections", {}).items():
+            if any(section in section_name for section in ITEM_SECTIONS):
+                entries.extend((key, "item") for key in items)
+    return entries
+
+
+def register_chapter_fields(
+    filepath: str,
+    characters_involved: str = "",
+    key_items: str = "",
+    scene_location: str = "",
+) -> List[str]:
+    """把章节参数中填写的出场角色/关键道具/场景地点登记到词表，返回新增的名称。"""
+    entries = [(name, "character") for name in split_entity_field(characters_involved)]
+    entries.extend((name, "item") for name in split_entity_field(key_items))
+    entries.extend((name, "location") for name in split_entity_field(scene_location))
+    if not entries:
+        return []
+    return EntityIndex(filepath).register(entries, source="chapter_fields")
+
+
+def update_entity_index(filepath: str, novel_number: int, chapter_text: str) -> Dict[str, int]:
+    """
+    定稿时更新实体索引：先登记角色状态中的新实体（回填已有章节），再按词表重建本章的出现记录。
+    返回 {"new_entities", "mentions"}。
+    """
+    index = EntityIndex(filepath)
+    added = index.register(collect_store_entities(filepath), source="character_state")
+    mentions = index.index_chapter(novel_number, chapter_text)
+    logging.info(f"Entity index updated for chapter {novel_number}: {len(added)} new entities, {mentions} mentions.")
+    return {"new_entities": len(added), "mentions": mentions}
+
+
+def get_entity_chapters(filepath: str, names: Iterable[str], before: Optional[int] = None) -> List[int]:
+    """出现过任一给定实体的章节号；索引不存在时返回空列表。"""
+    if not os.path.exists(os.path.join(filepath, ENTITY_INDEX_FILE)):
+        return []
+    return EntityIndex(filepath).chapters_for(names, before=before)
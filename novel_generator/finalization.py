@@ -10,7 +10,7 @@ import time
 from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Any, Callable, Dict, Optional
 
-from embedding_adapters import create_embedding_adapter
+from embedding_adapters import get_embedding_adapter
 from llm_adapters import create_llm_adapter
 from novel_generator.common import (
     invoke_with_cleaning,
@@ -18,8 +18,10 @@ from novel_generator.common import (
     is_cancelled_exception,
     raise_if_cancelled as raise_cancelled,
 )
+from novel_generator.character_store import update_character_store
+from novel_generator.entity_index import update_entity_index
+from novel_generator.summary_store import save_summary_store, update_summary_store
 from novel_generator.vectorstore_utils import update_vector_store
-from prompt_definitions import summary_prompt, update_character_state_prompt
 from utils import clear_file_content, read_file, save_string_to_txt
 
 logging.basicConfig(
@@ -88,6 +90,11 @@ def finalize_chapter(
 ) -> Dict[str, Any]:
     """
     对指定章节做最终处理：更新前文摘要、更新角色状态、插入向量库等。
+    前文摘要为分层增量更新（本章摘要，卷末追加分卷汇总与全书梗概修订，见 summary_store），
+    计算阶段只在内存中更新，写入阶段与文本文件一起保存 summary_store.json，global_summary.txt 写入其渲染视图。
+    角色状态为结构化增量更新（只请求本章出场角色的变化字段，见 character_store），
+    character_state.txt 写入其渲染视图。
+    角色状态落盘后更新实体索引（角色/物品/地点出现的章节与位置，见 entity_index），供检索按章节过滤。
     默认无需再做扩写操作，若有需要可在外部调用 enrich_chapter_text 处理后再定稿。
     """
     total_started = time.perf_counter()
@@ -122,19 +129,14 @@ def finalize_chapter(
     character_state_file = os.path.join(filepath, "character_state.txt")
     old_character_state = read_file(character_state_file)
 
-    prompt_summary = summary_prompt.format(
-        chapter_text=chapter_text,
-        global_summary=old_global_summary
-    )
-    prompt_char_state = update_character_state_prompt.format(
-        chapter_text=chapter_text,
-        old_state=old_character_state
-    )
 
     def llm_should_cancel() -> bool:
         return stop_event.is_set() or bool(should_cancel and should_cancel())
 
-    def invoke_summary() -> str:
+    # 摘要各次 LLM 调用的中间结果，串行兜底时复用已成功的调用
+    summary_partial: Dict[str, str] = {}
+
+    def invoke_summary() -> Dict[str, Any]:
         adapter = create_llm_adapter(
             interface_format=interface_format,
             base_url=base_url,
@@ -144,12 +146,23 @@ def finalize_chapter(
             max_tokens=max_tokens,
             timeout=timeout
         )
-        return invoke_with_cleaning_streaming(
-            adapter,
-            prompt_summary,
+        result = update_summary_store(
+            filepath,
+            novel_number,
+            chapter_text,
+            lambda prompt: invoke_with_cleaning_streaming(
+                adapter,
+                prompt,
+                should_cancel=llm_should_cancel,
+                max_retries=llm_max_retries,
+                cache_purpose="finalize_summary",
+            ),
             should_cancel=llm_should_cancel,
-            max_retries=llm_max_retries,
+            partial=summary_partial,
         )
+        if result["arc_index"]:
+            _emit_progress(progress_callback, f"前文摘要：第 {result['arc_index']} 卷已汇总，全书梗概已修订。")
+        return result
 
     def invoke_char_state() -> str:
         adapter = create_llm_adapter(
@@ -161,16 +174,23 @@ def finalize_chapter(
             max_tokens=max_tokens,
             timeout=timeout
         )
-        return invoke_with_cleaning_streaming(
-            adapter,
-            prompt_char_state,
+        return update_character_store(
+            filepath,
+            novel_number,
+            chapter_text,
+            lambda prompt: invoke_with_cleaning_streaming(
+                adapter,
+                prompt,
+                should_cancel=llm_should_cancel,
+                max_retries=llm_max_retries,
+                cache_purpose="finalize_character_state",
+            ),
             should_cancel=llm_should_cancel,
-            max_retries=llm_max_retries,
         )
 
     def invoke_vectorstore_update() -> Dict[str, Any]:
         return update_vector_store(
-            embedding_adapter=create_embedding_adapter(
+            embedding_adapter=get_embedding_adapter(
                 embedding_interface_format,
                 embedding_api_key,
                 embedding_url,
@@ -269,13 +289,9 @@ def finalize_chapter(
 
     summary_text = old_global_summary
     summary_updated = False
+    summary_store = None
     if summary_result["ok"]:
-        candidate = str(summary_result["value"] or "").strip()
-        if candidate:
-            summary_text = candidate
-            summary_updated = candidate != old_global_summary
-        else:
-            _emit_progress(progress_callback, "前文摘要更新返回空内容，保留旧摘要。")
+        summary_store = summary_result["value"]["store"]
     else:
         _emit_progress(progress_callback, f"前文摘要更新失败，保留旧摘要。原因：{summary_result['error']}")
 
@@ -292,12 +308,22 @@ def finalize_chapter(
         _emit_progress(progress_callback, f"角色状态更新失败，保留旧状态。原因：{char_state_result['error']}")
 
     raise_if_cancelled("计算阶段完成，写入前")
+    if summary_store is not None:
+        summary_text = save_summary_store(filepath, summary_store)
+        summary_updated = summary_text.strip() != old_global_summary.strip()
     clear_file_content(global_summary_file)
     save_string_to_txt(summary_text, global_summary_file)
     clear_file_content(character_state_file)
     save_string_to_txt(char_state_text, character_state_file)
     _emit_progress(progress_callback, "定稿写入阶段完成：摘要与角色状态已落盘。")
 
+    entity_result = _run_timed_step(
+        "entity_index_update",
+        lambda: update_entity_index(filepath, novel_number, chapter_text),
+    )
+    if not entity_result["ok"]:
+        _emit_progress(progress_callback, f"实体索引更新失败，已跳过。原因：{entity_result['error']}")
+
     if skip_vectorstore:
         vectorstore_result = {
             "ok": True,
@@ -335,6 +361,7 @@ def finalize_chapter(
     timings = {
         "summary_update_seconds": summary_result["seconds"],
         "character_state_update_seconds": char_state_result["seconds"],
+        "entity_index_update_seconds": entity_result["seconds"],
         "vectorstore_update_seconds": vectorstore_result["seconds"],
         "total_seconds": total_seconds,
     }
@@ -353,6 +380,7 @@ def finalize_chapter(
         "summary_updated": summary_updated,
         "character_state_updated": char_state_updated,
         "vectorstore": vectorstore_payload,
+        "entity_index": entity_result["value"] or {"new_entities": 0, "mentions": 0},
         "timings": timings,
     }
 
@@ -384,5 +412,5 @@ def enrich_chapter_text(
 原内容：
 {chapter_text}
 """
-    enriched_text = invoke_with_cleaning(llm_adapter, prompt)
+    enriched_text = invoke_with_cleaning(llm_adapter, prompt, cache_purpose="enrich")
     return enriched_text if enriched_text else chapter_text
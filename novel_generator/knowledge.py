@@ -1,15 +1,29 @@
 #novel_generator/knowledge.py
 # -*- coding: utf-8 -*-
 """
-知识文件导入至向量库（advanced_split_content、import_knowledge_file）
+知识文件导入至向量库（advanced_split_content、import_knowledge_file、知识来源管理）
 """
 import os
+import codecs
+import hashlib
+import json
 import logging
-import traceback
-import nltk
-from utils import read_file
-from novel_generator.vectorstore_utils import load_vector_store, init_vector_store
-from langchain.docstore.document import Document
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+from novel_generator.embedding_results import collection_dimension, embed_documents_checked
+from novel_generator.text_segmenter import TextSpan, chunk_text
+from novel_generator.vectorstore_utils import (
+    KNOWLEDGE_SOURCE,
+    ensure_unscoped_sources,
+    get_or_create_vector_store,
+    get_vectorstore_dir,
+    index_documents_lexically,
+    load_vector_store,
+    remove_documents_lexically,
+)
 
 logging.basicConfig(
     filename='app.log',      # 日志文件名
@@ -18,33 +32,195 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S'
 )
-def advanced_split_content(content: str, similarity_threshold: float = 0.7, max_length: int = 500) -> list:
-    """使用基本分段策略"""
-    # nltk.download('punkt', quiet=True)
-    # nltk.download('punkt_tab', quiet=True)
-    sentences = nltk.sent_tokenize(content)
-    if not sentences:
-        return []
-
-    final_segments = []
-    current_segment = []
-    current_length = 0
-    
-    for sentence in sentences:
-        sentence_length = len(sentence)
-        if current_length + sentence_length > max_length:
-            if current_segment:
-                final_segments.append(" ".join(current_segment))
-            current_segment = [sentence]
-            current_length = sentence_length
+
+KNOWLEDGE_READ_SIZE = 64 * 1024
+# 无 BOM 时依次尝试的编码：UTF-8（兼容带 BOM）与覆盖 GBK/GB2312 的 GB18030
+KNOWLEDGE_ENCODINGS = ("utf-8-sig", "gb18030")
+KNOWLEDGE_BATCH_SIZE = 32
+KNOWLEDGE_BATCH_MAX_CHARS = 16000
+KNOWLEDGE_MAX_WORKERS = 3
+KNOWLEDGE_CHECKPOINT_PREFIX = "knowledge_import_"
+KNOWLEDGE_SOURCES_FILE = "knowledge_sources.json"
+_sources_lock = threading.Lock()
+
+
+def advanced_split_content(content: str, similarity_threshold: float = 0.7, max_length: int = 500, overlap: int = 0) -> list:
+    """使用基本分段策略：按中英文句末标点分句，再按 max_length 打包。"""
+    return [span.text for span in chunk_text(content, max_length=max_length, overlap=overlap)]
+
+
+def detect_knowledge_encoding(file_path: str) -> str:
+    """
+    识别知识文件编码：UTF-16 看 BOM，其余按 KNOWLEDGE_ENCODINGS 顺序对整个文件做流式解码校验。
+    都无法解码时抛出 ValueError，导入尚未写入任何内容。
+    """
+    with open(file_path, "rb") as handle:
+        head = handle.read(4)
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    for encoding in KNOWLEDGE_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(file_path, "rb") as handle:
+                for block in iter(lambda: handle.read(1024 * 1024), b""):
+                    decoder.decode(block)
+            decoder.decode(b"", final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"无法识别知识库文件编码（已尝试 UTF-8、GB18030）：{os.path.basename(file_path)}")
+
+
+def iter_knowledge_segments(
+    file_path: str,
+    max_length: int = 500,
+    read_size: int = KNOWLEDGE_READ_SIZE,
+    encoding: Optional[str] = None,
+) -> Iterator[TextSpan]:
+    """
+    流式读取知识文件并即时分段，返回的偏移为相对整个文件（解码后）的字符偏移。
+    每次读入后保留最后一个（可能未完整的）片段与后续内容拼接再切分。
+    encoding 未指定时先调用 detect_knowledge_encoding 识别。
+    """
+    buffer = ""
+    base = 0
+    encoding = encoding or detect_knowledge_encoding(file_path)
+    with open(file_path, "r", encoding=encoding) as handle:
+        while True:
+            block = handle.read(read_size)
+            if not block:
+                break
+            buffer += block
+            spans = chunk_text(buffer, max_length=max_length)
+            if len(spans) < 2:
+                continue
+            for span in spans[:-1]:
+                yield TextSpan(base + span.start, base + span.end, span.text)
+            tail_start = spans[-1].start
+            buffer = buffer[tail_start:]
+            base += tail_start
+    for span in chunk_text(buffer, max_length=max_length):
+        yield TextSpan(base + span.start, base + span.end, span.text)
+
+
+def _iter_batches(segments, batch_size: int, max_chars: int):
+    """将 (序号, 片段) 流按条数与总字符数双重上限组批。"""
+    batch = []
+    chars = 0
+    for item in segments:
+        text = item[1].text
+        if batch and (len(batch) >= batch_size or chars + len(text) > max_chars):
+            yield batch
+            batch, chars = [], 0
+        batch.append(item)
+        chars += len(text)
+    if batch:
+        yield batch
+
+
+def _file_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _checkpoint_path(filepath: str, file_hash: str) -> str:
+    return os.path.join(get_vectorstore_dir(filepath), f"{KNOWLEDGE_CHECKPOINT_PREFIX}{file_hash[:16]}.json")
+
+
+def _load_checkpoint(path: str) -> int:
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            return max(0, int(json.load(handle).get("segments_done", 0)))
+    except FileNotFoundError:
+        return 0
+    except Exception as e:
+        logging.warning(f"Failed to read knowledge import checkpoint: {e}")
+        return 0
+
+
+def _save_checkpoint(path: str, file_hash: str, segments_done: int) -> None:
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        json.dump({"file_hash": file_hash, "segments_done": segments_done}, handle)
+    os.replace(temp_path, path)
+
+
+def _emit_progress(progress_callback: Optional[Callable[[str], None]], message: str) -> None:
+    logging.info(message)
+    if not progress_callback:
+        return
+    try:
+        progress_callback(message)
+    except Exception:
+        logging.debug("Progress callback failed.", exc_info=True)
+
+
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _sources_path(filepath: str) -> str:
+    return os.path.join(get_vectorstore_dir(filepath), KNOWLEDGE_SOURCES_FILE)
+
+
+def load_knowledge_sources(filepath: str) -> Dict[str, dict]:
+    """读取已导入知识来源登记表（vectorstore/knowledge_sources.json），键为 source_id。"""
+    try:
+        with open(_sources_path(filepath), "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+        return data if isinstance(data, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logging.warning(f"Failed to read knowledge sources: {e}")
+        return {}
+
+
+def _update_knowledge_sources(filepath: str, source_id: str, record: Optional[dict]) -> None:
+    with _sources_lock:
+        sources = load_knowledge_sources(filepath)
+        if record is None:
+            sources.pop(source_id, None)
         else:
-            current_segment.append(sentence)
-            current_length += sentence_length
-    
-    if current_segment:
-        final_segments.append(" ".join(current_segment))
-    
-    return final_segments
+            sources[source_id] = record
+        os.makedirs(get_vectorstore_dir(filepath), exist_ok=True)
+        path = _sources_path(filepath)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump(sources, handle, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+
+def list_knowledge_sources(filepath: str) -> List[dict]:
+    """列出已导入的知识来源，按导入时间排序。"""
+    sources = load_knowledge_sources(filepath)
+    records = [dict(record, source_id=source_id) for source_id, record in sources.items()]
+    records.sort(key=lambda record: record.get("imported_at", ""))
+    return records
+
+
+def _existing_content_hashes(collection, hashes: List[str], source_id: str) -> set:
+    """
+    同一来源内已写入的 content_hash。去重只在来源内进行：不同来源共有的片段各存一份，
+    删除或替换其中一个来源不会影响另一个。
+    """
+    if not hashes:
+        return set()
+    existing = collection.get(
+        where={"$and": [{"content_hash": {"$in": hashes}}, {"source_id": source_id}]},
+        include=["metadatas"],
+    )
+    return {
+        metadata.get("content_hash")
+        for metadata in (existing or {}).get("metadatas") or []
+        if isinstance(metadata, dict)
+    }
+
 
 def import_knowledge_file(
     embedding_api_key: str,
@@ -52,37 +228,232 @@ def import_knowledge_file(
     embedding_interface_format: str,
     embedding_model_name: str,
     file_path: str,
-    filepath: str
+    filepath: str,
+    progress_callback: Optional[Callable[[str], None]] = None,
+    batch_size: int = KNOWLEDGE_BATCH_SIZE,
+    max_workers: int = KNOWLEDGE_MAX_WORKERS,
+    source_name: Optional[str] = None,
 ):
+    """
+    流式导入知识文件：边读边分段，按批并发嵌入、按批写入向量库。
+    每批写入后记录断点（vectorstore/knowledge_import_<hash>.json），
+    同一文件导入失败后再次导入会跳过已写入的片段。
+    片段元数据记录 source/source_id/source_name/segment_index/偏移/content_hash，
+    嵌入前按 content_hash 在本来源内去重（本文件内重复、或断点续传时已写入的片段不再嵌入）。
+    返回 {"source_id", "segments": 新写入片段数, "duplicates": 去重跳过数,
+          "skipped": 断点跳过数, "seconds": 耗时}。
+    """
     logging.info(f"开始导入知识库文件: {file_path}, 接口格式: {embedding_interface_format}, 模型: {embedding_model_name}")
+    empty_result = {"source_id": None, "segments": 0, "duplicates": 0, "skipped": 0, "seconds": 0.0}
     if not os.path.exists(file_path):
         logging.warning(f"知识库文件不存在: {file_path}")
-        return
-    content = read_file(file_path)
-    if not content.strip():
+        return empty_result
+    if os.path.getsize(file_path) == 0:
         logging.warning("知识库文件内容为空。")
-        return
-    paragraphs = advanced_split_content(content)
-    from embedding_adapters import create_embedding_adapter
-    embedding_adapter = create_embedding_adapter(
+        return empty_result
+
+    # 先识别编码：无法解码时直接报错，不打开向量库、不留下断点与半导入的来源
+    encoding = detect_knowledge_encoding(file_path)
+    file_hash = _file_hash(file_path)
+    source_id = file_hash[:16]
+    source_name = source_name or os.path.basename(file_path)
+    checkpoint_path = _checkpoint_path(filepath, file_hash)
+    resume_from = _load_checkpoint(checkpoint_path)
+    known_source = load_knowledge_sources(filepath).get(source_id)
+    if known_source and not resume_from:
+        _emit_progress(progress_callback, f"Knowledge source {source_name} already imported, skipped.")
+        return dict(empty_result, source_id=source_id, skipped=int(known_source.get("segments", 0)))
+
+    from embedding_adapters import get_embedding_adapter
+    from langchain.docstore.document import Document
+
+    embedding_adapter = get_embedding_adapter(
         embedding_interface_format,
         embedding_api_key,
         embedding_url,
         embedding_model_name
     )
-    store = load_vector_store(embedding_adapter, filepath)
+    store = get_or_create_vector_store(embedding_adapter, filepath)
     if not store:
-        logging.info("Vector store does not exist or load failed. Initializing a new one for knowledge import...")
-        store = init_vector_store(embedding_adapter, paragraphs, filepath)
-        if store:
-            logging.info("知识库文件已成功导入至向量库(新初始化)。")
-        else:
-            logging.warning("知识库导入失败，跳过。")
-    else:
-        try:
-            docs = [Document(page_content=str(p)) for p in paragraphs]
-            store.add_documents(docs)
-            logging.info("知识库文件已成功导入至向量库(追加模式)。")
-        except Exception as e:
-            logging.warning(f"知识库导入失败: {e}")
-            traceback.print_exc()
+        raise RuntimeError("知识库导入失败：无法打开向量库。")
+    ensure_unscoped_sources(store, filepath)
+    collection = store._collection
+    expected_dim = collection_dimension(collection)
+
+    if resume_from:
+        _emit_progress(progress_callback, f"Resuming knowledge import from segment {resume_from}.")
+
+    def indexed_segments():
+        for index, segment in enumerate(iter_knowledge_segments(file_path, encoding=encoding)):
+            if index >= resume_from:
+                yield index, segment
+
+    seen_hashes: set = set()
+
+    def deduplicate(batch):
+        hashed = [(index, segment, _content_hash(segment.text)) for index, segment in batch]
+        existing = _existing_content_hashes(
+            collection, list({item[2] for item in hashed} - seen_hashes), source_id
+        )
+        kept = []
+        for item in hashed:
+            if item[2] in seen_hashes or item[2] in existing:
+                continue
+            seen_hashes.add(item[2])
+            kept.append(item)
+        return kept
+
+    def write_batch(kept, vectors) -> None:
+        # 片段 id 由文件哈希与序号决定，断点续传重复写入时 upsert 保持幂等。
+        ids = [f"kn-{source_id}-{index}" for index, _, _ in kept]
+        documents = [
+            Document(
+                page_content=segment.text,
+                metadata={
+                    "source": KNOWLEDGE_SOURCE,
+                    "source_id": source_id,
+                    "source_name": source_name,
+                    "segment_index": index,
+                    "start_offset": segment.start,
+                    "end_offset": segment.end,
+                    "content_hash": content_hash,
+                },
+            )
+            for index, segment, content_hash in kept
+        ]
+        collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=[doc.page_content for doc in documents],
+            metadatas=[doc.metadata for doc in documents],
+        )
+        index_documents_lexically(filepath, ids, documents)
+
+    started = time.perf_counter()
+    written = 0
+    duplicates = 0
+    segments_done = resume_from
+    max_workers = max(1, int(max_workers))
+    batches = _iter_batches(indexed_segments(), max(1, int(batch_size)), KNOWLEDGE_BATCH_MAX_CHARS)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = []
+        exhausted = False
+        while pending or not exhausted:
+            # 保持至多 max_workers 个批次在途，按提交顺序写入，保证断点为连续前缀。
+            while not exhausted and len(pending) < max_workers:
+                batch = next(batches, None)
+                if batch is None:
+                    exhausted = True
+                    break
+                kept = deduplicate(batch)
+                duplicates += len(batch) - len(kept)
+                texts = [segment.text for _, segment, _ in kept]
+                future = pool.submit(embed_documents_checked, embedding_adapter, texts, expected_dim) if kept else None
+                pending.append((batch[-1][0], kept, future))
+            if not pending:
+                break
+            last_index, kept, future = pending.pop(0)
+            if future is not None:
+                try:
+                    vectors = future.result()
+                except Exception:
+                    for _, _, queued in pending:
+                        if queued is not None:
+                            queued.cancel()
+                    _emit_progress(
+                        progress_callback,
+                        f"Knowledge import stopped at segment {segments_done}; re-import the same file to resume.",
+                    )
+                    raise
+                write_batch(kept, vectors)
+                written += len(kept)
+            segments_done = last_index + 1
+            _save_checkpoint(checkpoint_path, file_hash, segments_done)
+            elapsed = time.perf_counter() - started
+            rate = (segments_done - resume_from) / elapsed if elapsed > 0 else 0.0
+            _emit_progress(
+                progress_callback,
+                f"Knowledge import: {segments_done} segments processed, {written} stored, "
+                f"{duplicates} duplicates skipped ({rate:.1f} segments/sec).",
+            )
+
+    _update_knowledge_sources(filepath, source_id, {
+        "name": source_name,
+        "file_hash": file_hash,
+        "segments": segments_done,
+        "imported_at": datetime.now().isoformat(timespec="seconds"),
+    })
+    try:
+        os.remove(checkpoint_path)
+    except OSError:
+        pass
+    seconds = round(time.perf_counter() - started, 3)
+    logging.info(
+        "知识库文件已成功导入至向量库：新写入 %s 段，去重 %s 段，跳过 %s 段，耗时 %.3fs。",
+        written, duplicates, resume_from, seconds,
+    )
+    return {
+        "source_id": source_id,
+        "segments": written,
+        "duplicates": duplicates,
+        "skipped": resume_from,
+        "seconds": seconds,
+    }
+
+
+def delete_knowledge_source(embedding_adapter, filepath: str, source_id: str) -> int:
+    """
+    删除某个已导入知识来源的全部片段（含词法索引与登记记录），返回删除的文档数。
+    """
+    deleted = 0
+    store = load_vector_store(embedding_adapter, filepath)
+    if store:
+        collection = store._collection
+        existing = collection.get(where={"source_id": source_id}, include=[])
+        ids = (existing or {}).get("ids") or []
+        if ids:
+            collection.delete(ids=ids)
+            remove_documents_lexically(filepath, ids)
+            deleted = len(ids)
+    _update_knowledge_sources(filepath, source_id, None)
+    logging.info(f"Deleted {deleted} documents for knowledge source {source_id}.")
+    return deleted
+
+
+def replace_knowledge_source(
+    embedding_api_key: str,
+    embedding_url: str,
+    embedding_interface_format: str,
+    embedding_model_name: str,
+    source_id: str,
+    file_path: str,
+    filepath: str,
+    progress_callback: Optional[Callable[[str], None]] = None,
+    source_name: Optional[str] = None,
+):
+    """
+    用新文件替换已导入的知识来源：先删除旧来源片段，再导入新文件。
+    未指定 source_name 时沿用旧来源名称；新文件编码无法识别时在删除前报错，旧来源保持不变。
+    """
+    detect_knowledge_encoding(file_path)
+    from embedding_adapters import get_embedding_adapter
+    embedding_adapter = get_embedding_adapter(
+        embedding_interface_format,
+        embedding_api_key,
+        embedding_url,
+        embedding_model_name
+    )
+    previous = load_knowledge_sources(filepath).get(source_id) or {}
+    deleted = delete_knowledge_source(embedding_adapter, filepath, source_id)
+    _emit_progress(progress_callback, f"Removed {deleted} documents of knowledge source {source_id}.")
+    result = import_knowledge_file(
+        embedding_api_key,
+        embedding_url,
+        embedding_interface_format,
+        embedding_model_name,
+        file_path,
+        filepath,
+        progress_callback=progress_callback,
+        source_name=source_name or previous.get("name"),
+    )
+    return dict(result, deleted=deleted, replaced_source_id=source_id)
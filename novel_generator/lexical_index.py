@@ -0,0 +1,205 @@
+#novel_generator/lexical_index.py
+# -*- coding: utf-8 -*-
+"""
+向量库旁路的词法倒排索引（CJK 二元组切分 + BM25），以及与向量检索的 RRF 融合
+"""
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logging.basicConfig(
+    filename='app.log',      # 日志文件名
+    filemode='a',            # 追加模式（'w' 会覆盖）
+    level=logging.INFO,      # 记录 INFO 及以上级别的日志
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+LEXICAL_INDEX_FILE = "lexical_index.sqlite3"
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+# CJK 统一表意文字、扩展 A、兼容表意文字；连续的 CJK 片段按二元组切分。
+_TOKEN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9A-Za-z]+")
+_CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+_index_locks: Dict[str, threading.Lock] = {}
+_index_locks_guard = threading.Lock()
+# 本进程内已建表的索引文件；文件被删除（清空向量库）后重新建表
+_initialized_paths = set()
+# meta 表中的补建完成标记：旧向量库的文档已全部写入词法索引
+_BACKFILL_MARKER = "backfill_complete"
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    中英混排分词：CJK 连续片段切为字符二元组（单字片段保留单字），
+    拉丁字母/数字按词切分并转小写。
+    """
+    tokens: List[str] = []
+    for match in _TOKEN_PATTERN.finditer(text or ""):
+        piece = match.group(0)
+        if _CJK_PATTERN.match(piece):
+            if len(piece) == 1:
+                tokens.append(piece)
+            else:
+                tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+        else:
+            tokens.append(piece.lower())
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[str]:
+    """按 RRF（Σ 1/(k+rank)）融合多路排序结果，返回融合后的 id 顺序。"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda doc_id: scores[doc_id], reverse=True)
+
+
+def _get_lock(db_path: str) -> threading.Lock:
+    with _index_locks_guard:
+        lock = _index_locks.get(db_path)
+        if lock is None:
+            lock = threading.Lock()
+            _index_locks[db_path] = lock
+        return lock
+
+
+class LexicalIndex:
+    """
+    基于 SQLite 的倒排索引，与 Chroma 文档共用 id，存放在项目 vectorstore 目录下。
+    """
+
+    def __init__(self, store_dir: str):
+        self.db_path = os.path.join(store_dir, LEXICAL_INDEX_FILE)
+        self._lock = _get_lock(self.db_path)
+        if self.db_path in _initialized_paths and os.path.exists(self.db_path):
+            return
+        os.makedirs(store_dir, exist_ok=True)
+        with self._lock, self._connect() as conn:
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS docs ("
+                "doc_id TEXT PRIMARY KEY, length INTEGER NOT NULL, chapter INTEGER);"
+                "CREATE TABLE IF NOT EXISTS postings ("
+                "term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+                "CREATE INDEX IF NOT EXISTS idx_postings_term ON postings(term);"
+                "CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id);"
+                "CREATE INDEX IF NOT EXISTS idx_docs_chapter ON docs(chapter);"
+            )
+        with _index_locks_guard:
+            _initialized_paths.add(self.db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            row = conn.execute("SELECT COUNT(*) FROM docs").fetchone()
+        return int(row[0]) if row else 0
+
+    def is_backfilled(self) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (_BACKFILL_MARKER,)).fetchone()
+        return bool(row and row[0] == "1")
+
+    def mark_backfilled(self) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, '1')", (_BACKFILL_MARKER,))
+
+    def add_documents(
+        self,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        metadatas: Optional[Sequence[Optional[dict]]] = None,
+    ) -> None:
+        doc_rows: List[Tuple[str, int, Optional[int]]] = []
+        posting_rows: List[Tuple[str, str, int]] = []
+        for index, (doc_id, text) in enumerate(zip(ids, texts)):
+            metadata = (metadatas[index] if metadatas else None) or {}
+            chapter = metadata.get("chapter")
+            term_counts = Counter(tokenize(text))
+            doc_rows.append((doc_id, sum(term_counts.values()), chapter))
+            posting_rows.extend((term, doc_id, tf) for term, tf in term_counts.items())
+        if not doc_rows:
+            return
+        with self._lock, self._connect() as conn:
+            conn.executemany("DELETE FROM postings WHERE doc_id = ?", [(row[0],) for row in doc_rows])
+            conn.executemany("INSERT OR REPLACE INTO docs(doc_id, length, chapter) VALUES (?, ?, ?)", doc_rows)
+            conn.executemany("INSERT INTO postings(term, doc_id, tf) VALUES (?, ?, ?)", posting_rows)
+
+    def delete_documents(self, ids: Iterable[str]) -> None:
+        rows = [(doc_id,) for doc_id in ids]
+        if not rows:
+            return
+        with self._lock, self._connect() as conn:
+            conn.executemany("DELETE FROM postings WHERE doc_id = ?", rows)
+            conn.executemany("DELETE FROM docs WHERE doc_id = ?", rows)
+
+    def search(self, query: str, k: int = 4, chapters: Optional[Sequence[int]] = None) -> List[Tuple[str, float]]:
+        """
+        BM25 检索，返回 [(doc_id, score)]，按得分降序。
+        chapters 指定时只返回这些章节的文档与不属于任何章节的文档（知识库）；统计量仍按全库计算。
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or k <= 0:
+            return []
+        placeholders = ",".join("?" for _ in terms)
+        chapter_clause = ""
+        chapter_params: List[int] = []
+        if chapters is not None:
+            chapter_params = [int(number) for number in chapters]
+            chapter_clause = " AND (d.chapter IS NULL"
+            if chapter_params:
+                chapter_clause += f" OR d.chapter IN ({','.join('?' for _ in chapter_params)})"
+            chapter_clause += ")"
+        with self._connect() as conn:
+            stats = conn.execute("SELECT COUNT(*), AVG(length) FROM docs").fetchone()
+            total_docs = int(stats[0] or 0) if stats else 0
+            if total_docs == 0:
+                return []
+            avg_length = float(stats[1] or 1.0) or 1.0
+            doc_freq = dict(conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term",
+                terms,
+            ).fetchall())
+            postings = conn.execute(
+                "SELECT p.doc_id, p.term, p.tf, d.length FROM postings p "
+                f"JOIN docs d ON d.doc_id = p.doc_id WHERE p.term IN ({placeholders}){chapter_clause}",
+                terms + chapter_params,
+            ).fetchall()
+
+        scores: Dict[str, float] = {}
+        for doc_id, term, tf, length in postings:
+            df = doc_freq.get(term, 0)
+            idf = math.log(1.0 + (total_docs - df + 0.5) / (df + 0.5))
+            norm = tf + BM25_K1 * (1.0 - BM25_B + BM25_B * (length or 0) / avg_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1.0) / norm
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:k]
+
+
+def backfill_lexical_index(index: LexicalIndex, collection, batch_size: int = 500) -> int:
+    """
+    旧向量库没有词法索引时，从 Chroma 集合分页读取文档（不含向量）补建索引，完成后写入补建标记。
+    按文档 id 覆盖写入，已由定稿/导入写入的文档不会重复计数。
+    """
+    total = collection.count()
+    indexed = 0
+    while indexed < total:
+        batch = collection.get(limit=batch_size, offset=indexed, include=["documents", "metadatas"])
+        ids = batch.get("ids") or []
+        if not ids:
+            break
+        index.add_documents(ids, batch.get("documents") or [""] * len(ids), batch.get("metadatas"))
+        indexed += len(ids)
+    index.mark_backfilled()
+    logging.info("Lexical index backfilled with %s documents.", indexed)
+    return indexed
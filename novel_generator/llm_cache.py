@@ -0,0 +1,257 @@
+#novel_generator/llm_cache.py
+# -*- coding: utf-8 -*-
+"""
+LLM 响应磁盘缓存（可选开启）：按 (接口格式, base_url, 模型, temperature, max_tokens, sha256(prompt)) 缓存清洗后的结果，
+支持 TTL、容量上限与按用途开关，并统计命中率。
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logging.basicConfig(
+    filename='app.log',      # 日志文件名
+    filemode='a',            # 追加模式（'w' 会覆盖）
+    level=logging.INFO,      # 记录 INFO 及以上级别的日志
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+LLM_CACHE_FILE = "llm_cache.sqlite3"
+# 可按用途开关的调用点；未在 purposes 中列出的用途不读写缓存。
+LLM_CACHE_PURPOSES = (
+    "recent_summary",
+    "keyword_search",
+    "knowledge_filter",
+    "finalize_summary",
+    "finalize_character_state",
+    "architecture",
+    "blueprint",
+    "draft",
+    "enrich",
+)
+DEFAULT_LLM_CACHE_SETTINGS = {
+    "enabled": False,
+    "purposes": ["recent_summary", "keyword_search", "knowledge_filter"],
+    "ttl_seconds": 7 * 24 * 3600,
+    "max_size_mb": 200,
+    "cache_dir": "",
+}
+
+
+def _default_cache_dir() -> str:
+    base_dir = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(base_dir, ".ai_novel_web")
+
+
+def normalize_llm_cache_settings(settings: Any) -> Dict[str, Any]:
+    """校验并补全缓存配置，非法值回退为默认值。"""
+    normalized = dict(DEFAULT_LLM_CACHE_SETTINGS)
+    normalized["purposes"] = list(DEFAULT_LLM_CACHE_SETTINGS["purposes"])
+    if not isinstance(settings, dict):
+        return normalized
+    normalized["enabled"] = bool(settings.get("enabled", normalized["enabled"]))
+    purposes = settings.get("purposes")
+    if isinstance(purposes, list):
+        normalized["purposes"] = [p for p in purposes if p in LLM_CACHE_PURPOSES]
+    for key, lower in (("ttl_seconds", 60), ("max_size_mb", 1)):
+        try:
+            normalized[key] = max(lower, int(settings.get(key, normalized[key])))
+        except (TypeError, ValueError):
+            pass
+    cache_dir = settings.get("cache_dir")
+    if isinstance(cache_dir, str):
+        normalized["cache_dir"] = cache_dir.strip()
+    return normalized
+
+
+class LLMResponseCache:
+    """基于 SQLite 的响应缓存，超出容量时按最早写入淘汰。"""
+
+    def __init__(self, cache_dir: str, ttl_seconds: int, max_size_mb: int):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, LLM_CACHE_FILE)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, purpose TEXT, response TEXT NOT NULL, "
+                "size INTEGER NOT NULL, created_at REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS idx_entries_created ON entries(created_at);"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        if time.time() - row[1] > self.ttl_seconds:
+            with self._lock, self._connect() as conn:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        return row[0]
+
+    def put(self, key: str, purpose: str, response: str) -> None:
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries(key, purpose, response, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, purpose, response, size, time.time()),
+            )
+            conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                # 从最早写入的条目开始淘汰，直到回落到上限以内。
+                overflow = total - self.max_bytes
+                rows = conn.execute("SELECT key, size FROM entries ORDER BY created_at").fetchall()
+                evict = []
+                for old_key, old_size in rows:
+                    if overflow <= 0:
+                        break
+                    evict.append((old_key,))
+                    overflow -= old_size
+                conn.executemany("DELETE FROM entries WHERE key = ?", evict)
+
+    def clear(self) -> int:
+        with self._lock, self._connect() as conn:
+            deleted = conn.execute("DELETE FROM entries").rowcount
+        return int(deleted or 0)
+
+    def usage(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": int(row[0]), "bytes": int(row[1])}
+
+
+_settings: Dict[str, Any] = normalize_llm_cache_settings(None)
+_cache: Optional[LLMResponseCache] = None
+_state_lock = threading.Lock()
+_metrics: Dict[str, Dict[str, int]] = {}
+
+
+def configure_llm_cache(settings: Any) -> Dict[str, Any]:
+    """应用缓存配置（来自 ConfigStore 的 llm_cache 段），返回规范化后的配置。"""
+    global _settings, _cache
+    normalized = normalize_llm_cache_settings(settings)
+    with _state_lock:
+        _settings = normalized
+        _cache = None
+        if normalized["enabled"]:
+            try:
+                _cache = LLMResponseCache(
+                    normalized["cache_dir"] or _default_cache_dir(),
+                    normalized["ttl_seconds"],
+                    normalized["max_size_mb"],
+                )
+            except Exception as e:
+                logging.warning(f"Failed to open LLM response cache: {e}")
+    return normalized
+
+
+def _active_cache(purpose: Optional[str]) -> Optional[LLMResponseCache]:
+    if not purpose:
+        return None
+    with _state_lock:
+        if _cache is None or purpose not in _settings["purposes"]:
+            return None
+        return _cache
+
+
+def make_cache_key(llm_adapter, prompt: str) -> str:
+    """
+    按 (接口格式, base_url, 模型, temperature, max_tokens, sha256(prompt)) 生成缓存键；
+    不同服务商或代理即使模型名相同也不共用缓存。
+    """
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    identity = json.dumps(
+        [
+            getattr(llm_adapter, "interface_format", None),
+            getattr(llm_adapter, "base_url", None),
+            getattr(llm_adapter, "model_name", type(llm_adapter).__name__),
+            getattr(llm_adapter, "temperature", None),
+            getattr(llm_adapter, "max_tokens", None),
+            prompt_hash,
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+
+def _count(purpose: str, field: str) -> None:
+    with _state_lock:
+        counters = _metrics.setdefault(purpose, {"hits": 0, "misses": 0, "stores": 0})
+        counters[field] += 1
+
+
+def lookup_cached_response(llm_adapter, prompt: str, purpose: Optional[str]) -> Optional[str]:
+    """读取缓存；未开启或未命中返回 None。读取失败不影响正常调用。"""
+    cache = _active_cache(purpose)
+    if cache is None:
+        return None
+    try:
+        response = cache.get(make_cache_key(llm_adapter, prompt))
+    except Exception as e:
+        logging.warning(f"LLM cache lookup failed: {e}")
+        response = None
+    _count(purpose, "hits" if response else "misses")
+    if response:
+        logging.info("LLM cache hit (purpose=%s).", purpose)
+    return response or None
+
+
+def store_cached_response(llm_adapter, prompt: str, purpose: Optional[str], response: str) -> None:
+    """写入缓存；未开启或结果为空时跳过。"""
+    cache = _active_cache(purpose)
+    if cache is None or not response:
+        return
+    try:
+        cache.put(make_cache_key(llm_adapter, prompt), purpose, response)
+        _count(purpose, "stores")
+    except Exception as e:
+        logging.warning(f"LLM cache store failed: {e}")
+
+
+def get_llm_cache_stats() -> Dict[str, Any]:
+    """返回缓存配置、按用途的命中统计与磁盘占用。"""
+    with _state_lock:
+        settings = dict(_settings)
+        cache = _cache
+        by_purpose = {purpose: dict(counters) for purpose, counters in _metrics.items()}
+    hits = sum(c["hits"] for c in by_purpose.values())
+    misses = sum(c["misses"] for c in by_purpose.values())
+    for counters in by_purpose.values():
+        lookups = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+    usage = {"entries": 0, "bytes": 0}
+    if cache is not None:
+        try:
+            usage = cache.usage()
+        except Exception as e:
+            logging.warning(f"Failed to read LLM cache usage: {e}")
+    return {
+        "settings": settings,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "by_purpose": by_purpose,
+        "usage": usage,
+    }
+
+
+def clear_llm_cache() -> int:
+    """清空缓存条目与命中统计，返回删除的条目数。"""
+    with _state_lock:
+        cache = _cache
+        _metrics.clear()
+    return cache.clear() if cache is not None else 0
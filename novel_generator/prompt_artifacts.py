@@ -0,0 +1,105 @@
+#novel_generator/prompt_artifacts.py
+# -*- coding: utf-8 -*-
+"""
+章节提示词及其中间产物（前文摘要、检索关键词组、过滤后的知识上下文）的持久化，
+按 (项目, 章节, 输入哈希) 存放，供“生成草稿”复用“构建提示词”的结果。
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from novel_generator.vectorstore_utils import VECTOR_INDEX_CONFIG_FILE, get_vectorstore_dir
+
+logging.basicConfig(
+    filename='app.log',      # 日志文件名
+    filemode='a',            # 追加模式（'w' 会覆盖）
+    level=logging.INFO,      # 记录 INFO 及以上级别的日志
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+PROMPT_ARTIFACTS_DIR = "prompt_artifacts"
+# 每章保留的最近条目数（不同输入组合各占一条）。
+PROMPT_ARTIFACTS_KEEP = 4
+# 影响检索结果的向量库侧文件：内容或修改时间变化即视为输入变化。
+_VECTORSTORE_FINGERPRINT_FILES = ("chroma.sqlite3", "knowledge_sources.json", VECTOR_INDEX_CONFIG_FILE)
+
+_artifacts_lock = threading.Lock()
+
+
+def _artifact_path(filepath: str, novel_number: int) -> str:
+    return os.path.join(filepath, PROMPT_ARTIFACTS_DIR, f"chapter_{int(novel_number)}.json")
+
+
+def _vectorstore_fingerprint(filepath: str) -> list:
+    store_dir = get_vectorstore_dir(filepath)
+    fingerprint = []
+    for name in _VECTORSTORE_FINGERPRINT_FILES:
+        try:
+            stat = os.stat(os.path.join(store_dir, name))
+            fingerprint.append([name, stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            fingerprint.append([name, None, None])
+    return fingerprint
+
+
+def compute_prompt_input_hash(filepath: str, params: Dict[str, Any], texts: Iterable[str]) -> str:
+    """
+    计算提示词输入哈希：章节参数（含生成中间产物所用的 LLM 配置）+ 参与构建的文本
+    （架构、本章与下一章蓝图、全局摘要、角色状态、前文）+ 向量库指纹。
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(params, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    for text in texts:
+        encoded = (text or "").encode("utf-8")
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    digest.update(json.dumps(_vectorstore_fingerprint(filepath)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _read_entries(path: str) -> Dict[str, dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+        entries = data.get("entries") if isinstance(data, dict) else None
+        return entries if isinstance(entries, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logging.warning(f"Failed to read prompt artifacts {path}: {e}")
+        return {}
+
+
+def load_prompt_artifacts(filepath: str, novel_number: int, input_hash: str) -> Optional[dict]:
+    """读取与输入哈希匹配的提示词产物，不存在返回 None。"""
+    entry = _read_entries(_artifact_path(filepath, novel_number)).get(input_hash)
+    if not isinstance(entry, dict) or not entry.get("prompt_text"):
+        return None
+    return entry
+
+
+def save_prompt_artifacts(filepath: str, novel_number: int, input_hash: str, artifacts: Dict[str, Any]) -> None:
+    """写入提示词产物（原子替换），每章只保留最近 PROMPT_ARTIFACTS_KEEP 条。"""
+    path = _artifact_path(filepath, novel_number)
+    entry = dict(artifacts, input_hash=input_hash, created_at=time.time())
+    try:
+        with _artifacts_lock:
+            entries = _read_entries(path)
+            entries.pop(input_hash, None)
+            entries[input_hash] = entry
+            if len(entries) > PROMPT_ARTIFACTS_KEEP:
+                ordered = sorted(entries.items(), key=lambda item: item[1].get("created_at", 0))
+                entries = dict(ordered[-PROMPT_ARTIFACTS_KEEP:])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as handle:
+                json.dump({"chapter": int(novel_number), "entries": entries}, handle, ensure_ascii=False)
+            os.replace(temp_path, path)
+    except Exception as e:
+        logging.warning(f"Failed to save prompt artifacts for chapter {novel_number}: {e}")
+
@@ -0,0 +1,300 @@
+#novel_generator/summary_store.py
+# -*- coding: utf-8 -*-
+"""
+分层前文摘要：逐章摘要、每 N 章一次的分卷汇总与篇幅有上限的全书梗概，
+保存在 summary_store.json，由定稿增量维护；global_summary.txt 作为其渲染视图保留，
+记录视图哈希，视图被手动编辑后以编辑内容为准。
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from novel_generator.common import raise_if_cancelled
+from prompt_definitions import arc_summary_prompt, chapter_summary_prompt, synopsis_update_prompt
+from utils import read_file
+
+logging.basicConfig(
+    filename='app.log',      # 日志文件名
+    filemode='a',            # 追加模式（'w' 会覆盖）
+    level=logging.INFO,      # 记录 INFO 及以上级别的日志
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+SUMMARY_STORE_FILE = "summary_store.json"
+GLOBAL_SUMMARY_FILE = "global_summary.txt"
+# 每卷章节数（写入存储，之后以存储中的值为准）
+SUMMARY_ARC_CHAPTERS = 10
+# 组装章节提示词时带入的最近已完成分卷数
+SUMMARY_RECENT_ARCS = 2
+
+_store_lock = threading.Lock()
+
+
+def _store_path(filepath: str) -> str:
+    return os.path.join(filepath, SUMMARY_STORE_FILE)
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256((text or "").strip().encode("utf-8")).hexdigest()
+
+
+def _empty_store() -> Dict[str, Any]:
+    return {
+        "arc_size": SUMMARY_ARC_CHAPTERS,
+        "chapters": {},
+        "arcs": {},
+        "synopsis": {"text": "", "through_chapter": 0},
+        "view_hash": "",
+    }
+
+
+def load_summary_store(filepath: str) -> Dict[str, Any]:
+    """读取分层摘要存储，不存在或损坏时返回空存储。"""
+    store = _empty_store()
+    try:
+        with open(_store_path(filepath), "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+    except FileNotFoundError:
+        return store
+    except Exception as e:
+        logging.warning(f"Failed to read summary store in {filepath}: {e}")
+        return store
+    if isinstance(data, dict):
+        for key in ("chapters", "arcs", "synopsis"):
+            if isinstance(data.get(key), dict):
+                store[key] = data[key]
+        try:
+            store["arc_size"] = max(1, int(data.get("arc_size", SUMMARY_ARC_CHAPTERS)))
+        except (TypeError, ValueError):
+            pass
+        store["view_hash"] = str(data.get("view_hash") or "")
+    return store
+
+
+def _is_empty(store: Dict[str, Any]) -> bool:
+    return not store["chapters"] and not store["synopsis"].get("text")
+
+
+def _edited_view(filepath: str, store: Dict[str, Any]) -> Optional[str]:
+    """global_summary.txt 与上次保存的渲染结果不一致（被手动编辑）时返回其文本，否则返回 None。"""
+    if _is_empty(store) or not store.get("view_hash"):
+        return None
+    text = read_file(os.path.join(filepath, GLOBAL_SUMMARY_FILE))
+    return text if _text_hash(text) != store["view_hash"] else None
+
+
+def save_summary_store(filepath: str, store: Dict[str, Any]) -> str:
+    """保存分层摘要并返回渲染文本（调用方负责写入 global_summary.txt），同时记录视图哈希。"""
+    rendered = render_global_summary(store)
+    store["view_hash"] = _text_hash(rendered)
+    path = _store_path(filepath)
+    temp_path = path + ".tmp"
+    with _store_lock:
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump(store, handle, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+    return rendered
+
+
+def arc_of(chapter_number: int, arc_size: int) -> int:
+    """章节所属的卷号（从 1 开始）。"""
+    return (int(chapter_number) - 1) // arc_size + 1
+
+
+def arc_range(arc_index: int, arc_size: int) -> tuple:
+    start = (arc_index - 1) * arc_size + 1
+    return start, start + arc_size - 1
+
+
+def _chapter_lines(store: Dict[str, Any], start: int, end: int) -> List[str]:
+    chapters = store["chapters"]
+    return [
+        f"第{number}章：{chapters[str(number)]['summary']}"
+        for number in range(start, end + 1)
+        if str(number) in chapters
+    ]
+
+
+def _unrolled_chapter_lines(store: Dict[str, Any], before: int) -> List[str]:
+    """before 之前、所属分卷尚未汇总（汇总失败或为空）的章节摘要，避免这些章节从前文中消失。"""
+    arc_size = store["arc_size"]
+    numbers = sorted(
+        int(key) for key in store["chapters"]
+        if int(key) < before and str(arc_of(int(key), arc_size)) not in store["arcs"]
+    )
+    return [f"第{number}章：{store['chapters'][str(number)]['summary']}" for number in numbers]
+
+
+def _arc_block(arc_index: int, arc: Dict[str, Any]) -> str:
+    return f"【第{arc_index}卷（第{arc['start']}-{arc['end']}章）】\n{arc['summary']}"
+
+
+def _compose(synopsis: str, arc_blocks: List[str], chapter_lines: List[str]) -> str:
+    parts = []
+    if synopsis:
+        parts.append(f"【全书梗概】\n{synopsis}")
+    parts.extend(arc_blocks)
+    if chapter_lines:
+        parts.append("【近章摘要】\n" + "\n".join(chapter_lines))
+    return "\n\n".join(parts)
+
+
+def select_summary_context(filepath: str, novel_number: int) -> str:
+    """
+    为第 novel_number 章选取前文摘要：全书梗概 + 最近 SUMMARY_RECENT_ARCS 个已完成分卷 + 本卷已定稿章节摘要。
+    只使用本章之前的内容；梗概已覆盖本章之后（修订旧章节）时改用本章之前的全部分卷概要。
+    尚未汇总的已完成分卷以逐章摘要代替。
+    存储为空或 global_summary.txt 被手动编辑过时，直接使用 global_summary.txt。
+    """
+    store = load_summary_store(filepath)
+    if _is_empty(store):
+        return read_file(os.path.join(filepath, GLOBAL_SUMMARY_FILE))
+    edited = _edited_view(filepath, store)
+    if edited is not None:
+        return edited
+    arc_size = store["arc_size"]
+    current_start = arc_range(arc_of(novel_number, arc_size), arc_size)[0]
+    synopsis = store["synopsis"].get("text", "")
+    synopsis_usable = int(store["synopsis"].get("through_chapter", 0) or 0) < current_start
+    previous_arcs = sorted(
+        (int(key), arc) for key, arc in store["arcs"].items() if int(arc.get("end", 0)) < current_start
+    )
+    if synopsis_usable:
+        previous_arcs = previous_arcs[-SUMMARY_RECENT_ARCS:]
+    return _compose(
+        synopsis if synopsis_usable else "",
+        [_arc_block(index, arc) for index, arc in previous_arcs],
+        _unrolled_chapter_lines(store, current_start) + _chapter_lines(store, current_start, novel_number - 1),
+    )
+
+
+def render_global_summary(store: Dict[str, Any]) -> str:
+    """渲染 global_summary.txt：全书梗概 + 最近分卷 + 最近一卷之后（及尚未汇总分卷）的章节摘要。"""
+    arcs = sorted((int(key), arc) for key, arc in store["arcs"].items())
+    recent_arcs = arcs[-SUMMARY_RECENT_ARCS:]
+    last_end = recent_arcs[-1][1]["end"] if recent_arcs else 0
+    chapter_numbers = [int(key) for key in store["chapters"]]
+    return _compose(
+        store["synopsis"].get("text", ""),
+        [_arc_block(index, arc) for index, arc in recent_arcs],
+        _unrolled_chapter_lines(store, last_end + 1)
+        + _chapter_lines(store, last_end + 1, max(chapter_numbers, default=0)),
+    )
+
+
+def _pending_arcs(store: Dict[str, Any], novel_number: int) -> List[int]:
+    """
+    需要汇总的分卷：本章所在分卷（本章为卷末或全卷章节均已有摘要），
+    以及此前已完成但尚未汇总（上次汇总失败或结果为空）的分卷。
+    """
+    arc_size = store["arc_size"]
+    current = arc_of(novel_number, arc_size)
+    pending = [
+        index for index in sorted({arc_of(int(key), arc_size) for key in store["chapters"]})
+        if index < current and str(index) not in store["arcs"]
+    ]
+    arc_start, arc_end = arc_range(current, arc_size)
+    if novel_number == arc_end or len(_chapter_lines(store, arc_start, arc_end)) == arc_size:
+        pending.append(current)
+    return pending
+
+
+def update_summary_store(
+    filepath: str,
+    novel_number: int,
+    chapter_text: str,
+    invoke: Callable[[str], str],
+    should_cancel: Optional[Callable[[], bool]] = None,
+    partial: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """
+    定稿时增量计算分层摘要，invoke(prompt) 返回 LLM 清洗后的文本。
+    1. 生成本章摘要（输入：本章 + 上一章摘要）；
+    2. 本卷全部章节已有摘要或本章为卷末时，汇总本卷（输入：本卷逐章摘要），此前未汇总成功的分卷一并补做；
+    3. 分卷汇总后修订全书梗概（输入：旧梗概 + 本卷概要，篇幅有上限）。
+    每章固定 1 次 LLM 调用，每卷额外 2 次，输入规模与已写章节数无关。
+    分卷汇总为空时该卷保持未汇总状态（前文中以逐章摘要代替），下次定稿时重试。
+    只在内存中更新，不写文件：返回的 store 由调用方在写入阶段用 save_summary_store 落盘。
+    partial 为调用方持有的中间结果（按提示词缓存各次 LLM 输出），失败后重试时跳过已成功的调用。
+    返回 {"chapter_summary", "arc_index", "synopsis_updated", "store"}。
+    """
+    partial = {} if partial is None else partial
+
+    def cached_invoke(key: str, prompt: str) -> str:
+        if key not in partial:
+            partial[key] = invoke(prompt).strip()
+            raise_if_cancelled(should_cancel)
+        return partial[key]
+
+    store = load_summary_store(filepath)
+    edited = _edited_view(filepath, store)
+    if _is_empty(store) or edited is not None:
+        # 旧项目迁移或 global_summary.txt 被手动编辑：以其内容作为全书梗概
+        text = (edited if edited is not None else read_file(os.path.join(filepath, GLOBAL_SUMMARY_FILE))).strip()
+        if text:
+            store["synopsis"] = {"text": text, "through_chapter": 0}
+    previous = store["chapters"].get(str(novel_number - 1), {}).get("summary", "")
+    chapter_summary = cached_invoke(
+        f"chapter:{novel_number}",
+        chapter_summary_prompt.format(
+            novel_number=novel_number,
+            chapter_text=chapter_text,
+            previous_summary=previous,
+        ),
+    )
+    if not chapter_summary:
+        partial.pop(f"chapter:{novel_number}", None)
+        raise ValueError("章节摘要为空")
+    store["chapters"][str(novel_number)] = {"summary": chapter_summary, "updated_at": time.time()}
+
+    rolled_up = None
+    synopsis_updated = False
+    arc_size = store["arc_size"]
+    for arc_index in _pending_arcs(store, novel_number):
+        arc_start, arc_end = arc_range(arc_index, arc_size)
+        arc_summary = cached_invoke(
+            f"arc:{arc_index}",
+            arc_summary_prompt.format(
+                arc_start=arc_start,
+                arc_end=arc_end,
+                chapter_summaries="\n".join(_chapter_lines(store, arc_start, arc_end)),
+            ),
+        )
+        if not arc_summary:
+            partial.pop(f"arc:{arc_index}", None)
+            logging.warning(f"Summary arc {arc_index} rollup returned empty text; its chapter summaries stay in use.")
+            continue
+        old_synopsis = store["synopsis"].get("text", "")
+        synopsis = cached_invoke(
+            f"synopsis:{arc_index}",
+            synopsis_update_prompt.format(
+                synopsis=old_synopsis,
+                arc_start=arc_start,
+                arc_end=arc_end,
+                arc_summary=arc_summary,
+            ),
+        )
+        store["arcs"][str(arc_index)] = {
+            "start": arc_start,
+            "end": arc_end,
+            "summary": arc_summary,
+            "updated_at": time.time(),
+        }
+        if synopsis:
+            through = max(arc_end, int(store["synopsis"].get("through_chapter", 0) or 0))
+            store["synopsis"] = {"text": synopsis, "through_chapter": through}
+            synopsis_updated = True
+        rolled_up = arc_index
+        logging.info(f"Rolled up summary arc {arc_index} (chapters {arc_start}-{arc_end}).")
+
+    return {
+        "chapter_summary": chapter_summary,
+        "arc_index": rolled_up,
+        "synopsis_updated": synopsis_updated,
+        "store": store,
+    }
@@ -0,0 +1,137 @@
+#novel_generator/text_segmenter.py
+# -*- coding: utf-8 -*-
+"""
+中英混排分句与切块（保留字符偏移，无外部依赖）
+"""
+from dataclasses import dataclass
+from typing import List
+
+# 句末标点（中英文），连续出现时视为同一句末，如“！？”“……”“?!”。
+_SENTENCE_TERMINATORS = frozenset("。！？!?…")
+# 仅在其后为空白或文本结尾时才断句的标点（避免切开 3.14、e.g. 等）。
+_SOFT_TERMINATORS = frozenset(".")
+_OPEN_QUOTES = {"「": "」", "『": "』", "“": "”", "‘": "’", "《": "》", "（": "）", "(": ")"}
+_CLOSE_QUOTES = frozenset(_OPEN_QUOTES.values()) | frozenset("\"'")
+
+
+@dataclass(frozen=True)
+class TextSpan:
+    """文本片段及其在原文中的字符偏移 [start, end)。"""
+
+    start: int
+    end: int
+    text: str
+
+
+def _make_span(text: str, start: int, end: int):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if start >= end:
+        return None
+    return TextSpan(start, end, text[start:end])
+
+
+def segment_sentences(text: str) -> List[TextSpan]:
+    """
+    单遍扫描切分句子，返回带偏移的句子列表。
+    - 句末标点后紧跟的右引号/右括号归入本句；
+    - 引号内的句末标点不断句，引号闭合且其前为句末标点时在引号后断句；
+    - 换行视为段落边界，一律断句。
+    """
+    spans: List[TextSpan] = []
+    if not text:
+        return spans
+
+    length = len(text)
+    start = 0
+    quote_stack: List[str] = []
+    i = 0
+    while i < length:
+        char = text[i]
+        boundary = -1
+
+        if char == "\n":
+            boundary = i
+        elif char in _OPEN_QUOTES:
+            quote_stack.append(_OPEN_QUOTES[char])
+        elif quote_stack and char == quote_stack[-1]:
+            quote_stack.pop()
+            if not quote_stack and i > 0 and text[i - 1] in _SENTENCE_TERMINATORS:
+                boundary = i + 1
+        elif not quote_stack and (
+            char in _SENTENCE_TERMINATORS
+            or (char in _SOFT_TERMINATORS and (i + 1 >= length or text[i + 1].isspace() or text[i + 1] in _CLOSE_QUOTES))
+        ):
+            end = i + 1
+            while end < length and (text[end] in _SENTENCE_TERMINATORS or text[end] in _SOFT_TERMINATORS):
+                end += 1
+            while end < length and text[end] in _CLOSE_QUOTES:
+                end += 1
+            boundary = end
+
+        if boundary >= 0:
+            span = _make_span(text, start, boundary)
+            if span:
+                spans.append(span)
+            start = boundary
+            i = max(i + 1, boundary)
+            if char == "\n":
+                quote_stack.clear()
+            continue
+        i += 1
+
+    span = _make_span(text, start, length)
+    if span:
+        spans.append(span)
+    return spans
+
+
+def _split_long_span(text: str, span: TextSpan, max_length: int) -> List[TextSpan]:
+    pieces: List[TextSpan] = []
+    cursor = span.start
+    while cursor < span.end:
+        piece = _make_span(text, cursor, min(cursor + max_length, span.end))
+        if piece:
+            pieces.append(piece)
+        cursor += max_length
+    return pieces
+
+
+def chunk_text(text: str, max_length: int = 500, overlap: int = 0) -> List[TextSpan]:
+    """
+    将句子按长度上限打包为片段，片段文本直接取原文切片以保留偏移。
+    overlap > 0 时，下一片段会带上前一片段末尾不超过 overlap 字符的完整句子。
+    """
+    max_length = max(1, int(max_length))
+    overlap = max(0, min(int(overlap), max_length - 1))
+
+    sentences: List[TextSpan] = []
+    for sentence in segment_sentences(text):
+        if sentence.end - sentence.start > max_length:
+            sentences.extend(_split_long_span(text, sentence, max_length))
+        else:
+            sentences.append(sentence)
+
+    chunks: List[TextSpan] = []
+    current: List[TextSpan] = []
+    for sentence in sentences:
+        if current and sentence.end - current[0].start > max_length:
+            chunk = _make_span(text, current[0].start, current[-1].end)
+            if chunk:
+                chunks.append(chunk)
+            carried: List[TextSpan] = []
+            if overlap:
+                for previous in reversed(current):
+                    if sentence.end - previous.start > max_length or current[-1].end - previous.start > overlap:
+                        break
+                    carried.insert(0, previous)
+            current = carried
+        current.append(sentence)
+
+    if current:
+        chunk = _make_span(text, current[0].start, current[-1].end)
+        if chunk:
+            chunks.append(chunk)
+    return chunks
@@ -0,0 +1,210 @@
+#novel_generator/token_budget.py
+# -*- coding: utf-8 -*-
+"""
+提示词 token 预算：本地分词计数（安装可选依赖 tokenizer，即 tiktoken 时使用其编码，否则按字符类别估算），
+按模型上下文窗口（llm_configs 中的 context_window）为各段落分配预算，超出时从最低优先级段落开始裁剪。
+"""
+import logging
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+logging.basicConfig(
+    filename='app.log',      # 日志文件名
+    filemode='a',            # 追加模式（'w' 会覆盖）
+    level=logging.INFO,      # 记录 INFO 及以上级别的日志
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# 未在 llm_configs 中配置 context_window 时使用的上下文窗口（tokens）
+DEFAULT_CONTEXT_WINDOW = 65536
+# 输入预算的安全余量：至少 TOKEN_SAFETY_MARGIN，且不少于窗口的 1/20（覆盖估算误差与消息封装开销）
+TOKEN_SAFETY_MARGIN = 256
+# tiktoken 编码名；设为 "heuristic" 时始终使用估算
+TOKENIZER_ENCODING = os.environ.get("AINOVEL_TOKENIZER_ENCODING", "cl100k_base")
+TRUNCATION_MARKER = "……"
+
+# 中日韩文字与全角标点按 1 token/字估算，其余字符按 4 字符/token 估算
+_CJK_PATTERN = re.compile("[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\ufe30-\ufe4f\uff00-\uffef]")
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return _encoding
+    with _encoding_lock:
+        if not _encoding_loaded:
+            if TOKENIZER_ENCODING != "heuristic":
+                try:
+                    import tiktoken
+                except ImportError:
+                    logging.warning(
+                        "tiktoken is not installed (optional extra 'tokenizer'); "
+                        "using heuristic token counting."
+                    )
+                else:
+                    try:
+                        _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                    except Exception as e:
+                        logging.warning(
+                            f"tiktoken encoding {TOKENIZER_ENCODING} unavailable ({e}); "
+                            "using heuristic token counting."
+                        )
+            _encoding_loaded = True
+    return _encoding
+
+
+def _estimate_tokens(text: str) -> int:
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def count_tokens(text: str) -> int:
+    """统计文本的 token 数。"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return _estimate_tokens(text)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """
+    把文本裁剪到 max_tokens 以内（含截断标记）。keep="head" 保留开头，keep="tail" 保留结尾。
+    """
+    if not text or count_tokens(text) <= max_tokens:
+        return text or ""
+    limit = max_tokens - count_tokens(TRUNCATION_MARKER)
+    if limit <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        piece = tokens[:limit] if keep == "head" else tokens[-limit:]
+        kept = encoding.decode(piece).strip("\ufffd")
+    else:
+        # 估算计数随保留长度单调增长，二分查找可保留的最长字符数
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            candidate = text[:mid] if keep == "head" else text[-mid:]
+            if _estimate_tokens(candidate) <= limit:
+                low = mid
+            else:
+                high = mid - 1
+        kept = text[:low] if keep == "head" else text[len(text) - low:]
+    if not kept:
+        return ""
+    return kept + TRUNCATION_MARKER if keep == "head" else TRUNCATION_MARKER + kept
+
+
+def resolve_context_window(value) -> int:
+    """解析 llm_configs 中的 context_window，缺失或非法时回退为 DEFAULT_CONTEXT_WINDOW。"""
+    try:
+        window = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_CONTEXT_WINDOW
+    return window if window > 0 else DEFAULT_CONTEXT_WINDOW
+
+
+def input_token_budget(context_window: int, max_output_tokens: int) -> int:
+    """
+    输入可用的 token 数：窗口减去为输出预留的部分（不超过窗口一半）与安全余量。
+    """
+    window = resolve_context_window(context_window)
+    reserved_output = min(max(0, int(max_output_tokens or 0)), window // 2)
+    margin = max(TOKEN_SAFETY_MARGIN, window // 20)
+    return max(0, window - reserved_output - margin)
+
+
+@dataclass(frozen=True)
+class PromptSection:
+    """
+    提示词中的可裁剪段落。
+    priority 越小越先被裁剪；share 为该段落最多占用可变预算的比例；
+    max_tokens 为不随窗口增长的绝对上限（None 表示只受 share 限制）；
+    min_tokens 为按优先级裁剪时保留的下限；keep 指定保留开头（head）还是结尾（tail）。
+    """
+
+    name: str
+    text: str
+    priority: int
+    share: float = 1.0
+    min_tokens: int = 0
+    keep: str = "head"
+    max_tokens: Optional[int] = None
+
+
+def fit_sections(sections: List[PromptSection], budget: int) -> Tuple[Dict[str, str], Dict[str, dict]]:
+    """
+    在 budget 内分配各段落：先按 share 与 max_tokens 限制单段上限，总量仍超出时从最低优先级开始裁剪到 min_tokens，
+    仍不足再按同一顺序裁剪到 0。返回 (段落名 -> 文本, 段落名 -> {"tokens", "original_tokens"})。
+    """
+    budget = max(0, int(budget))
+    original = {section.name: count_tokens(section.text) for section in sections}
+    allowed = {
+        section.name: min(
+            original[section.name],
+            int(budget * max(0.0, section.share)),
+            section.max_tokens if section.max_tokens is not None else budget,
+        )
+        for section in sections
+    }
+    overflow = sum(allowed.values()) - budget
+    by_priority = sorted(sections, key=lambda section: section.priority)
+    for use_min in (True, False):
+        for section in by_priority:
+            if overflow <= 0:
+                break
+            floor = min(section.min_tokens, allowed[section.name]) if use_min else 0
+            cut = min(overflow, allowed[section.name] - floor)
+            allowed[section.name] -= cut
+            overflow -= cut
+
+    texts = {}
+    report = {}
+    for section in sections:
+        limit = allowed[section.name]
+        if limit >= original[section.name]:
+            text = section.text or ""
+        else:
+            text = truncate_to_tokens(section.text, limit, keep=section.keep)
+        texts[section.name] = text
+        report[section.name] = {"tokens": count_tokens(text), "original_tokens": original[section.name]}
+    return texts, report
+
+
+def assemble_prompt(
+    template: str,
+    sections: List[PromptSection],
+    context_window: int,
+    max_output_tokens: int,
+    **fields,
+) -> Tuple[str, dict]:
+    """
+    用 template.format 组装提示词：fields 原样填入，sections 按预算裁剪后填入。
+    返回 (提示词, 预算报告)；报告含窗口、输入预算、最终 token 数与被裁剪的段落。
+    """
+    fixed_text = template.format(**fields, **{section.name: "" for section in sections})
+    budget = input_token_budget(context_window, max_output_tokens)
+    texts, report = fit_sections(sections, budget - count_tokens(fixed_text))
+    prompt = template.format(**fields, **texts)
+    trimmed = [name for name, item in report.items() if item["tokens"] < item["original_tokens"]]
+    if trimmed:
+        logging.info(f"Prompt sections trimmed to fit {budget} input tokens: {trimmed}")
+    return prompt, {
+        "context_window": resolve_context_window(context_window),
+        "input_budget": budget,
+        "prompt_tokens": count_tokens(prompt),
+        "sections": report,
+        "trimmed": trimmed,
+    }
@@ -3,17 +3,111 @@
 向量库管理模块（获取摘要、按章节删除等）
 """
 import logging
-from typing import Any, Dict, List
-from novel_generator.vectorstore_utils import load_vector_store
+import os
+from typing import Any, Callable, Dict, List, Optional
+from novel_generator.vectorstore_utils import (
+    DEFAULT_VECTOR_INDEX_OPTIONS,
+    VECTOR_INDEX_BUILD_KEYS,
+    VECTOR_INDEX_RUNTIME_KEYS,
+    VECTORSTORE_COLLECTION_NAME,
+    backfill_unscoped_sources,
+    build_collection_metadata,
+    get_vectorstore_dir,
+    load_vector_index_options,
+    load_vector_store,
+    remove_documents_lexically,
+    save_vector_index_options,
+    vector_store_exists,
+)
 
 
 logger = logging.getLogger(__name__)
 
 
+_SQLITE_COLLECTION_JOIN = (
+    "FROM embeddings e "
+    "JOIN segments s ON e.segment_id = s.id "
+    "JOIN collections c ON s.collection = c.id "
+)
+
+
+def _build_summary(total_count: int, chapter_groups: Dict[int, int]) -> Dict[str, Any]:
+    groups = []
+    for chapter_num in sorted(chapter_groups.keys()):
+        groups.append({
+            "type": "chapter",
+            "chapter": chapter_num,
+            "count": chapter_groups[chapter_num]
+        })
+
+    knowledge_count = total_count - sum(chapter_groups.values())
+    if knowledge_count > 0:
+        groups.append({
+            "type": "knowledge",
+            "count": knowledge_count
+        })
+
+    return {
+        "total_count": total_count,
+        "groups": groups
+    }
+
+
+def _summarize_from_sqlite(filepath: str) -> Optional[Dict[str, Any]]:
+    """
+    直接对 Chroma 的 SQLite 元数据表做聚合统计（COUNT / GROUP BY），
+    不加载文档正文与向量。表结构不符合预期时返回 None。
+    """
+    db_path = os.path.join(get_vectorstore_dir(filepath), "chroma.sqlite3")
+    if not os.path.isfile(db_path):
+        return None
+
+    import sqlite3
+
+    try:
+        with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' "
+                "AND name IN ('embeddings', 'segments', 'collections', 'embedding_metadata')"
+            )
+            if len(cursor.fetchall()) < 4:
+                return None
+
+            cursor.execute(
+                "SELECT COUNT(*) " + _SQLITE_COLLECTION_JOIN + "WHERE c.name = ?",
+                (VECTORSTORE_COLLECTION_NAME,),
+            )
+            row = cursor.fetchone()
+            total_count = int(row[0]) if row else 0
+
+            cursor.execute(
+                "SELECT COALESCE(m.int_value, CAST(m.string_value AS INTEGER)), COUNT(*) "
+                + _SQLITE_COLLECTION_JOIN
+                + "JOIN embedding_metadata m ON m.id = e.id "
+                "WHERE c.name = ? AND m.key = 'chapter' "
+                "GROUP BY 1",
+                (VECTORSTORE_COLLECTION_NAME,),
+            )
+            chapter_groups: Dict[int, int] = {}
+            for chapter_value, count in cursor.fetchall():
+                if chapter_value is None:
+                    continue
+                chapter_groups[int(chapter_value)] = int(count)
+    except Exception as e:
+        logger.info(f"SQLite vectorstore summary unavailable, fallback to collection scan: {e}")
+        return None
+
+    return _build_summary(total_count, chapter_groups)
+
+
 def get_vectorstore_summary(embedding_adapter, filepath: str) -> Dict[str, Any]:
     """
     获取向量库摘要，按来源分组统计。
 
+    优先通过 SQLite 聚合查询统计，失败时回退为仅读取 metadatas 的集合扫描，
+    两条路径都不会加载文档正文或向量。
+
     Args:
         embedding_adapter: Embedding 适配器
         filepath: 项目根目录
@@ -30,50 +124,34 @@ def get_vectorstore_summary(embedding_adapter, filepath: str) -> Dict[str, Any]:
         }
         如果向量库不存在或为空，返回 {"total_count": 0, "groups": []}
     """
+    if not vector_store_exists(filepath):
+        logger.info("Vector store not found.")
+        return {"total_count": 0, "groups": []}
+
+    summary = _summarize_from_sqlite(filepath)
+    if summary is not None:
+        return summary
+
     store = load_vector_store(embedding_adapter, filepath)
     if not store:
         logger.info("Vector store not found or failed to load.")
         return {"total_count": 0, "groups": []}
 
     try:
-        # 使用 Chroma 底层 API 获取所有文档
+        # 使用 Chroma 底层 API，仅取元数据
         collection = store._collection
-        result = collection.get()
+        result = collection.get(include=["metadatas"])
 
         if not result or not result.get("ids"):
             return {"total_count": 0, "groups": []}
 
-        # 统计分组
         chapter_groups: Dict[int, int] = {}  # {章节号: 数量}
-        knowledge_count = 0
-
-        metadatas = result.get("metadatas", [])
-        for metadata in metadatas:
+        for metadata in result.get("metadatas") or []:
             if metadata and "chapter" in metadata:
                 chapter_num = metadata["chapter"]
                 chapter_groups[chapter_num] = chapter_groups.get(chapter_num, 0) + 1
-            else:
-                knowledge_count += 1
-
-        # 构建分组列表
-        groups = []
-        for chapter_num in sorted(chapter_groups.keys()):
-            groups.append({
-                "type": "chapter",
-                "chapter": chapter_num,
-                "count": chapter_groups[chapter_num]
-            })
-
-        if knowledge_count > 0:
-            groups.append({
-                "type": "knowledge",
-                "count": knowledge_count
-            })
-
-        return {
-            "total_count": len(result["ids"]),
-            "groups": groups
-        }
+
+        return _build_summary(len(result["ids"]), chapter_groups)
 
     except Exception as e:
         logger.warning(f"Failed to get vectorstore summary: {e}")
@@ -100,11 +178,12 @@ def delete_vectorstore_by_chapter(embedding_adapter, filepath: str, chapter_numb
     try:
         collection = store._collection
         # 查找该章节的所有文档
-        existing = collection.get(where={"chapter": chapter_number})
+        existing = collection.get(where={"chapter": chapter_number}, include=[])
 
         if existing and existing.get("ids"):
             ids_to_delete = existing["ids"]
             collection.delete(ids=ids_to_delete)
+            remove_documents_lexically(filepath, ids_to_delete)
             logger.info(f"Deleted {len(ids_to_delete)} documents for chapter {chapter_number}.")
             return len(ids_to_delete)
         else:
@@ -114,3 +193,163 @@ def delete_vectorstore_by_chapter(embedding_adapter, filepath: str, chapter_numb
     except Exception as e:
         logger.warning(f"Failed to delete chapter {chapter_number} from vectorstore: {e}")
         return 0
+
+
+VECTOR_INDEX_REBUILD_SUFFIX = "_rebuild"
+VECTOR_INDEX_REBUILD_BATCH_SIZE = 500
+
+
+def _open_chroma_client(filepath: str):
+    from chromadb import PersistentClient
+    from chromadb.config import Settings
+
+    return PersistentClient(
+        path=get_vectorstore_dir(filepath),
+        settings=Settings(anonymized_telemetry=False),
+    )
+
+
+def _current_build_params(collection) -> Dict[str, int]:
+    metadata = collection.metadata or {}
+    current = {}
+    for key in VECTOR_INDEX_BUILD_KEYS:
+        try:
+            current[key] = int(metadata.get(f"hnsw:{key}", DEFAULT_VECTOR_INDEX_OPTIONS[key]))
+        except (TypeError, ValueError):
+            current[key] = DEFAULT_VECTOR_INDEX_OPTIONS[key]
+    return current
+
+
+def _apply_runtime_params(collection, options: Dict[str, Any]) -> bool:
+    """调整 search_ef 等运行期参数，无需重建索引。"""
+    runtime = {key: options[key] for key in VECTOR_INDEX_RUNTIME_KEYS}
+    try:
+        collection.modify(configuration={"hnsw": {
+            "ef_search": runtime["search_ef"],
+            "num_threads": runtime["num_threads"],
+            "batch_size": runtime["batch_size"],
+            "sync_threshold": runtime["sync_threshold"],
+        }})
+        return True
+    except Exception as e:
+        logger.info(f"Collection configuration update unsupported, fallback to metadata: {e}")
+    try:
+        metadata = dict(collection.metadata or {})
+        metadata.update({f"hnsw:{key}": value for key, value in runtime.items()})
+        collection.modify(metadata=metadata)
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to update vector index runtime params: {e}")
+        return False
+
+
+def _recover_interrupted_rebuild(client) -> None:
+    """上次重建在删除旧集合后中断时，将临时集合改回正式名称。"""
+    names = {getattr(item, "name", item) for item in client.list_collections()}
+    rebuild_name = VECTORSTORE_COLLECTION_NAME + VECTOR_INDEX_REBUILD_SUFFIX
+    if rebuild_name not in names:
+        return
+    if VECTORSTORE_COLLECTION_NAME in names:
+        client.delete_collection(rebuild_name)
+        return
+    client.get_collection(rebuild_name).modify(name=VECTORSTORE_COLLECTION_NAME)
+    logger.info("Recovered vector store from interrupted index rebuild.")
+
+
+def rebuild_vector_index(
+    filepath: str,
+    options: Dict[str, Any],
+    progress_callback: Optional[Callable[[str], None]] = None,
+    batch_size: int = VECTOR_INDEX_REBUILD_BATCH_SIZE,
+) -> int:
+    """
+    按新的索引参数重建集合：复制已存储的向量（不重新调用 Embedding），
+    完成后替换原集合。返回复制的文档数量。
+    """
+    def emit(message: str) -> None:
+        logger.info(message)
+        if progress_callback:
+            progress_callback(message)
+
+    client = _open_chroma_client(filepath)
+    _recover_interrupted_rebuild(client)
+    source = client.get_collection(VECTORSTORE_COLLECTION_NAME)
+    rebuild_name = VECTORSTORE_COLLECTION_NAME + VECTOR_INDEX_REBUILD_SUFFIX
+    target = client.create_collection(
+        rebuild_name,
+        metadata=build_collection_metadata(options),
+    )
+
+    total = source.count()
+    copied = 0
+    while copied < total:
+        batch = source.get(
+            limit=batch_size,
+            offset=copied,
+            include=["embeddings", "documents", "metadatas"],
+        )
+        ids = batch.get("ids") or []
+        if not ids:
+            break
+        target.add(
+            ids=ids,
+            embeddings=batch.get("embeddings"),
+            documents=batch.get("documents"),
+            metadatas=[metadata or None for metadata in (batch.get("metadatas") or [None] * len(ids))],
+        )
+        copied += len(ids)
+        emit(f"向量索引重建中：{copied}/{total}")
+
+    # 重建是写入路径：顺带为旧文档补记 source，切换集合前完成
+    backfill_unscoped_sources(target, filepath)
+    client.delete_collection(VECTORSTORE_COLLECTION_NAME)
+    target.modify(name=VECTORSTORE_COLLECTION_NAME)
+    emit(f"向量索引重建完成，共 {copied} 条文档。")
+    return copied
+
+
+def apply_vector_index_options(
+    filepath: str,
+    options: Dict[str, Any],
+    progress_callback: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """
+    保存并应用项目向量库的索引配置。
+
+    - options 只需包含要修改的字段，未给出的字段沿用已保存的配置；
+    - 仅运行期参数（search_ef 等）变化时直接修改集合配置；
+    - 建图参数（M / construction_ef）或索引模式变化时重建索引；
+    - 项目尚无向量库时只保存配置，建库时按配置创建集合。
+
+    Returns:
+        {"options": 规范化后的配置, "rebuilt": bool, "documents": int}
+    """
+    previous = load_vector_index_options(filepath)
+    store_exists = vector_store_exists(filepath)
+    normalized = save_vector_index_options(filepath, {**previous, **(options or {})})
+    if not store_exists:
+        return {"options": normalized, "rebuilt": False, "documents": 0}
+
+    try:
+        client = _open_chroma_client(filepath)
+        _recover_interrupted_rebuild(client)
+        collection = client.get_collection(VECTORSTORE_COLLECTION_NAME)
+    except Exception as e:
+        logger.info(f"Vector store collection not found, options will apply on creation: {e}")
+        return {"options": normalized, "rebuilt": False, "documents": 0}
+
+    target_build = {key: normalized[key] for key in VECTOR_INDEX_BUILD_KEYS}
+    needs_rebuild = (
+        previous["mode"] != normalized["mode"]
+        or _current_build_params(collection) != target_build
+    )
+    if normalized["mode"] == "default" and previous["mode"] == "default":
+        needs_rebuild = False
+
+    if needs_rebuild:
+        copied = rebuild_vector_index(filepath, normalized, progress_callback)
+        return {"options": normalized, "rebuilt": True, "documents": copied}
+
+    if normalized["mode"] == "hnsw":
+        _apply_runtime_params(collection, normalized)
+    return {"options": normalized, "rebuilt": False, "documents": collection.count()}
@@ -5,11 +5,12 @@
 """
 import os
 import hashlib
+import json
 import logging
-import re
+import threading
 import traceback
-import nltk
-from langchain_chroma import Chroma
+import uuid
+from typing import Optional
 logging.basicConfig(
     filename='app.log',      # 日志文件名
     filemode='a',            # 追加模式（'w' 会覆盖）
@@ -18,14 +19,112 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
-from chromadb.config import Settings
-from langchain.docstore.document import Document
-from .common import call_with_retry
+from .embedding_results import CheckedEmbeddings
+from .lexical_index import LexicalIndex, backfill_lexical_index, reciprocal_rank_fusion
+from .text_segmenter import chunk_text
+from .token_budget import truncate_to_tokens
+
+VECTORSTORE_COLLECTION_NAME = "novel_collection"
+VECTOR_INDEX_CONFIG_FILE = "index_config.json"
+# Chroma 持久化数据库文件；vectorstore 目录可能只存放索引配置，以该文件判断向量库是否存在
+CHROMA_DB_FILE = "chroma.sqlite3"
+RETRIEVAL_MODES = ("vector", "hybrid")
+HYBRID_CANDIDATE_MULTIPLIER = 4
+# 知识库导入文档的 metadata["source"]；按章节过滤检索时始终保留这类文档
+KNOWLEDGE_SOURCE = "knowledge"
+# 不属于任何章节的其他文档（含旧版本写入、没有元数据的文档）的 metadata["source"]，同样不受章节过滤
+UNSCOPED_SOURCE = "unscoped"
+# 旧文档补记 UNSCOPED_SOURCE 的完成标记；清空向量库时随目录一并删除
+SCOPE_BACKFILL_MARKER_FILE = "scope_backfill.json"
+SCOPE_BACKFILL_PAGE_SIZE = 1000
+_scope_backfill_locks = {}
+_scope_backfill_locks_guard = threading.Lock()
+
+# HNSW 图索引参数：M/construction_ef 决定建图质量（修改需重建），
+# search_ef 等为运行期参数，可直接调整召回率与延迟的平衡。
+VECTOR_INDEX_BUILD_KEYS = ("M", "construction_ef")
+VECTOR_INDEX_RUNTIME_KEYS = ("search_ef", "num_threads", "batch_size", "sync_threshold")
+DEFAULT_VECTOR_INDEX_OPTIONS = {
+    "mode": "default",
+    "M": 16,
+    "construction_ef": 100,
+    "search_ef": 10,
+    "num_threads": 4,
+    "batch_size": 100,
+    "sync_threshold": 1000,
+}
+_VECTOR_INDEX_LIMITS = {
+    "M": (4, 128),
+    "construction_ef": (10, 2000),
+    "search_ef": (1, 2000),
+    "num_threads": (1, 64),
+    "batch_size": (10, 100000),
+    "sync_threshold": (100, 1000000),
+}
+
 
 def get_vectorstore_dir(filepath: str) -> str:
     """获取 vectorstore 路径"""
     return os.path.join(filepath, "vectorstore")
 
+
+def vector_store_exists(filepath: str) -> bool:
+    """项目是否已有 Chroma 向量库（仅有索引配置文件的 vectorstore 目录不算）。"""
+    return os.path.exists(os.path.join(get_vectorstore_dir(filepath), CHROMA_DB_FILE))
+
+
+def normalize_vector_index_options(options) -> dict:
+    """校验并补全向量索引参数，非法值回退为默认值并限制在合理范围内。"""
+    normalized = dict(DEFAULT_VECTOR_INDEX_OPTIONS)
+    if not isinstance(options, dict):
+        return normalized
+    mode = str(options.get("mode", normalized["mode"]) or "").strip().lower()
+    normalized["mode"] = mode if mode in ("default", "hnsw") else "default"
+    for key, (lower, upper) in _VECTOR_INDEX_LIMITS.items():
+        if options.get(key) is None:
+            continue
+        try:
+            value = int(options[key])
+        except (TypeError, ValueError):
+            continue
+        normalized[key] = max(lower, min(upper, value))
+    return normalized
+
+
+def load_vector_index_options(filepath: str) -> dict:
+    """读取项目向量库的索引配置（vectorstore/index_config.json）。"""
+    config_path = os.path.join(get_vectorstore_dir(filepath), VECTOR_INDEX_CONFIG_FILE)
+    try:
+        with open(config_path, "r", encoding="utf-8") as handle:
+            return normalize_vector_index_options(json.load(handle))
+    except FileNotFoundError:
+        return dict(DEFAULT_VECTOR_INDEX_OPTIONS)
+    except Exception as e:
+        logging.warning(f"Failed to read vector index config: {e}")
+        return dict(DEFAULT_VECTOR_INDEX_OPTIONS)
+
+
+def save_vector_index_options(filepath: str, options: dict) -> dict:
+    """保存项目向量库的索引配置，返回规范化后的配置。"""
+    normalized = normalize_vector_index_options(options)
+    store_dir = get_vectorstore_dir(filepath)
+    os.makedirs(store_dir, exist_ok=True)
+    config_path = os.path.join(store_dir, VECTOR_INDEX_CONFIG_FILE)
+    with open(config_path, "w", encoding="utf-8") as handle:
+        json.dump(normalized, handle, ensure_ascii=False, indent=2)
+    return normalized
+
+
+def build_collection_metadata(options: dict):
+    """将索引配置转换为 Chroma collection 的 hnsw:* 元数据；默认模式返回 None。"""
+    normalized = normalize_vector_index_options(options)
+    if normalized["mode"] != "hnsw":
+        return None
+    return {
+        f"hnsw:{key}": normalized[key]
+        for key in VECTOR_INDEX_BUILD_KEYS + VECTOR_INDEX_RUNTIME_KEYS
+    }
+
 def clear_vector_store(filepath: str) -> bool:
     """清空 清空向量库"""
     import shutil
@@ -33,9 +132,13 @@ def clear_vector_store(filepath: str) -> bool:
     if not os.path.exists(store_dir):
         logging.info("No vector store found to clear.")
         return False
+    index_options = load_vector_index_options(filepath)
     try:
         shutil.rmtree(store_dir)
         logging.info(f"Vector store directory '{store_dir}' removed.")
+        # 保留用户设置的索引参数，重新写入后下次建库仍按该配置创建。
+        if index_options != DEFAULT_VECTOR_INDEX_OPTIONS:
+            save_vector_index_options(filepath, index_options)
         return True
     except Exception as e:
         logging.error(f"无法删除向量库文件夹，请关闭程序后手动删除 {store_dir}。\n {str(e)}")
@@ -47,97 +150,121 @@ def init_vector_store(embedding_adapter, texts, filepath: str):
     在 filepath 下创建/加载一个 Chroma 向量库并插入 texts。
     如果Embedding失败，则返回 None，不中断任务。
     """
-    docs = [Document(page_content=str(t)) for t in texts]
+    from langchain.docstore.document import Document
+
+    docs = [Document(page_content=str(t), metadata={"source": UNSCOPED_SOURCE}) for t in texts]
     return init_vector_store_from_docs(embedding_adapter, docs, filepath)
 
 
+def build_checked_embeddings(embedding_adapter):
+    """
+    构造供 Chroma 使用的 LangChain Embeddings：结果经维度校验、空向量重试与 L2 归一化，
+    以 float32 数组返回。
+    """
+    from langchain.embeddings.base import Embeddings as LCEmbeddings
+
+    class LCEmbeddingWrapper(CheckedEmbeddings, LCEmbeddings):
+        pass
+
+    return LCEmbeddingWrapper(embedding_adapter)
+
+
 def init_vector_store_from_docs(embedding_adapter, documents, filepath: str):
     """
     在 filepath 下创建/加载一个 Chroma 向量库并插入 documents。
     如果Embedding失败，则返回 None，不中断任务。
     """
-    from langchain.embeddings.base import Embeddings as LCEmbeddings
+    from chromadb.config import Settings
+    from langchain_chroma import Chroma
 
     store_dir = get_vectorstore_dir(filepath)
     os.makedirs(store_dir, exist_ok=True)
 
     try:
-        class LCEmbeddingWrapper(LCEmbeddings):
-            def embed_documents(self, texts):
-                return call_with_retry(
-                    func=embedding_adapter.embed_documents,
-                    max_retries=2,
-                    sleep_time=1,
-                    fallback_return=[],
-                    texts=texts
-                )
-            def embed_query(self, query: str):
-                res = call_with_retry(
-                    func=embedding_adapter.embed_query,
-                    max_retries=2,
-                    sleep_time=1,
-                    fallback_return=[],
-                    query=query
-                )
-                return res
-
-        chroma_embedding = LCEmbeddingWrapper()
+        chroma_embedding = build_checked_embeddings(embedding_adapter)
+        ids = [uuid.uuid4().hex for _ in documents]
         vectorstore = Chroma.from_documents(
             documents,
+            ids=ids,
             embedding=chroma_embedding,
             persist_directory=store_dir,
             client_settings=Settings(anonymized_telemetry=False),
-            collection_name="novel_collection"
+            collection_name=VECTORSTORE_COLLECTION_NAME,
+            collection_metadata=build_collection_metadata(load_vector_index_options(filepath)),
         )
+        index_documents_lexically(filepath, ids, documents)
         return vectorstore
     except Exception as e:
         logging.warning(f"Init vector store failed: {e}")
         traceback.print_exc()
         return None
 
-def load_vector_store(embedding_adapter, filepath: str):
+def load_vector_store(embedding_adapter, filepath: str, create: bool = False):
     """
-    读取已存在的 Chroma 向量库。若不存在则返回 None。
+    读取已存在的 Chroma 向量库。若不存在则返回 None（create=True 时创建空库）。
     如果加载失败（embedding 或IO问题），则返回 None。
     """
-    from langchain.embeddings.base import Embeddings as LCEmbeddings
     store_dir = get_vectorstore_dir(filepath)
-    if not os.path.exists(store_dir):
+    if not create and not vector_store_exists(filepath):
         logging.info("Vector store not found. Will return None.")
         return None
 
+    from chromadb.config import Settings
+    from langchain_chroma import Chroma
+
     try:
-        class LCEmbeddingWrapper(LCEmbeddings):
-            def embed_documents(self, texts):
-                return call_with_retry(
-                    func=embedding_adapter.embed_documents,
-                    max_retries=2,
-                    sleep_time=1,
-                    fallback_return=[],
-                    texts=texts
-                )
-            def embed_query(self, query: str):
-                res = call_with_retry(
-                    func=embedding_adapter.embed_query,
-                    max_retries=2,
-                    sleep_time=1,
-                    fallback_return=[],
-                    query=query
-                )
-                return res
-
-        chroma_embedding = LCEmbeddingWrapper()
-        return Chroma(
+        chroma_embedding = build_checked_embeddings(embedding_adapter)
+        store = Chroma(
             persist_directory=store_dir,
             embedding_function=chroma_embedding,
             client_settings=Settings(anonymized_telemetry=False),
-            collection_name="novel_collection"
+            collection_name=VECTORSTORE_COLLECTION_NAME,
+            collection_metadata=build_collection_metadata(load_vector_index_options(filepath)),
         )
+        chroma_embedding.bind_collection(store._collection)
+        return store
     except Exception as e:
         logging.warning(f"Failed to load vector store: {e}")
         traceback.print_exc()
         return None
 
+def get_or_create_vector_store(embedding_adapter, filepath: str):
+    """
+    加载项目向量库，目录不存在时先创建空库（按索引配置建 collection）。
+    用于分批写入场景，避免首批文档走 from_documents 的整库嵌入。
+    """
+    os.makedirs(get_vectorstore_dir(filepath), exist_ok=True)
+    return load_vector_store(embedding_adapter, filepath, create=True)
+
+
+def index_documents_lexically(filepath: str, ids, documents) -> None:
+    """将已写入向量库的文档同步写入词法倒排索引，失败时仅记录日志。"""
+    try:
+        LexicalIndex(get_vectorstore_dir(filepath)).add_documents(
+            ids,
+            [doc.page_content for doc in documents],
+            [doc.metadata for doc in documents],
+        )
+    except Exception as e:
+        logging.warning(f"Failed to update lexical index: {e}")
+
+
+def remove_documents_lexically(filepath: str, ids) -> None:
+    """从词法倒排索引中删除文档，失败时仅记录日志。"""
+    try:
+        LexicalIndex(get_vectorstore_dir(filepath)).delete_documents(ids)
+    except Exception as e:
+        logging.warning(f"Failed to delete from lexical index: {e}")
+
+
+def add_documents_to_store(store, documents, filepath: str) -> list:
+    """向已加载的向量库追加文档，并同步词法索引，返回文档 id 列表。"""
+    ids = [uuid.uuid4().hex for _ in documents]
+    store.add_documents(documents, ids=ids)
+    index_documents_lexically(filepath, ids, documents)
+    return ids
+
+
 def split_by_length(text: str, max_length: int = 500):
     """按照 max_length 切分文本"""
     segments = []
@@ -149,62 +276,53 @@ def split_by_length(text: str, max_length: int = 500):
         start_idx = end_idx
     return segments
 
-def split_text_for_vectorstore(chapter_text: str, max_length: int = 500, similarity_threshold: float = 0.7):
+def split_spans_for_vectorstore(chapter_text: str, max_length: int = 500, overlap: int = 0):
     """
-    对新的章节文本进行分段后用于存入向量库。
+    对章节文本分句并按长度打包，返回带原文字符偏移的片段（TextSpan 列表）。
     """
     if not chapter_text.strip():
         return []
+    return chunk_text(chapter_text, max_length=max_length, overlap=overlap)
 
-    sentences = []
-    try:
-        sentences = nltk.sent_tokenize(chapter_text)
-    except LookupError:
-        logging.warning("NLTK punkt 不可用，使用轻量级分句回退策略。")
-    except Exception as e:
-        # punkt 资源损坏时可能抛出 BadZipFile（File is not a zip file）。
-        logging.warning("NLTK 分句失败（%s），使用轻量级分句回退策略。", e)
-    if not sentences:
-        rough_sentences = re.split(r"(?<=[。！？.!?])\s+", chapter_text)
-        sentences = [line.strip() for line in rough_sentences if line.strip()]
-    if not sentences:
-        sentences = split_by_length(chapter_text, max_length=max_length)
-    if not sentences:
-        return []
-    
-    # 直接按长度分段,不做相似度合并
-    final_segments = []
-    current_segment = []
-    current_length = 0
-    
-    for sentence in sentences:
-        sentence_length = len(sentence)
-        if current_length + sentence_length > max_length:
-            if current_segment:
-                final_segments.append(" ".join(current_segment))
-            current_segment = [sentence]
-            current_length = sentence_length
-        else:
-            current_segment.append(sentence)
-            current_length += sentence_length
-    
-    if current_segment:
-        final_segments.append(" ".join(current_segment))
-    
-    return [segment for segment in final_segments if segment.strip()]
+
+def split_text_for_vectorstore(chapter_text: str, max_length: int = 500, similarity_threshold: float = 0.7, overlap: int = 0):
+    """
+    对新的章节文本进行分段后用于存入向量库。
+    """
+    return [span.text for span in split_spans_for_vectorstore(chapter_text, max_length, overlap)]
+
+
+def build_span_documents(spans, base_metadata: dict) -> list:
+    """将切分片段转为 Document，元数据中记录片段在原文中的起止偏移。"""
+    from langchain.docstore.document import Document
+
+    return [
+        Document(
+            page_content=span.text,
+            metadata={**base_metadata, "start_offset": span.start, "end_offset": span.end},
+        )
+        for span in spans
+    ]
 
 
 def _calculate_text_hash(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
-def update_vector_store(embedding_adapter, new_chapter: str, filepath: str, chapter_number: int = None):
+def update_vector_store(
+    embedding_adapter,
+    new_chapter: str,
+    filepath: str,
+    chapter_number: int = None,
+    chunk_overlap: int = 0,
+):
     """
     将最新章节文本插入到向量库中。
     若库不存在则初始化；若初始化/更新失败，则跳过。
     如果提供 chapter_number，会先删除该章节的旧文档再添加新文档（支持重新定稿）。
+    每个片段的元数据记录 start_offset/end_offset，便于将检索命中映射回章节原文位置。
     """
-    splitted_texts = split_text_for_vectorstore(new_chapter)
+    splitted_texts = split_spans_for_vectorstore(new_chapter, overlap=chunk_overlap)
     if not splitted_texts:
         logging.warning("No valid text to insert into vector store. Skipping.")
         return {"updated": False, "reason": "empty_text", "segments": 0}
@@ -213,19 +331,23 @@ def update_vector_store(embedding_adapter, new_chapter: str, filepath: str, chap
     metadata = {"chapter_hash": chapter_hash}
     if chapter_number is not None:
         metadata["chapter"] = chapter_number
+    else:
+        metadata["source"] = UNSCOPED_SOURCE
 
     store = load_vector_store(embedding_adapter, filepath)
     if not store:
         logging.info("Vector store does not exist or failed to load. Initializing a new one for new chapter...")
-        docs = [Document(page_content=str(t), metadata=metadata) for t in splitted_texts]
+        docs = build_span_documents(splitted_texts, metadata)
         store = init_vector_store_from_docs(embedding_adapter, docs, filepath)
         if not store:
             logging.warning("Init vector store failed, skip embedding.")
             return {"updated": False, "reason": "init_failed", "segments": len(splitted_texts)}
         else:
+            ensure_unscoped_sources(store, filepath)
             logging.info("New vector store created successfully.")
             return {"updated": True, "reason": "initialized", "segments": len(splitted_texts)}
 
+    ensure_unscoped_sources(store, filepath)
     try:
         # 如果提供了章节号，先删除该章节的旧文档
         if chapter_number is not None:
@@ -250,12 +372,13 @@ def update_vector_store(embedding_adapter, new_chapter: str, filepath: str, chap
                         )
                         return {"updated": False, "reason": "unchanged", "segments": len(splitted_texts)}
                     collection.delete(ids=existing_ids)
+                    remove_documents_lexically(filepath, existing_ids)
                     logging.info(f"Deleted {len(existing_ids)} old documents for chapter {chapter_number}.")
             except Exception as e:
                 logging.warning(f"Failed to delete old chapter documents: {e}")
 
-        docs = [Document(page_content=str(t), metadata=metadata) for t in splitted_texts]
-        store.add_documents(docs)
+        docs = build_span_documents(splitted_texts, metadata)
+        add_documents_to_store(store, docs, filepath)
         logging.info("Vector store updated with the new chapter splitted segments.")
         return {"updated": True, "reason": "updated", "segments": len(splitted_texts)}
     except Exception as e:
@@ -263,25 +386,154 @@ def update_vector_store(embedding_adapter, new_chapter: str, filepath: str, chap
         traceback.print_exc()
         return {"updated": False, "reason": "update_failed", "segments": len(splitted_texts)}
 
-def get_relevant_context_from_vector_store(embedding_adapter, query: str, filepath: str, k: int = 2) -> str:
+def build_chapter_filter(chapters) -> Optional[dict]:
+    """
+    Chroma where 条件：只检索给定章节的正文片段，以及知识库与其他不属于章节的文档；chapters 为 None 时不过滤。
+    旧文档需先经 backfill_unscoped_sources 补记 source 才能被保留（未补记时检索不使用该过滤）。
+    """
+    if chapters is None:
+        return None
+    kept_sources = {"source": {"$in": [KNOWLEDGE_SOURCE, UNSCOPED_SOURCE]}}
+    if not chapters:
+        return kept_sources
+    return {"$or": [{"chapter": {"$in": [int(number) for number in chapters]}}, kept_sources]}
+
+
+def scope_backfill_done(filepath: str) -> bool:
+    """旧文档是否已补记 source（补记前按章节过滤会漏掉没有元数据的旧文档）。"""
+    return os.path.exists(os.path.join(get_vectorstore_dir(filepath), SCOPE_BACKFILL_MARKER_FILE))
+
+
+def _scope_backfill_lock(filepath: str) -> threading.Lock:
+    key = os.path.abspath(get_vectorstore_dir(filepath))
+    with _scope_backfill_locks_guard:
+        lock = _scope_backfill_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _scope_backfill_locks[key] = lock
+        return lock
+
+
+def backfill_unscoped_sources(collection, filepath: str) -> int:
+    """
+    为既无 chapter 也无 source 元数据的旧文档补记 source=UNSCOPED_SOURCE（Chroma 的 where 无法匹配缺失的键），
+    使按章节过滤的检索仍保留它们。完成后写入标记文件，每个向量库只扫描一次；返回补记的文档数。
+    只在写入路径（定稿、知识库导入、重建索引）调用，检索保持只读；同一向量库的补记串行执行。
+    """
+    if scope_backfill_done(filepath):
+        return 0
+    with _scope_backfill_lock(filepath):
+        if scope_backfill_done(filepath):
+            return 0
+        tagged = 0
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=SCOPE_BACKFILL_PAGE_SIZE, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            metadatas = page.get("metadatas") or [None] * len(ids)
+            pending = [
+                (doc_id, {**(metadata or {}), "source": UNSCOPED_SOURCE})
+                for doc_id, metadata in zip(ids, metadatas)
+                if "chapter" not in (metadata or {}) and "source" not in (metadata or {})
+            ]
+            if pending:
+                collection.update(ids=[doc_id for doc_id, _ in pending], metadatas=[meta for _, meta in pending])
+                tagged += len(pending)
+            offset += len(ids)
+        marker_path = os.path.join(get_vectorstore_dir(filepath), SCOPE_BACKFILL_MARKER_FILE)
+        with open(marker_path, "w", encoding="utf-8") as handle:
+            json.dump({"tagged": tagged}, handle)
+    if tagged:
+        logging.info(f"Tagged {tagged} legacy documents without chapter metadata as {UNSCOPED_SOURCE}.")
+    return tagged
+
+
+def ensure_unscoped_sources(store, filepath: str) -> None:
+    """写入路径上补记旧文档的 source，失败时仅记录日志（检索回退为不按章节过滤）。"""
+    try:
+        backfill_unscoped_sources(store._collection, filepath)
+    except Exception as e:
+        logging.warning(f"Failed to backfill unscoped document sources: {e}")
+
+
+def _hybrid_search(store, query: str, filepath: str, k: int, chapters=None) -> list:
+    """
+    向量检索与 BM25 词法检索各取候选，使用 RRF 融合后返回前 k 条文本。
+    chapters 指定时两路检索都只保留这些章节的片段与知识库文档。
+    """
+    collection = store._collection
+    candidate_k = max(k, k * HYBRID_CANDIDATE_MULTIPLIER)
+    collection_size = collection.count()
+    if collection_size == 0:
+        return []
+
+    query_embedding = store.embeddings.embed_query(query)
+    vector_result = collection.query(
+        query_embeddings=[query_embedding],
+        n_results=min(candidate_k, collection_size),
+        where=build_chapter_filter(chapters),
+        include=["documents"],
+    )
+    vector_ids = (vector_result.get("ids") or [[]])[0]
+    texts = dict(zip(vector_ids, (vector_result.get("documents") or [[]])[0]))
+
+    lexical_index = LexicalIndex(get_vectorstore_dir(filepath))
+    if not lexical_index.is_backfilled():
+        # 旧向量库：定稿/导入只会写入新片段，以补建标记而非“索引为空”判断是否已补建
+        if lexical_index.count() < collection_size:
+            backfill_lexical_index(lexical_index, collection)
+        else:
+            lexical_index.mark_backfilled()
+    lexical_ids = [doc_id for doc_id, _ in lexical_index.search(query, candidate_k, chapters=chapters)]
+
+    fused_ids = reciprocal_rank_fusion([vector_ids, lexical_ids])[:k]
+    missing_ids = [doc_id for doc_id in fused_ids if doc_id not in texts]
+    if missing_ids:
+        fetched = collection.get(ids=missing_ids, include=["documents"])
+        texts.update(zip(fetched.get("ids") or [], fetched.get("documents") or []))
+    return [texts[doc_id] for doc_id in fused_ids if texts.get(doc_id)]
+
+
+def get_relevant_context_from_vector_store(
+    embedding_adapter,
+    query: str,
+    filepath: str,
+    k: int = 2,
+    retrieval_mode: str = "vector",
+    max_tokens: Optional[int] = None,
+    chapters: Optional[list] = None,
+) -> str:
     """
     从向量库中检索与 query 最相关的 k 条文本，拼接后返回。
+    retrieval_mode="hybrid" 时融合向量检索与 BM25 词法检索（利于专有名词精确命中）。
     如果向量库加载/检索失败，则返回空字符串。
-    最终只返回最多2000字符的检索片段。
+    max_tokens 为调用方按提示词预算分配的上限，超出时截断；为 None 时不截断。
+    chapters 为章节号列表时只检索这些章节的片段（知识库等不属于章节的文档不受限制），例如由实体索引给出的相关章节。
     """
     store = load_vector_store(embedding_adapter, filepath)
     if not store:
         logging.info("No vector store found or load failed. Returning empty context.")
         return ""
 
+    if chapters is not None and not scope_backfill_done(filepath):
+        # 旧文档尚未补记 source（补记只在写入路径进行）：按章节过滤会漏掉它们，退回不过滤的检索
+        logging.info("Legacy documents are not scoped yet; retrieving without the chapter filter.")
+        chapters = None
+
     try:
-        docs = store.similarity_search(query, k=k)
-        if not docs:
+        if retrieval_mode == "hybrid":
+            texts = _hybrid_search(store, query, filepath, k, chapters=chapters)
+        else:
+            where = build_chapter_filter(chapters)
+            texts = [d.page_content for d in store.similarity_search(query, k=k, filter=where)]
+        if not texts:
             logging.info(f"No relevant documents found for query '{query}'. Returning empty context.")
             return ""
-        combined = "\n".join([d.page_content for d in docs])
-        if len(combined) > 2000:
-            combined = combined[:2000]
+        combined = "\n".join(texts)
+        if max_tokens is not None:
+            combined = truncate_to_tokens(combined, max_tokens)
         return combined
     except Exception as e:
         logging.warning(f"Similarity search failed: {e}")
@@ -357,6 +357,86 @@ chunked_chapter_blueprint_prompt = """\
 仅给出最终文本，不要解释任何内容。
 """
 
+blueprint_arc_skeleton_prompt = """\
+基于以下元素：
+- 内容指导：{user_guidance}
+- 小说架构：
+{novel_architecture}
+
+需要生成总共{number_of_chapters}章的章节目录，现按以下章节范围划分为{arc_count}个段落（分卷）：
+{arc_ranges}
+
+请先为每个段落设计段落级骨架，确保段落之间首尾衔接、整体悬念曲线连贯：
+- 段落标题与阶段目标
+- 核心冲突与关键转折
+- 起始状态（承接上一段落的局面）
+- 结束状态（交给下一段落的局面与悬念）
+
+输出格式示例（段落编号与章节范围必须与上文一致）：
+第1段 - [段落标题]
+章节范围：第a章-第b章
+阶段目标：[...]
+核心冲突：[...]
+起始状态：[...]
+结束状态：[...]
+
+要求：
+- 每个段落描述控制在200字以内。
+- 在最后一个段落之前不要出现结局。
+
+仅给出最终文本，不要解释任何内容。
+"""
+
+arc_chunked_chapter_blueprint_prompt = """\
+基于以下元素：
+- 内容指导：{user_guidance}
+- 小说架构：
+{novel_architecture}
+
+需要生成总共{number_of_chapters}章的节奏分布，当前负责第{arc_start}章到第{arc_end}章所在的段落。
+
+上一段落骨架（本段需承接其结束状态，若为空说明本段为开篇）：
+{previous_arc_outline}
+
+本段落骨架：
+{arc_outline}
+
+下一段落骨架（本段结尾需自然过渡到其起始状态，若为空说明本段为终章段落）：
+{next_arc_outline}
+
+本段落已有章节目录（若为空则说明是本段初始生成）：\n
+{chapter_list}
+
+现在请设计第{n}章到第{m}的节奏分布：
+1. 章节集群划分：
+- 每3-5章构成一个悬念单元，包含完整的小高潮
+- 单元之间设置"认知过山车"（连续2章紧张→1章缓冲）
+- 关键转折章需预留多视角铺垫
+
+2. 每章需明确：
+- 章节定位（角色/事件/主题等）
+- 核心悬念类型（信息差/道德困境/时间压力等）
+- 情感基调迁移（如从怀疑→恐惧→决绝）
+- 伏笔操作（埋设/强化/回收）
+- 认知颠覆强度（1-5级）
+
+输出格式示例：
+第n章 - [标题]
+本章定位：[角色/事件/主题/...]
+核心作用：[推进/转折/揭示/...]
+悬念密度：[紧凑/渐进/爆发/...]
+伏笔操作：埋设(A线索)→强化(B矛盾)...
+认知颠覆：★☆☆☆☆
+本章简述：[一句话概括]
+
+要求：
+- 使用精炼语言描述，每章字数控制在100字以内。
+- 严格围绕本段落骨架展开，不要提前写出下一段落的核心事件。
+- 在生成{number_of_chapters}章前不要出现结局章节。
+
+仅给出最终文本，不要解释任何内容。
+"""
+
 # =============== 6. 前文摘要更新 ===================
 summary_prompt = """\
 以下是新完成的章节文本：
@@ -375,6 +455,51 @@ summary_prompt = """\
 仅返回前文摘要文本，不要解释任何内容。
 """
 
+# 6.1 分层摘要：单章摘要（输入只含本章与上一章摘要，与全书长度无关）
+chapter_summary_prompt = """以下是第{novel_number}章的正文：
+{chapter_text}
+
+上一章摘要（可为空，仅用于衔接，不要重复其内容）：
+{previous_summary}
+
+请为本章写一段摘要。
+要求：
+- 概括本章发生的关键事件、人物行动与状态变化、新出现或推进的伏笔
+- 客观描绘，不展开联想或解释
+- 总字数控制在300字以内
+
+仅返回本章摘要文本，不要解释任何内容。
+"""
+
+# 6.2 分层摘要：分卷汇总（每 N 章一次）
+arc_summary_prompt = """以下是第{arc_start}章到第{arc_end}章的逐章摘要：
+{chapter_summaries}
+
+请将其汇总为这一卷的剧情概要。
+要求：
+- 按时间顺序串联主线事件与关键转折，保留仍未解决的冲突与伏笔
+- 省略不影响后续剧情的细节
+- 总字数控制在600字以内
+
+仅返回分卷概要文本，不要解释任何内容。
+"""
+
+# 6.3 分层摘要：全书梗概（篇幅有上限，每次分卷汇总后增量修订）
+synopsis_update_prompt = """这是当前的全书梗概（可为空）：
+{synopsis}
+
+以下是第{arc_start}章到第{arc_end}章的分卷概要（新完成或被修订的部分）：
+{arc_summary}
+
+请将该分卷概要融入全书梗概。
+要求：
+- 保留全书主线、核心人物关系与未解决的冲突，压缩已经收束的早期细节
+- 以简洁、连贯的语言描述全书进展
+- 总字数控制在1500字以内
+
+仅返回全书梗概文本，不要解释任何内容。
+"""
+
 # =============== 7. 角色状态更新 ===================
 create_character_state_prompt = """\
 依据当前角色动力学设定：{character_dynamics}
@@ -487,6 +612,39 @@ update_character_state_prompt = """\
 仅返回更新后的角色状态文本，不要解释任何内容。
 """
 
+# 7.1 角色状态增量更新：只返回本章出场角色的变化字段，由程序合并进结构化角色状态
+character_state_delta_prompt = """以下是新完成的第{novel_number}章文本：
+{chapter_text}
+
+本章出场的已有角色的当前状态：
+{involved_state}
+
+其他已登记的角色（仅名单）：
+{other_characters}
+
+请只列出本章导致的角色状态变化，以 JSON 返回，格式：
+{{
+  "characters": {{
+    "角色名": {{
+      "物品": {{"寒铁长剑": "剑身在本章断裂", "青衫": null}},
+      "能力": {{"技能名": "描述"}},
+      "状态": {{"身体状态": "描述", "心理状态": "描述"}},
+      "主要角色间关系网": {{"李四": "描述"}},
+      "触发或加深的事件": {{"事件名": "描述"}}
+    }}
+  }},
+  "minor_characters": {{"新出场的次要人物": "简要描述", "已淡出的次要人物": null}}
+}}
+
+要求：
+- 只包含本章有变化的角色与字段，未变化的角色和字段不要输出
+- 值为新的完整描述；值为 null 表示删除该条目
+- 首次出场的主要角色按同样结构给出其全部已知状态
+- 不要删除或改名已有角色
+
+仅返回 JSON，不要解释任何内容。
+"""
+
 # =============== 8. 章节正文写作 ===================
 
 # 8.1 第一章草稿提示
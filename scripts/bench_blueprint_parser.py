@@ -0,0 +1,118 @@
+# scripts/bench_blueprint_parser.py
+# -*- coding: utf-8 -*-
+"""
+章节目录解析基准：生成合成的长篇目录（默认 5000 章），测量单遍解析（整段文本与按块流式读取）、
+结构化索引的冷/热加载，以及按偏移随机读取单章的耗时。
+
+用法：
+    python scripts/bench_blueprint_parser.py --chapters 5000 --reads 1000 --repeat 5
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chapter_directory_parser  # noqa: E402
+from chapter_directory_parser import (  # noqa: E402
+    BLUEPRINT_FILE,
+    iter_chapter_blueprint,
+    load_blueprint_index,
+    read_chapter_blueprint_text,
+)
+
+HEADER_STYLES = ["第{n}章 - {title}", "第{n}章 - [{title}]", "第{n}章 – {title}", "第{n}章—{title}"]
+
+
+def build_blueprint(chapters: int, seed: int) -> str:
+    """合成目录：混用标题分隔符、中英文冒号与方括号，并夹杂无法识别的行。"""
+    rng = random.Random(seed)
+    blocks = []
+    for n in range(1, chapters + 1):
+        title = f"第{n}个转折·{'风雪山林城海'[n % 6]}之夜"
+        colon = "：" if rng.random() < 0.8 else ":"
+        lines = [
+            rng.choice(HEADER_STYLES).format(n=n, title=title),
+            f"本章定位{colon}[角色/事件/主题]",
+            f"核心作用{colon}推进主线并埋下第{n + 3}章的伏笔",
+            f"悬念密度{colon}{rng.choice(['紧凑', '渐进', '爆发'])}",
+            f"伏笔操作{colon}埋设(A线索)→强化(B矛盾)",
+            f"认知颠覆{colon}{'★' * rng.randint(1, 5)}",
+            f"本章简述{colon}{'主角在旅途中遭遇新的考验，' * rng.randint(2, 6)}",
+        ]
+        if rng.random() < 0.1:
+            lines.insert(3, "（备注：此行不是字段）")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def _time(func, repeat: int) -> float:
+    """返回 repeat 次中的最短耗时（毫秒）。"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1000, 2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", type=int, default=5000)
+    parser.add_argument("--reads", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    text = build_blueprint(args.chapters, args.seed)
+    data = text.encode("utf-8")
+    print(f"chapters={args.chapters} size={len(data) / 1024 / 1024:.2f}MB")
+
+    parsed = sum(1 for _ in iter_chapter_blueprint(text, with_offsets=False))
+    assert parsed == args.chapters, f"parsed {parsed} chapters, expected {args.chapters}"
+
+    with tempfile.TemporaryDirectory() as project_dir:
+        path = os.path.join(project_dir, BLUEPRINT_FILE)
+        with open(path, "wb") as f:
+            f.write(data)
+
+        def stream_file():
+            with open(path, "rb") as f:
+                for _ in iter_chapter_blueprint(f):
+                    pass
+
+        def cold_index():
+            chapter_directory_parser._index_cache.clear()
+            index_path = os.path.join(project_dir, chapter_directory_parser.BLUEPRINT_INDEX_FILE)
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            load_blueprint_index(project_dir)
+
+        def disk_index():
+            chapter_directory_parser._index_cache.clear()
+            load_blueprint_index(project_dir)
+
+        rng = random.Random(args.seed)
+        targets = [rng.randint(1, args.chapters) for _ in range(args.reads)]
+
+        def random_reads():
+            for number in targets:
+                read_chapter_blueprint_text(project_dir, number)
+
+        report = {
+            "parse_text_ms": _time(lambda: list(iter_chapter_blueprint(text, with_offsets=False)), args.repeat),
+            "parse_stream_ms": _time(stream_file, args.repeat),
+            "index_cold_ms": _time(cold_index, args.repeat),
+            "index_from_disk_ms": _time(disk_index, args.repeat),
+            "index_cached_ms": _time(lambda: load_blueprint_index(project_dir), args.repeat),
+            f"random_reads_x{args.reads}_ms": _time(random_reads, args.repeat),
+        }
+    for key, value in report.items():
+        print(f"{key:<28} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# scripts/bench_llm_adapter.py
+# -*- coding: utf-8 -*-
+"""
+LLM 适配器基准：
+1. 冷启动导入耗时：每个模块在独立子进程中导入，取多次中的最短值；
+2. 单次调用的本地开销：以 httpx.MockTransport 代替网络，测量 OpenAIAdapter 的 invoke/stream/ainvoke，
+   安装了 langchain_openai 时同时测量 ChatOpenAI.invoke 作为对照（即改为原生客户端之前的调用路径）。
+
+用法：
+    python scripts/bench_llm_adapter.py --imports 5 --calls 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+
+import llm_adapters  # noqa: E402
+
+BASE_URL = "http://bench.invalid/v1"
+IMPORT_TARGETS = [
+    "llm_adapters",
+    "novel_generator.vectorstore_utils",
+    "novel_generator",
+    "langchain_openai",
+    "langchain_chroma",
+]
+_COMPLETION = {
+    "id": "bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "bench-model",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "你好"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+def _sse_body() -> bytes:
+    events = []
+    for text in ("你", "好"):
+        chunk = {
+            "id": "bench",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "bench-model",
+            "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}],
+        }
+        events.append(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+    events.append("data: [DONE]\n\n")
+    return "".join(events).encode("utf-8")
+
+
+def _handler(request: httpx.Request) -> httpx.Response:
+    if json.loads(request.content).get("stream"):
+        return httpx.Response(200, content=_sse_body(), headers={"content-type": "text/event-stream"})
+    return httpx.Response(200, json=_COMPLETION)
+
+
+def measure_import(module: str, runs: int):
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            return None
+        elapsed = float(proc.stdout.strip().splitlines()[-1])
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 1)
+
+
+def _per_call_us(func, calls: int) -> float:
+    func()  # 预热：建立客户端与连接
+    started = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return round((time.perf_counter() - started) / calls * 1e6, 1)
+
+
+async def _async_per_call_us(adapter, calls: int) -> float:
+    # AsyncOpenAI 按事件循环创建，这里替换其底层 httpx 客户端为 mock 传输
+    adapter._get_async_client()._client = httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+    await adapter.ainvoke("ping")
+    started = time.perf_counter()
+    for _ in range(calls):
+        await adapter.ainvoke("ping")
+    return round((time.perf_counter() - started) / calls * 1e6, 1)
+
+
+def measure_calls(calls: int) -> dict:
+    llm_adapters._http_clients[BASE_URL] = httpx.Client(transport=httpx.MockTransport(_handler))
+    adapter = llm_adapters.create_llm_adapter("openai", BASE_URL, "bench-model", "key", 0.7, 256, 60)
+    report = {
+        "create_llm_adapter (cached)": _per_call_us(
+            lambda: llm_adapters.create_llm_adapter("openai", BASE_URL, "bench-model", "key", 0.7, 256, 60), calls
+        ),
+        "OpenAIAdapter.invoke": _per_call_us(lambda: adapter.invoke("ping"), calls),
+        "OpenAIAdapter.stream": _per_call_us(lambda: "".join(adapter.stream("ping")), calls),
+        "OpenAIAdapter.ainvoke": asyncio.run(_async_per_call_us(adapter, calls)),
+    }
+    try:
+        from langchain_openai import ChatOpenAI
+    except ImportError:
+        return report
+    chat = ChatOpenAI(
+        model="bench-model",
+        api_key="key",
+        base_url=BASE_URL,
+        max_tokens=256,
+        temperature=0.7,
+        http_client=httpx.Client(transport=httpx.MockTransport(_handler)),
+    )
+    report["ChatOpenAI.invoke (baseline)"] = _per_call_us(lambda: chat.invoke("ping").content, calls)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--imports", type=int, default=5, help="每个模块的导入测量次数")
+    parser.add_argument("--calls", type=int, default=500, help="每种调用的测量次数")
+    args = parser.parse_args()
+
+    print("cold import (ms, best of %d):" % args.imports)
+    for module in IMPORT_TARGETS:
+        elapsed = measure_import(module, args.imports)
+        print(f"  {module:<40} {'not installed' if elapsed is None else elapsed}")
+
+    print("per-call overhead with mocked transport (us):")
+    for label, value in measure_calls(args.calls).items():
+        print(f"  {label:<40} {value}")
+
+
+if __name__ == "__main__":
+    main()
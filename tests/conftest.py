@@ -0,0 +1,35 @@
+# tests/conftest.py
+# -*- coding: utf-8 -*-
+import hashlib
+
+import pytest
+
+
+class FakeEmbeddingAdapter:
+    """按字符哈希累加的确定性向量，足以让含相同字词的文本彼此接近。"""
+
+    dimension = 32
+
+    def _embed(self, text: str) -> list:
+        vector = [0.0] * self.dimension
+        for char in text or " ":
+            digest = hashlib.md5(char.encode("utf-8")).digest()
+            vector[digest[0] % self.dimension] += 1.0
+        return vector
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, query):
+        return self._embed(query)
+
+
+@pytest.fixture
+def fake_embedding():
+    return FakeEmbeddingAdapter()
+
+
+@pytest.fixture
+def project_dir(tmp_path):
+    (tmp_path / "chapters").mkdir()
+    return tmp_path
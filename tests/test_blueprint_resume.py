@@ -0,0 +1,161 @@
+# tests/test_blueprint_resume.py
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import re
+
+import pytest
+
+import chapter_directory_parser
+from chapter_directory_parser import (
+    BLUEPRINT_FILE,
+    append_to_blueprint,
+    load_blueprint_index,
+    recover_blueprint_append,
+)
+from novel_generator import blueprint
+from novel_generator.token_budget import count_tokens, input_token_budget
+
+
+def _interrupt_next_append(monkeypatch, project_dir, text: str) -> None:
+    """模拟追加过程中崩溃：正文已写入，提交索引（第二次写索引）前进程退出。"""
+    original = chapter_directory_parser._write_index_file
+    calls = []
+
+    def crash_on_commit(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(chapter_directory_parser, "_write_index_file", crash_on_commit)
+    with pytest.raises(KeyboardInterrupt):
+        append_to_blueprint(str(project_dir), text)
+    monkeypatch.setattr(chapter_directory_parser, "_write_index_file", original)
+    chapter_directory_parser._index_cache.clear()
+
+
+def test_recover_truncates_an_interrupted_append(project_dir, monkeypatch):
+    append_to_blueprint(str(project_dir), "第1章 - 开端\n本章简述：少年下山")
+    _interrupt_next_append(monkeypatch, project_dir, "第2章 - 集市\n本章简述：初入集市")
+
+    assert recover_blueprint_append(str(project_dir)) is True
+    assert (project_dir / BLUEPRINT_FILE).read_text(encoding="utf-8") == "第1章 - 开端\n本章简述：少年下山"
+    assert sorted(load_blueprint_index(str(project_dir))) == [1]
+
+
+def test_recover_keeps_a_file_edited_after_the_interruption(project_dir, monkeypatch):
+    append_to_blueprint(str(project_dir), "第1章 - 开端\n本章简述：少年下山")
+    _interrupt_next_append(monkeypatch, project_dir, "第2章 - 集市\n本章简述：初入集市")
+    path = project_dir / BLUEPRINT_FILE
+    edited = path.read_text(encoding="utf-8").replace("少年下山", "少女下山")
+    path.write_text(edited, encoding="utf-8")
+
+    assert recover_blueprint_append(str(project_dir)) is False
+    assert path.read_text(encoding="utf-8") == edited
+    assert sorted(load_blueprint_index(str(project_dir))) == [1, 2]
+
+
+def _run_blueprint(project_dir, monkeypatch) -> list:
+    """生成 2 章目录，模型总是返回第 2 章；返回收到的提示词。"""
+    (project_dir / "Novel_architecture.txt").write_text("架构：修仙世界", encoding="utf-8")
+    requested = []
+
+    def fake_invoke(llm_adapter, prompt, **kwargs):
+        requested.append(prompt)
+        return "第2章 - 集市\n本章简述：初入集市"
+
+    monkeypatch.setattr(blueprint, "create_llm_adapter", lambda **kwargs: object())
+    monkeypatch.setattr(blueprint, "invoke_with_cleaning", fake_invoke)
+    blueprint.Chapter_blueprint_generate("openai", "key", "http://localhost", "model", str(project_dir), 2)
+    return requested
+
+
+@pytest.mark.parametrize(
+    "existing",
+    ["### 第1章 - 开端\n本章简述：少年下山", "**第1章 - 开端**\n本章简述：少年下山", "第1章：开端\n本章简述：少年下山"],
+)
+def test_resume_counts_non_standard_headers(project_dir, monkeypatch, existing):
+    (project_dir / BLUEPRINT_FILE).write_text(existing, encoding="utf-8")
+
+    requested = _run_blueprint(project_dir, monkeypatch)
+
+    assert len(requested) == 1
+    assert "第2章到第2" in requested[0]
+    text = (project_dir / BLUEPRINT_FILE).read_text(encoding="utf-8")
+    assert text.startswith(existing)
+    assert text.count("第1章") == 1
+    assert text.endswith("第2章 - 集市\n本章简述：初入集市")
+
+
+def test_resume_refuses_when_no_chapter_can_be_recognised(project_dir, monkeypatch):
+    (project_dir / BLUEPRINT_FILE).write_text("这里是一些随手记下的大纲想法。", encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        _run_blueprint(project_dir, monkeypatch)
+    assert (project_dir / BLUEPRINT_FILE).read_text(encoding="utf-8") == "这里是一些随手记下的大纲想法。"
+
+
+def _chapters(start: int, end: int) -> str:
+    return "\n\n".join(f"第{n}章 - 标题{n}\n本章简述：第{n}章" for n in range(start, end + 1))
+
+
+class _ArcAdapter:
+    """段落分块走 ainvoke，按提示词中的章节范围生成目录。"""
+
+    def invoke(self, prompt):
+        return ""
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(0)
+        n, m = map(int, re.search(r"现在请设计第(\d+)章到第(\d+)", prompt).groups())
+        return _chapters(n, m)
+
+
+def test_parallel_resume_drops_part_chapters_already_in_the_blueprint(project_dir):
+    # 上次并行运行：段落 2（第5-8章）只写到第6章；随后串行模式把主目录写到了第7章
+    parts_dir = project_dir / blueprint.BLUEPRINT_PARTS_DIR
+    parts_dir.mkdir()
+    arcs = [[1, 4], [5, 8], [9, 12]]
+    (parts_dir / blueprint.BLUEPRINT_ARCS_FILE).write_text(
+        json.dumps({"number_of_chapters": 12, "arcs": arcs, "outlines": ["第1段", "第2段", "第3段"]}),
+        encoding="utf-8",
+    )
+    (parts_dir / "arc_2.txt").write_text(_chapters(5, 6), encoding="utf-8")
+    existing = _chapters(1, 7)
+    (project_dir / BLUEPRINT_FILE).write_text(existing, encoding="utf-8")
+
+    blueprint._generate_blueprint_parallel(
+        _ArcAdapter(),
+        str(project_dir),
+        "架构",
+        "",
+        number_of_chapters=12,
+        chunk_size=2,
+        existing_blueprint=existing,
+        parallel_workers=2,
+        arc_chunks=2,
+    )
+
+    text = (project_dir / BLUEPRINT_FILE).read_text(encoding="utf-8")
+    assert [int(x) for x in re.findall(r"^第(\d+)章", text, re.MULTILINE)] == list(range(1, 13))
+    assert sorted(load_blueprint_index(str(project_dir))) == list(range(1, 13))
+
+
+def test_arc_skeleton_prompt_fits_the_context_window(project_dir, monkeypatch):
+    requested = []
+
+    def fake_invoke(llm_adapter, prompt, **kwargs):
+        requested.append(prompt)
+        return "第1段\n开端\n\n第2段\n高潮"
+
+    monkeypatch.setattr(blueprint, "invoke_with_cleaning", fake_invoke)
+    architecture = "世界观设定：灵气复苏的修仙世界。" * 2000
+
+    outlines = blueprint._create_arc_skeleton(
+        object(), str(project_dir), architecture, "", 40, [(1, 20), (21, 40)], context_window=4096, max_tokens=1024
+    )
+
+    assert outlines[1].startswith("第2段")
+    assert "第2段：第21章-第40章" in requested[0]
+    assert count_tokens(requested[0]) <= input_token_budget(4096, 1024)
@@ -0,0 +1,116 @@
+# tests/test_chapter_directory_parser.py
+# -*- coding: utf-8 -*-
+import io
+
+import pytest
+
+import chapter_directory_parser
+from chapter_directory_parser import (
+    BLUEPRINT_FILE,
+    _decode_value,
+    iter_chapter_blueprint,
+    iter_lenient_headers,
+    load_blueprint_index,
+    max_chapter_number_lenient,
+    parse_chapter_blueprint,
+    read_chapter_blueprint_text,
+)
+
+SAMPLE = (
+    "前言：这一行不属于任何章节\n"
+    "第1章 - [紫极光下的预兆]\n"
+    "本章定位：[角色/事件/主题]\n"
+    "核心作用:推进主线\n"
+    "本章简述：少年下山\n"
+    "第2章 – 集市\n"
+    "无法识别的行\n"
+    "悬念密度 : 紧凑\n"
+    "　第3章—夜袭\r\n"
+    "本章简述：[夜袭]\r\n"
+)
+
+
+def test_fields_accept_both_colons_and_all_dash_separators():
+    chapters = parse_chapter_blueprint(SAMPLE)
+
+    assert [c["chapter_number"] for c in chapters] == [1, 2, 3]
+    assert chapters[0]["chapter_title"] == "紫极光下的预兆"
+    assert chapters[0]["chapter_role"] == "角色/事件/主题"
+    assert chapters[0]["chapter_purpose"] == "推进主线"
+    assert chapters[0]["chapter_summary"] == "少年下山"
+    assert chapters[1]["chapter_title"] == "集市"
+    assert chapters[1]["suspense_level"] == "紧凑"
+    assert chapters[2]["chapter_title"] == "夜袭"
+    assert chapters[2]["chapter_summary"] == "夜袭"
+
+
+def test_offsets_slice_each_chapter_out_of_the_utf8_source():
+    data = SAMPLE.encode("utf-8")
+    chapters = list(iter_chapter_blueprint(data))
+
+    first = data[chapters[0]["byte_start"]:chapters[0]["byte_end"]].decode("utf-8")
+    assert first.startswith("第1章") and first.endswith("本章简述：少年下山")
+    second = data[chapters[1]["byte_start"]:chapters[1]["byte_end"]].decode("utf-8")
+    assert second.startswith("第2章") and second.endswith("悬念密度 : 紧凑")
+
+
+@pytest.mark.parametrize("block_size", [7, 16, 64])
+def test_headers_split_across_stream_blocks_match_whole_text(monkeypatch, block_size):
+    monkeypatch.setattr(chapter_directory_parser, "_STREAM_BLOCK_SIZE", block_size)
+
+    streamed = list(iter_chapter_blueprint(io.BytesIO(SAMPLE.encode("utf-8"))))
+
+    assert streamed == list(iter_chapter_blueprint(SAMPLE))
+
+
+def test_headers_inside_a_line_are_not_chapters():
+    text = "第1章 - 开端\n本章简述：提到第2章 - 不是标题\n第2章 - 集市"
+
+    assert [c["chapter_number"] for c in iter_chapter_blueprint(text)] == [1, 2]
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [
+        ("[标题]", "标题"),
+        ("  [标题]  ", "标题"),
+        ("[标题", "标题"),
+        ("标题]", "标题"),
+        ("甲与[乙]", "甲与[乙]"),
+        ("标题", "标题"),
+        ("", ""),
+    ],
+)
+def test_decode_value_strips_wrapping_brackets_only(raw, expected):
+    assert _decode_value(raw.encode("utf-8")) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("### 第3章 - A\n**第7章 - B**\n> 第5章：C", 7),
+        ("- 第2章 D\n第4章:E", 4),
+        ("第12章节奏分析", 0),
+        ("", 0),
+    ],
+)
+def test_lenient_header_scan(text, expected):
+    assert max_chapter_number_lenient(text) == expected
+
+
+def test_lenient_headers_report_byte_offsets():
+    data = "前言\n### 第3章 - 甲\n正文\n第4章：乙".encode("utf-8")
+
+    headers = list(iter_lenient_headers(data))
+
+    assert [number for number, _ in headers] == [3, 4]
+    assert data[headers[1][1]:].decode("utf-8") == "第4章：乙"
+
+
+def test_index_reads_chapters_by_offset(project_dir):
+    (project_dir / BLUEPRINT_FILE).write_text(SAMPLE, encoding="utf-8")
+
+    index = load_blueprint_index(str(project_dir))
+
+    assert sorted(index) == [1, 2, 3]
+    assert read_chapter_blueprint_text(str(project_dir), 2) == "第2章 – 集市\n无法识别的行\n悬念密度 : 紧凑"
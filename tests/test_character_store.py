@@ -0,0 +1,108 @@
+# tests/test_character_store.py
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from novel_generator.character_store import (
+    CHARACTER_STATE_FILE,
+    CHARACTER_STORE_FILE,
+    apply_character_delta,
+    load_character_store,
+    parse_character_delta,
+    parse_character_state_text,
+    render_character_state,
+    save_character_store,
+    update_character_store,
+)
+
+STATE_TEXT = """林风：
+├──物品
+│  ├──青锋剑：师父所赠
+│  └──玉佩：来历不明
+├──能力
+│  └──御剑术：初成
+沉默寡言
+
+苏瑶：
+├──关系
+│  └──林风：同门
+
+新出场角色：
+- 老乞丐：集市上的神秘人"""
+
+
+def test_tree_text_round_trips_through_the_store():
+    store = parse_character_state_text(STATE_TEXT)
+
+    assert store["characters"]["林风"]["sections"]["物品"] == {"青锋剑": "师父所赠", "玉佩": "来历不明"}
+    assert store["characters"]["林风"]["notes"] == ["沉默寡言"]
+    assert store["minor_characters"] == {"老乞丐": "集市上的神秘人"}
+    assert render_character_state(store) == STATE_TEXT
+    assert render_character_state(store, ["苏瑶"]) == "苏瑶：\n├──关系\n│  └──林风：同门"
+
+
+def test_delta_updates_deletes_and_promotes():
+    store = parse_character_state_text(STATE_TEXT)
+    delta = parse_character_delta(
+        '好的：{"characters": {"林风": {"物品": {"玉佩": null, "丹药": "三枚"}, "能力": {"御剑术": null}}, '
+        '"老乞丐": {"身份": {"真实身份": "隐世高人"}}}, "minor_characters": {"老乞丐": "重复", "小二": "客栈伙计"}}'
+    )
+
+    changed = apply_character_delta(store, delta, novel_number=3)
+
+    assert changed == ["林风", "老乞丐"]
+    assert store["characters"]["林风"]["sections"]["物品"] == {"青锋剑": "师父所赠", "丹药": "三枚"}
+    assert "能力" not in store["characters"]["林风"]["sections"]
+    assert store["characters"]["林风"]["updated_chapter"] == 3
+    assert store["minor_characters"]["小二"] == "客栈伙计"
+    assert store["minor_characters"]["老乞丐"] == "集市上的神秘人"
+
+
+@pytest.mark.parametrize("response", ["没有 JSON", "{不是json}", "[1, 2]"])
+def test_invalid_delta_raises_value_error(response):
+    with pytest.raises(ValueError):
+        parse_character_delta(response)
+
+
+def test_manual_edit_of_the_text_wins_over_the_saved_store(project_dir):
+    store = parse_character_state_text(STATE_TEXT)
+    rendered = save_character_store(str(project_dir), store)
+    (project_dir / CHARACTER_STATE_FILE).write_text(rendered, encoding="utf-8")
+    assert "林风" in load_character_store(str(project_dir))["characters"]
+
+    (project_dir / CHARACTER_STATE_FILE).write_text("张三：\n├──状态\n│  └──伤势：轻伤", encoding="utf-8")
+
+    assert list(load_character_store(str(project_dir))["characters"]) == ["张三"]
+
+
+def test_update_requests_only_involved_characters(project_dir):
+    (project_dir / CHARACTER_STATE_FILE).write_text(STATE_TEXT, encoding="utf-8")
+    prompts = []
+
+    def invoke(prompt):
+        prompts.append(prompt)
+        return '{"characters": {"林风": {"状态": {"心境": "动摇"}}}}'
+
+    rendered = update_character_store(str(project_dir), 2, "林风独自下山。", invoke)
+
+    assert len(prompts) == 1
+    assert "青锋剑" in prompts[0] and "同门" not in prompts[0]
+    assert "│  └──心境：动摇" in rendered
+    saved = json.loads((project_dir / CHARACTER_STORE_FILE).read_text(encoding="utf-8"))
+    assert saved["characters"]["林风"]["sections"]["状态"] == {"心境": "动摇"}
+
+
+def test_unstructured_state_is_rewritten_once(project_dir):
+    (project_dir / CHARACTER_STATE_FILE).write_text("一段没有结构的角色描述", encoding="utf-8")
+    prompts = []
+
+    def invoke(prompt):
+        prompts.append(prompt)
+        return "林风：\n├──状态\n│  └──伤势：痊愈"
+
+    rendered = update_character_store(str(project_dir), 2, "林风痊愈。", invoke)
+
+    assert len(prompts) == 1
+    assert rendered == "林风：\n├──状态\n│  └──伤势：痊愈"
+    assert (project_dir / CHARACTER_STORE_FILE).exists()
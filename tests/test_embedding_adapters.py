@@ -0,0 +1,99 @@
+# tests/test_embedding_adapters.py
+# -*- coding: utf-8 -*-
+import requests
+
+from embedding_adapters import (
+    EMBEDDING_POOL_MAX_FAILURES,
+    BaseEmbeddingAdapter,
+    EmbeddingAdapterPool,
+    GeminiEmbeddingAdapter,
+    SiliconFlowEmbeddingAdapter,
+)
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+def test_gemini_batch_with_missing_embeddings_returns_empty_vectors(monkeypatch):
+    monkeypatch.setattr(
+        requests.Session,
+        "post",
+        lambda self, url, **kwargs: FakeResponse({"embeddings": [{"values": [0.1, 0.2]}]}),
+    )
+    adapter = GeminiEmbeddingAdapter("key", "text-embedding-004", "https://example.invalid/v1beta/models")
+
+    assert adapter.embed_documents(["a", "b"]) == [[], []]
+
+
+def test_gemini_batch_returns_vectors_in_request_order(monkeypatch):
+    def post(self, url, json=None, **kwargs):
+        return FakeResponse({
+            "embeddings": [{"values": [float(len(item["content"]["parts"][0]["text"]))]} for item in json["requests"]]
+        })
+
+    monkeypatch.setattr(requests.Session, "post", post)
+    adapter = GeminiEmbeddingAdapter("key", "text-embedding-004", "https://example.invalid/v1beta/models")
+
+    assert adapter.embed_documents(["a", "bbb"]) == [[1.0], [3.0]]
+
+
+def test_siliconflow_batch_is_reordered_by_index(monkeypatch):
+    monkeypatch.setattr(
+        requests.Session,
+        "post",
+        lambda self, url, **kwargs: FakeResponse({
+            "data": [{"index": 1, "embedding": [2.0]}, {"index": 0, "embedding": [1.0]}]
+        }),
+    )
+    adapter = SiliconFlowEmbeddingAdapter("key", "https://example.invalid/v1/embeddings", "bge")
+
+    assert adapter.embed_documents(["a", "b"]) == [[1.0], [2.0]]
+
+
+class ClosingAdapter(BaseEmbeddingAdapter):
+    def __init__(self):
+        self.closed = False
+
+    def embed_documents(self, texts):
+        return [[] for _ in texts]
+
+    def embed_query(self, query):
+        return []
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+
+def test_pool_closes_replaced_unhealthy_adapters():
+    created = []
+    pool = EmbeddingAdapterPool(factory=lambda *args: created.append(ClosingAdapter()) or created[-1])
+    first = pool.get("openai", "key", "http://localhost", "model")
+    for _ in range(EMBEDDING_POOL_MAX_FAILURES):
+        first.embed_query("空结果算失败")
+
+    second = pool.get("openai", "key", "http://localhost", "model")
+
+    assert second is not first
+    assert created[0].closed is True
+    assert created[1].closed is False
+
+
+def test_pool_clear_closes_every_adapter():
+    created = []
+    pool = EmbeddingAdapterPool(factory=lambda *args: created.append(ClosingAdapter()) or created[-1])
+    pool.get("openai", "key", "http://localhost", "model-a")
+    pool.get("openai", "key", "http://localhost", "model-b")
+
+    pool.clear()
+
+    assert [adapter.closed for adapter in created] == [True, True]
+    assert pool.stats() == []
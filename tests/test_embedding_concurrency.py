@@ -0,0 +1,95 @@
+# tests/test_embedding_concurrency.py
+# -*- coding: utf-8 -*-
+"""
+SiliconFlow 适配器并发压测：本地 HTTP 服务按输入文本返回可校验的向量，
+多线程共享同一适配器实例，校验每条向量与输入一一对应，且连接与批次线程跨调用复用。
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from embedding_adapters import EMBEDDING_MAX_CONCURRENCY, SILICONFLOW_BATCH_SIZE, SiliconFlowEmbeddingAdapter
+
+
+def _vector_for(text: str) -> list:
+    return [float(ord(char)) for char in text[:4].ljust(4)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.connections.add(self.client_address)
+        self.server.handler_threads.add(threading.get_ident())
+        data = [
+            {"index": index, "embedding": _vector_for(text)}
+            for index, text in enumerate(body["input"])
+        ]
+        data.reverse()  # 打乱顺序，验证按 index 还原
+        payload = json.dumps({"data": data}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def embedding_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.connections = set()
+    server.handler_threads = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_shared_adapter_returns_aligned_vectors_under_parallel_load(embedding_server):
+    host, port = embedding_server.server_address
+    adapter = SiliconFlowEmbeddingAdapter("key", f"http://{host}:{port}/v1/embeddings", "bge")
+    callers = 8
+    calls_per_caller = 6
+    texts_per_call = SILICONFLOW_BATCH_SIZE * 4
+
+    def run(caller: int) -> int:
+        mismatches = 0
+        for call in range(calls_per_caller):
+            texts = [f"{chr(0x4e00 + caller)}{call:02d}{index:03d}" for index in range(texts_per_call)]
+            vectors = adapter.embed_documents(texts)
+            mismatches += sum(vector != _vector_for(text) for text, vector in zip(texts, vectors))
+            mismatches += abs(len(vectors) - len(texts))
+        return mismatches
+
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        assert sum(pool.map(run, range(callers))) == 0
+
+    # 所有多批请求都在适配器自己的长期线程池里发出，连接按 keep-alive 复用
+    assert len(embedding_server.connections) <= EMBEDDING_MAX_CONCURRENCY
+    adapter.close()
+
+
+def test_async_fan_out_uses_the_same_executor(embedding_server):
+    import asyncio
+
+    host, port = embedding_server.server_address
+    adapter = SiliconFlowEmbeddingAdapter("key", f"http://{host}:{port}/v1/embeddings", "bge")
+    texts = [f"异步{index:04d}" for index in range(SILICONFLOW_BATCH_SIZE * 3)]
+
+    vectors = asyncio.run(adapter.aembed_documents(texts))
+
+    assert vectors == [_vector_for(text) for text in texts]
+    executor = adapter._executor
+    assert executor is not None
+    assert adapter.embed_documents(texts) == vectors
+    assert adapter._executor is executor
+    adapter.close()
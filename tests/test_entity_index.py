@@ -0,0 +1,126 @@
+# tests/test_entity_index.py
+# -*- coding: utf-8 -*-
+import os
+
+from langchain.docstore.document import Document
+
+from novel_generator import entity_index
+from novel_generator.chapter import _entity_retrieval_chapters
+from novel_generator.entity_index import EntityIndex, normalize_entity_name, split_entity_field
+from novel_generator.vectorstore_utils import (
+    UNSCOPED_SOURCE,
+    get_relevant_context_from_vector_store,
+    load_vector_store,
+    scope_backfill_done,
+    update_vector_store,
+)
+
+
+def _write_chapter(project_dir, number: int, text: str) -> None:
+    (project_dir / "chapters" / f"chapter_{number}.txt").write_text(text, encoding="utf-8")
+
+
+def test_split_entity_field_drops_placeholders_and_annotations():
+    assert split_entity_field("林风（主角）、苏瑶，无；青霄剑") == ["林风", "苏瑶", "青霄剑"]
+    assert normalize_entity_name("未指定") == ""
+    assert normalize_entity_name("某") == ""
+
+
+def test_register_backfills_existing_chapters_preferring_longer_names(project_dir):
+    _write_chapter(project_dir, 1, "林风拔出青霄剑。")
+    _write_chapter(project_dir, 2, "集市上人来人往。")
+    _write_chapter(project_dir, 3, "青霄剑宗的长老现身。")
+    index = EntityIndex(str(project_dir))
+    index.register([("青霄剑宗", "location")], source="manual")
+
+    assert index.register([("青霄剑", "item"), ("林风", "character")], source="manual") == ["青霄剑", "林风"]
+
+    assert index.chapters_for(["青霄剑"]) == [1]
+    assert index.chapters_for(["青霄剑宗"]) == [3]
+    assert index.chapters_for(["林风", "青霄剑宗"], before=3) == [1]
+    occurrences = index.get_entity("林风")["occurrences"]
+    assert occurrences == [{"chapter": 1, "start_offset": 0, "end_offset": 2}]
+
+
+def test_index_chapter_replaces_previous_mentions(project_dir):
+    index = EntityIndex(str(project_dir))
+    index.register([("苏瑶", "character")], source="manual")
+
+    assert index.index_chapter(4, "苏瑶与苏瑶的影子") == 2
+    assert index.index_chapter(4, "空无一人") == 0
+    assert index.chapters_for(["苏瑶"]) == []
+
+
+def test_schema_is_created_once_per_process(project_dir, monkeypatch):
+    EntityIndex(str(project_dir))
+    calls = []
+    original_connect = EntityIndex._connect
+    monkeypatch.setattr(EntityIndex, "_connect", lambda self: calls.append(1) or original_connect(self))
+
+    EntityIndex(str(project_dir))
+    assert calls == []
+
+    os.remove(os.path.join(str(project_dir), entity_index.ENTITY_INDEX_FILE))
+    EntityIndex(str(project_dir))
+    assert calls
+
+
+def test_retrieval_scope_lookup_does_not_write_the_index(project_dir):
+    filepath = str(project_dir)
+    _write_chapter(project_dir, 1, "林风拔出青霄剑。")
+
+    assert _entity_retrieval_chapters(filepath, 10, "林风", "", "", "") is None
+    assert not os.path.exists(os.path.join(filepath, entity_index.ENTITY_INDEX_FILE))
+
+    EntityIndex(filepath).register([("林风", "character")], source="manual")
+    assert _entity_retrieval_chapters(filepath, 10, "林风、苏瑶", "", "", "") == [1]
+    assert EntityIndex(filepath).names() == ["林风"]
+
+
+def test_chapter_scoped_retrieval_keeps_legacy_documents_without_metadata(project_dir, fake_embedding):
+    filepath = str(project_dir)
+    # 旧版本导入的知识库文档没有任何元数据
+    store = load_vector_store(fake_embedding, filepath, create=True)
+    store.add_documents([Document(page_content="青霄剑宗设定：剑修门派。")], ids=["legacy"])
+    update_vector_store(fake_embedding, "青霄剑宗山门前，少年拜师。", filepath, chapter_number=1)
+    update_vector_store(fake_embedding, "集市上人来人往。", filepath, chapter_number=2)
+
+    for mode in ("vector", "hybrid"):
+        context = get_relevant_context_from_vector_store(
+            fake_embedding, "青霄剑宗", filepath, k=3, retrieval_mode=mode, chapters=[2]
+        )
+        assert "青霄剑宗设定" in context
+        assert "少年拜师" not in context
+
+    metadata = load_vector_store(fake_embedding, filepath)._collection.get(ids=["legacy"])["metadatas"][0]
+    assert metadata["source"] == UNSCOPED_SOURCE
+
+
+def test_chapter_scoped_retrieval_is_read_only_before_backfill(project_dir, fake_embedding):
+    filepath = str(project_dir)
+    store = load_vector_store(fake_embedding, filepath, create=True)
+    store.add_documents(
+        [
+            Document(page_content="青霄剑宗设定：剑修门派。"),
+            Document(page_content="青霄剑宗山门前，少年拜师。", metadata={"chapter": 1}),
+        ],
+        ids=["legacy", "chapter-1"],
+    )
+
+    context = get_relevant_context_from_vector_store(
+        fake_embedding, "青霄剑宗", filepath, k=3, retrieval_mode="hybrid", chapters=[2]
+    )
+
+    # 未补记前不按章节过滤（旧文档不会被漏掉），且检索不写入向量库
+    assert "青霄剑宗设定" in context
+    assert not scope_backfill_done(filepath)
+    assert load_vector_store(fake_embedding, filepath)._collection.get(ids=["legacy"])["metadatas"][0] is None
+
+    # 写入路径（定稿）完成补记后，章节过滤生效
+    update_vector_store(fake_embedding, "集市上人来人往。", filepath, chapter_number=2)
+    assert scope_backfill_done(filepath)
+    context = get_relevant_context_from_vector_store(
+        fake_embedding, "青霄剑宗", filepath, k=3, retrieval_mode="hybrid", chapters=[2]
+    )
+    assert "青霄剑宗设定" in context
+    assert "少年拜师" not in context
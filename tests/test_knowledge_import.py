@@ -0,0 +1,69 @@
+# tests/test_knowledge_import.py
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+import embedding_adapters
+from novel_generator import knowledge
+from novel_generator.vectorstore_utils import get_vectorstore_dir
+
+
+@pytest.fixture
+def import_file(project_dir, fake_embedding, monkeypatch):
+    monkeypatch.setattr(embedding_adapters, "get_embedding_adapter", lambda *args: fake_embedding)
+
+    def run(file_path, **kwargs):
+        return knowledge.import_knowledge_file("", "", "openai", "fake", str(file_path), str(project_dir), **kwargs)
+
+    return run
+
+
+def test_gbk_file_is_detected_and_imported(tmp_path, project_dir, import_file):
+    source = tmp_path / "设定.txt"
+    source.write_bytes("青霄剑宗位于东海之滨。门中弟子三千。".encode("gbk"))
+
+    assert knowledge.detect_knowledge_encoding(str(source)) == "gb18030"
+    assert [span.text for span in knowledge.iter_knowledge_segments(str(source))] == [
+        "青霄剑宗位于东海之滨。门中弟子三千。"
+    ]
+    result = import_file(source)
+    assert result["segments"] == 1
+
+
+def test_undecodable_file_fails_before_anything_is_written(tmp_path, project_dir, import_file):
+    source = tmp_path / "broken.txt"
+    source.write_bytes(b"abc\xff\x80\xff")
+
+    with pytest.raises(ValueError):
+        import_file(source)
+    store_dir = get_vectorstore_dir(str(project_dir))
+    leftovers = os.listdir(store_dir) if os.path.isdir(store_dir) else []
+    assert not [name for name in leftovers if name.startswith(knowledge.KNOWLEDGE_CHECKPOINT_PREFIX)]
+    assert knowledge.load_knowledge_sources(str(project_dir)) == {}
+
+
+def test_shared_passage_survives_deleting_the_other_source(tmp_path, project_dir, fake_embedding, import_file):
+    # 共有段落接近片段上限，与后续句子分属不同片段，两个来源会得到同一 content_hash
+    shared = "两派共有的典故：" + "剑冢之约" * 121 + "。"
+    first = tmp_path / "a.txt"
+    second = tmp_path / "b.txt"
+    first.write_text(shared + "甲派独有的规矩。" * 30, encoding="utf-8")
+    second.write_text(shared + "乙派独有的规矩。" * 30, encoding="utf-8")
+    assert next(knowledge.iter_knowledge_segments(str(first))).text == shared
+    source_a = import_file(first, batch_size=1)["source_id"]
+    source_b = import_file(second, batch_size=1)["source_id"]
+
+    knowledge.delete_knowledge_source(fake_embedding, str(project_dir), source_a)
+
+    store = knowledge.load_vector_store(fake_embedding, str(project_dir))
+    remaining = store._collection.get(where={"source_id": source_b}, include=["documents"])["documents"]
+    assert any("剑冢之约" in text for text in remaining)
+
+
+def test_duplicates_within_one_source_are_skipped(tmp_path, import_file):
+    source = tmp_path / "dup.txt"
+    source.write_text("同一句话。" * 200, encoding="utf-8")
+
+    result = import_file(source, batch_size=1)
+    assert result["duplicates"] > 0
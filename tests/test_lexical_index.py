@@ -0,0 +1,78 @@
+# tests/test_lexical_index.py
+# -*- coding: utf-8 -*-
+import os
+
+from langchain.docstore.document import Document
+
+from novel_generator import lexical_index
+from novel_generator.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+from novel_generator.vectorstore_utils import (
+    _hybrid_search,
+    get_vectorstore_dir,
+    load_vector_store,
+    update_vector_store,
+)
+
+
+def test_tokenize_splits_cjk_into_bigrams_and_lowercases_latin():
+    assert tokenize("青霄剑宗 Sword 7") == ["青霄", "霄剑", "剑宗", "sword", "7"]
+    assert tokenize("剑") == ["剑"]
+
+
+def test_reciprocal_rank_fusion_prefers_documents_ranked_by_both():
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])[0] == "b"
+
+
+def test_search_ranks_exact_terms_and_filters_by_chapter(tmp_path):
+    index = LexicalIndex(str(tmp_path))
+    index.add_documents(
+        ["c1", "c2", "k"],
+        ["青霄剑宗的弟子下山", "山下小镇的茶馆", "青霄剑宗设定"],
+        [{"chapter": 1}, {"chapter": 2}, {"source": "knowledge"}],
+    )
+
+    assert {doc_id for doc_id, _ in index.search("青霄剑宗", 5)} == {"c1", "k"}
+    assert [doc_id for doc_id, _ in index.search("青霄剑宗", 5, chapters=[2])] == ["k"]
+    assert [doc_id for doc_id, _ in index.search("茶馆", 5, chapters=[2])] == ["c2"]
+
+    index.delete_documents(["c1"])
+    assert [doc_id for doc_id, _ in index.search("弟子", 5)] == []
+    assert index.count() == 2
+
+
+def test_schema_is_created_once_and_recreated_after_the_file_is_removed(tmp_path, monkeypatch):
+    LexicalIndex(str(tmp_path))
+    calls = []
+    original_connect = LexicalIndex._connect
+    monkeypatch.setattr(LexicalIndex, "_connect", lambda self: calls.append(1) or original_connect(self))
+
+    LexicalIndex(str(tmp_path))
+    assert calls == []
+
+    os.remove(os.path.join(str(tmp_path), lexical_index.LEXICAL_INDEX_FILE))
+    index = LexicalIndex(str(tmp_path))
+    assert calls
+    assert index.count() == 0
+
+
+def test_legacy_store_is_backfilled_after_a_new_chapter_is_indexed(project_dir, fake_embedding):
+    filepath = str(project_dir)
+    # 旧向量库：文档直接写入 Chroma，没有词法索引
+    store = load_vector_store(fake_embedding, filepath, create=True)
+    store.add_documents(
+        [Document(page_content="少年拜入青霄剑宗，开始修行。", metadata={"chapter": 1})],
+        ids=["legacy-1"],
+    )
+    assert not os.path.exists(os.path.join(get_vectorstore_dir(filepath), lexical_index.LEXICAL_INDEX_FILE))
+
+    update_vector_store(fake_embedding, "第二章，集市上人来人往。", filepath, chapter_number=2)
+    index = LexicalIndex(get_vectorstore_dir(filepath))
+    assert index.count() == 1
+    assert not index.is_backfilled()
+
+    store = load_vector_store(fake_embedding, filepath)
+    results = _hybrid_search(store, "青霄剑宗", filepath, k=1)
+
+    assert results == ["少年拜入青霄剑宗，开始修行。"]
+    assert index.is_backfilled()
+    assert index.count() == 2
@@ -0,0 +1,96 @@
+# tests/test_llm_cache.py
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+import pytest
+
+from llm_adapters import create_llm_adapter
+from novel_generator import llm_cache
+from novel_generator.llm_cache import (
+    configure_llm_cache,
+    get_llm_cache_stats,
+    lookup_cached_response,
+    make_cache_key,
+    store_cached_response,
+)
+
+
+def _adapter(**overrides):
+    identity = {
+        "interface_format": "OpenAI",
+        "base_url": "https://api.example.com/v1",
+        "model_name": "gpt-test",
+        "temperature": 0.7,
+        "max_tokens": 1024,
+    }
+    identity.update(overrides)
+    return SimpleNamespace(**identity)
+
+
+@pytest.fixture
+def cache_settings(tmp_path):
+    settings = {"enabled": True, "purposes": ["draft", "blueprint"], "cache_dir": str(tmp_path / "cache")}
+    configure_llm_cache(settings)
+    llm_cache._metrics.clear()
+    yield settings
+    configure_llm_cache(None)
+    llm_cache._metrics.clear()
+
+
+def test_store_then_hit_and_count(cache_settings):
+    adapter = _adapter()
+
+    assert lookup_cached_response(adapter, "提示词", "draft") is None
+    store_cached_response(adapter, "提示词", "draft", "正文")
+
+    assert lookup_cached_response(adapter, "提示词", "draft") == "正文"
+    stats = get_llm_cache_stats()
+    assert stats["by_purpose"]["draft"] == {"hits": 1, "misses": 1, "stores": 1, "hit_rate": 0.5}
+    assert stats["usage"]["entries"] == 1
+
+
+@pytest.mark.parametrize(
+    "override",
+    [
+        {"interface_format": "Azure OpenAI"},
+        {"base_url": "https://proxy.example.com/v1"},
+        {"model_name": "gpt-other"},
+        {"temperature": 0.2},
+        {"max_tokens": 2048},
+    ],
+)
+def test_key_separates_providers_and_sampling_settings(cache_settings, override):
+    store_cached_response(_adapter(), "提示词", "draft", "正文")
+
+    assert make_cache_key(_adapter(**override), "提示词") != make_cache_key(_adapter(), "提示词")
+    assert lookup_cached_response(_adapter(**override), "提示词", "draft") is None
+
+
+def test_created_adapters_carry_the_provider_identity():
+    first = create_llm_adapter("OpenAI", "https://api.example.com", "gpt-test", "key", 0.7, 1024, 60)
+    second = create_llm_adapter("DeepSeek", "https://api.example.com", "gpt-test", "key", 0.7, 1024, 60)
+
+    assert first is not second
+    assert make_cache_key(first, "提示词") != make_cache_key(second, "提示词")
+
+
+def test_purpose_filter(cache_settings):
+    adapter = _adapter()
+    store_cached_response(adapter, "提示词", "keyword_search", "结果")
+
+    assert lookup_cached_response(adapter, "提示词", "keyword_search") is None
+    assert lookup_cached_response(adapter, "提示词", None) is None
+    assert get_llm_cache_stats()["usage"]["entries"] == 0
+
+
+def test_disabling_the_cache_stops_reads_and_writes(cache_settings):
+    adapter = _adapter()
+    store_cached_response(adapter, "提示词", "draft", "正文")
+
+    configure_llm_cache({**cache_settings, "enabled": False})
+    assert lookup_cached_response(adapter, "提示词", "draft") is None
+    store_cached_response(adapter, "另一个提示词", "draft", "正文")
+
+    configure_llm_cache(cache_settings)
+    assert lookup_cached_response(adapter, "提示词", "draft") == "正文"
+    assert lookup_cached_response(adapter, "另一个提示词", "draft") is None
@@ -0,0 +1,138 @@
+# tests/test_llm_invoke.py
+# -*- coding: utf-8 -*-
+import asyncio
+import re
+import threading
+
+import pytest
+
+from novel_generator import blueprint, common
+
+
+class ScriptedAdapter:
+    """按顺序返回预设结果（异常对象则抛出），同步与异步接口共用同一脚本。"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def _next(self):
+        reply = self.replies[self.calls]
+        self.calls += 1
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def invoke(self, prompt):
+        return self._next()
+
+    def stream(self, prompt):
+        yield self._next()
+
+    async def ainvoke(self, prompt):
+        return self._next()
+
+    async def astream(self, prompt):
+        yield self._next()
+
+
+def _call(mode, adapter, **kwargs):
+    if mode == "sync":
+        return common.invoke_with_cleaning(adapter, "prompt", **kwargs)
+    if mode == "sync_stream":
+        return common.invoke_with_cleaning_streaming(adapter, "prompt", **kwargs)
+    if mode == "async":
+        return asyncio.run(common.ainvoke_with_cleaning(adapter, "prompt", **kwargs))
+    return asyncio.run(common.ainvoke_with_cleaning_streaming(adapter, "prompt", **kwargs))
+
+
+MODES = ["sync", "sync_stream", "async", "async_stream"]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(common, "_retry_backoff_seconds", lambda attempt: 0)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_empty_and_retryable_errors_are_retried_then_cleaned(mode):
+    adapter = ScriptedAdapter(["```  ```", TimeoutError("request timed out"), "```正文```\n"])
+
+    assert _call(mode, adapter) == "正文"
+    assert adapter.calls == 3
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_non_retryable_error_is_raised_immediately(mode):
+    adapter = ScriptedAdapter([RuntimeError("401 invalid api key"), "正文"])
+
+    with pytest.raises(RuntimeError):
+        _call(mode, adapter)
+    assert adapter.calls == 1
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_gives_up_after_max_retries_of_empty_results(mode):
+    adapter = ScriptedAdapter(["", "", ""])
+
+    assert _call(mode, adapter, max_retries=2) == ""
+    assert adapter.calls == 2
+
+
+@pytest.mark.parametrize("mode", ["async", "async_stream"])
+def test_async_cache_io_runs_off_the_event_loop(monkeypatch, mode):
+    threads = {}
+
+    def lookup(llm_adapter, prompt, purpose):
+        threads["lookup"] = threading.get_ident()
+        return None
+
+    def store(llm_adapter, prompt, purpose, response):
+        threads["store"] = threading.get_ident()
+
+    monkeypatch.setattr(common, "lookup_cached_response", lookup)
+    monkeypatch.setattr(common, "store_cached_response", store)
+
+    assert _call(mode, ScriptedAdapter(["正文"]), cache_purpose="draft") == "正文"
+    assert threads["lookup"] != threading.get_ident()
+    assert threads["store"] != threading.get_ident()
+
+
+class ArcAdapter:
+    """骨架走同步 invoke；段落分块走 ainvoke，按提示词中的章节范围生成目录并记录并发度。"""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    def invoke(self, prompt):
+        return ""
+
+    async def ainvoke(self, prompt):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        n, m = map(int, re.search(r"现在请设计第(\d+)章到第(\d+)", prompt).groups())
+        return "\n\n".join(f"第{i}章 - 标题{i}\n本章简述：第{i}章" for i in range(n, m + 1))
+
+
+def test_parallel_blueprint_fans_arcs_out_on_one_event_loop(project_dir):
+    adapter = ArcAdapter()
+
+    blueprint._generate_blueprint_parallel(
+        adapter,
+        str(project_dir),
+        "架构",
+        "",
+        number_of_chapters=12,
+        chunk_size=2,
+        existing_blueprint="",
+        parallel_workers=2,
+        arc_chunks=2,
+    )
+
+    assert adapter.peak == 2
+    text = (project_dir / "Novel_directory.txt").read_text(encoding="utf-8")
+    assert [int(x) for x in re.findall(r"^第(\d+)章", text, re.MULTILINE)] == list(range(1, 13))
+    assert not (project_dir / blueprint.BLUEPRINT_PARTS_DIR).exists()
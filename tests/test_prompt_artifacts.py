@@ -0,0 +1,62 @@
+# tests/test_prompt_artifacts.py
+# -*- coding: utf-8 -*-
+import os
+
+os.environ.setdefault("AINOVEL_ACCESS_KEY", "test-access-key")
+
+from backend.api_server import BuildPromptRequest, DraftRequest  # noqa: E402
+from backend.services import _chapter_generation_kwargs  # noqa: E402
+from novel_generator.prompt_artifacts import (  # noqa: E402
+    compute_prompt_input_hash,
+    load_prompt_artifacts,
+    save_prompt_artifacts,
+)
+
+LLM_CONFIG = {
+    "api_key": "key",
+    "base_url": "http://localhost",
+    "model_name": "model-a",
+    "temperature": 0.7,
+    "interface_format": "openai",
+    "max_tokens": 2048,
+    "timeout": 60,
+}
+EMBEDDING_CONFIG = {
+    "api_key": "key",
+    "base_url": "http://localhost",
+    "interface_format": "local",
+    "model_name": "hash",
+    "retrieval_k": 2,
+}
+
+
+def test_build_prompt_rebuilds_by_default_while_draft_reuses():
+    build_payload = BuildPromptRequest(novel_number=1, word_number=3000).model_dump()
+    draft_payload = DraftRequest(novel_number=1, word_number=3000).model_dump()
+
+    assert build_payload["reuse_artifacts"] is False
+    assert draft_payload["reuse_artifacts"] is True
+    kwargs = _chapter_generation_kwargs("/tmp/p", {"novel_number": 1, "word_number": 3000}, LLM_CONFIG, EMBEDDING_CONFIG)
+    assert kwargs["reuse_artifacts"] is True
+    kwargs = _chapter_generation_kwargs(
+        "/tmp/p", build_payload, LLM_CONFIG, EMBEDDING_CONFIG, reuse_artifacts_default=False
+    )
+    assert kwargs["reuse_artifacts"] is False
+
+
+def test_input_hash_changes_with_llm_config_and_round_trips(tmp_path):
+    filepath = str(tmp_path)
+    params = {"novel_number": 3, "llm": {"model_name": "model-a", "temperature": 0.7}}
+    first = compute_prompt_input_hash(filepath, params, ["架构", "蓝图"])
+    other_model = compute_prompt_input_hash(
+        filepath, {**params, "llm": {"model_name": "model-b", "temperature": 0.7}}, ["架构", "蓝图"]
+    )
+    other_temperature = compute_prompt_input_hash(
+        filepath, {**params, "llm": {"model_name": "model-a", "temperature": 0.2}}, ["架构", "蓝图"]
+    )
+    assert len({first, other_model, other_temperature}) == 3
+    assert compute_prompt_input_hash(filepath, params, ["架构", "蓝图"]) == first
+
+    save_prompt_artifacts(filepath, 3, first, {"prompt_text": "提示词"})
+    assert load_prompt_artifacts(filepath, 3, first)["prompt_text"] == "提示词"
+    assert load_prompt_artifacts(filepath, 3, other_model) is None
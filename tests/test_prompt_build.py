@@ -0,0 +1,120 @@
+# tests/test_prompt_build.py
+# -*- coding: utf-8 -*-
+import logging
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import embedding_adapters
+from chapter_directory_parser import BLUEPRINT_FILE
+from novel_generator import chapter
+from novel_generator.common import TaskCancelledError
+from novel_generator.prompt_artifacts import load_prompt_artifacts
+
+BLUEPRINT = (
+    "第1章 - 下山\n本章简述：少年下山\n"
+    "第2章 - 集市\n本章简述：集市风波\n"
+    "第3章 - 夜袭\n本章简述：夜袭客栈\n"
+)
+KEYWORDS = "青锋剑·来历\n集市·风波\n客栈·夜袭\n玉佩·身世"
+
+
+def _build(project_dir, **overrides):
+    kwargs = dict(
+        api_key="key",
+        base_url="http://localhost",
+        model_name="model-a",
+        filepath=str(project_dir),
+        novel_number=2,
+        word_number=3000,
+        temperature=0.7,
+        user_guidance="",
+        characters_involved="林风",
+        key_items="青锋剑",
+        scene_location="集市",
+        time_constraint="",
+        embedding_api_key="key",
+        embedding_url="http://localhost",
+        embedding_interface_format="local",
+        embedding_model_name="hash",
+        embedding_retrieval_k=2,
+        reuse_artifacts=False,
+    )
+    kwargs.update(overrides)
+    return chapter.build_chapter_prompt_artifacts(**kwargs)
+
+
+@pytest.fixture
+def stubbed(project_dir, monkeypatch):
+    """以桩函数替换 LLM 与检索；检索按查询延迟不同时长，使并行时完成顺序与提交顺序不同。"""
+    (project_dir / BLUEPRINT_FILE).write_text(BLUEPRINT, encoding="utf-8")
+    (project_dir / "Novel_architecture.txt").write_text("架构", encoding="utf-8")
+    (project_dir / "character_state.txt").write_text("林风：\n├──物品\n│  └──青锋剑：师父所赠", encoding="utf-8")
+    (project_dir / "chapters" / "chapter_1.txt").write_text("林风下山。", encoding="utf-8")
+    failures = {}
+    queries = []
+
+    def retrieve(embedding_adapter, query, filepath, k, retrieval_mode, max_tokens, chapters):
+        queries.append(query)
+        time.sleep(0.05 / (len(queries) + 1))
+        if query in failures:
+            raise failures[query]
+        return f"片段：{query}"
+
+    monkeypatch.setattr(chapter, "summarize_recent_chapters", lambda **kwargs: "前文摘要")
+    monkeypatch.setattr(chapter, "create_llm_adapter", lambda **kwargs: object())
+    monkeypatch.setattr(chapter, "invoke_with_cleaning_streaming", lambda *args, **kwargs: KEYWORDS)
+    monkeypatch.setattr(embedding_adapters, "get_embedding_adapter", lambda *args: object())
+    monkeypatch.setattr(
+        chapter, "load_vector_store", lambda *args: SimpleNamespace(_collection=SimpleNamespace(count=lambda: 10))
+    )
+    monkeypatch.setattr(chapter, "get_relevant_context_from_vector_store", retrieve)
+    monkeypatch.setattr(
+        chapter, "get_filtered_knowledge_context", lambda **kwargs: "\n".join(kwargs["retrieved_texts"])
+    )
+    return SimpleNamespace(failures=failures, queries=queries)
+
+
+def test_concurrent_build_matches_the_sequential_build(stubbed, project_dir, monkeypatch):
+    concurrent = _build(project_dir)
+    monkeypatch.setattr(chapter, "PROMPT_BUILD_WORKERS", 1)
+    sequential = _build(project_dir)
+
+    assert concurrent["prompt_text"] == sequential["prompt_text"]
+    assert concurrent["filtered_context"] == sequential["filtered_context"]
+    assert concurrent["filtered_context"].splitlines()[0] == "[PRIOR] [GENERAL] 片段：青锋剑 来历（优先使用）"
+    assert len(stubbed.queries) == 2 * (4 + 2)
+    assert {"recent_summary_seconds", "speculative_retrieval_seconds", "retrieval_seconds"} <= set(
+        concurrent["timings"]
+    )
+
+
+# 关键词组检索与蓝图预检索（章节标题 + 简述）各自失败
+@pytest.mark.parametrize("failing_query", ["集市 风波", "集市 集市风波"], ids=["keyword-group", "speculative"])
+def test_worker_failure_degrades_the_build_and_is_not_persisted(stubbed, project_dir, failing_query, caplog):
+    stubbed.failures[failing_query] = RuntimeError("检索失败")
+
+    with caplog.at_level(logging.ERROR):
+        result = _build(project_dir)
+
+    assert result["filtered_context"] == "（知识库处理失败）"
+    assert "检索失败" in caplog.text
+    assert load_prompt_artifacts(str(project_dir), 2, result["input_hash"]) is None
+
+
+def test_cancellation_inside_a_worker_reaches_the_caller(stubbed, project_dir):
+    stubbed.failures["客栈 夜袭"] = TaskCancelledError("任务已取消")
+
+    with pytest.raises(TaskCancelledError):
+        _build(project_dir)
+
+
+def test_file_stage_failure_reaches_the_caller(stubbed, project_dir, monkeypatch):
+    def broken(filepath, novel_number):
+        raise OSError("摘要文件损坏")
+
+    monkeypatch.setattr(chapter, "select_summary_context", broken)
+
+    with pytest.raises(OSError, match="摘要文件损坏"):
+        _build(project_dir)
@@ -0,0 +1,112 @@
+# tests/test_summary_store.py
+# -*- coding: utf-8 -*-
+import os
+import re
+
+import pytest
+
+from novel_generator import summary_store
+from novel_generator.summary_store import (
+    GLOBAL_SUMMARY_FILE,
+    SUMMARY_STORE_FILE,
+    load_summary_store,
+    save_summary_store,
+    select_summary_context,
+    update_summary_store,
+)
+
+_CHAPTER_PROMPT_PATTERN = re.compile(r"以下是第(\d+)章")
+
+
+class FakeSummaryLLM:
+    """按提示词类型返回固定格式的摘要，arc_results 依次作为分卷汇总的返回值。"""
+
+    def __init__(self, arc_results=None):
+        self.calls = []
+        self.prompts = []
+        self.arc_results = list(arc_results or [])
+
+    def __call__(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        if "的逐章摘要" in prompt:
+            self.calls.append("arc")
+            result = self.arc_results.pop(0) if self.arc_results else "分卷概要"
+            if isinstance(result, Exception):
+                raise result
+            return result
+        if prompt.startswith("这是当前的全书梗概"):
+            self.calls.append("synopsis")
+            return "全书梗概"
+        self.calls.append("chapter")
+        return "摘要" + _CHAPTER_PROMPT_PATTERN.match(prompt).group(1)
+
+
+@pytest.fixture(autouse=True)
+def small_arcs(monkeypatch):
+    monkeypatch.setattr(summary_store, "SUMMARY_ARC_CHAPTERS", 2)
+
+
+def _finalize(filepath: str, number: int, llm, partial=None) -> dict:
+    """模拟定稿：计算后在写入阶段保存存储与视图。"""
+    result = update_summary_store(filepath, number, f"第{number}章正文", llm, partial=partial)
+    rendered = save_summary_store(filepath, result["store"])
+    with open(os.path.join(filepath, GLOBAL_SUMMARY_FILE), "w", encoding="utf-8") as handle:
+        handle.write(rendered)
+    return result
+
+
+def test_update_does_not_write_until_the_store_is_saved(tmp_path):
+    filepath = str(tmp_path)
+    result = update_summary_store(filepath, 1, "第1章正文", FakeSummaryLLM())
+
+    assert not os.path.exists(os.path.join(filepath, SUMMARY_STORE_FILE))
+    assert result["store"]["chapters"]["1"]["summary"] == "摘要1"
+
+    save_summary_store(filepath, result["store"])
+    assert load_summary_store(filepath)["chapters"]["1"]["summary"] == "摘要1"
+
+
+def test_retry_reuses_calls_that_already_succeeded(tmp_path):
+    filepath = str(tmp_path)
+    _finalize(filepath, 1, FakeSummaryLLM())
+    llm = FakeSummaryLLM(arc_results=[RuntimeError("timeout")])
+    partial = {}
+
+    with pytest.raises(RuntimeError):
+        update_summary_store(filepath, 2, "第2章正文", llm, partial=partial)
+    result = update_summary_store(filepath, 2, "第2章正文", llm, partial=partial)
+
+    assert llm.calls == ["chapter", "arc", "arc", "synopsis"]
+    assert result["arc_index"] == 1
+
+
+def test_empty_rollup_keeps_chapters_in_context_and_is_retried(tmp_path):
+    filepath = str(tmp_path)
+    _finalize(filepath, 1, FakeSummaryLLM())
+    result = _finalize(filepath, 2, FakeSummaryLLM(arc_results=[""]))
+
+    assert result["arc_index"] is None
+    context = select_summary_context(filepath, 3)
+    assert "第1章：摘要1" in context and "第2章：摘要2" in context
+
+    llm = FakeSummaryLLM()
+    result = _finalize(filepath, 3, llm)
+    assert result["arc_index"] == 1
+    assert llm.calls == ["chapter", "arc", "synopsis"]
+    assert "第1卷" in select_summary_context(filepath, 4)
+
+
+def test_manual_edits_to_the_global_summary_are_honoured(tmp_path):
+    filepath = str(tmp_path)
+    _finalize(filepath, 1, FakeSummaryLLM())
+    path = os.path.join(filepath, GLOBAL_SUMMARY_FILE)
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.write("作者手动改写的梗概")
+
+    assert select_summary_context(filepath, 2) == "作者手动改写的梗概"
+
+    llm = FakeSummaryLLM()
+    result = update_summary_store(filepath, 2, "第2章正文", llm)
+    assert result["store"]["chapters"]["1"]["summary"] == "摘要1"
+    assert result["synopsis_updated"]
+    assert "作者手动改写的梗概" in llm.prompts[-1]
@@ -0,0 +1,70 @@
+# tests/test_text_segmenter.py
+# -*- coding: utf-8 -*-
+import pytest
+
+from novel_generator.text_segmenter import chunk_text, segment_sentences
+
+
+def _texts(spans):
+    return [span.text for span in spans]
+
+
+def test_chinese_and_english_sentences_with_repeated_terminators():
+    text = "他停下脚步。真的吗？！She left... Then it rained.\n新的段落"
+
+    assert _texts(segment_sentences(text)) == ["他停下脚步。", "真的吗？！", "She left...", "Then it rained.", "新的段落"]
+
+
+def test_decimal_points_and_abbreviations_do_not_split():
+    text = "圆周率约为3.14，e.g.这样写。下一句"
+
+    assert _texts(segment_sentences(text)) == ["圆周率约为3.14，e.g.这样写。", "下一句"]
+
+
+def test_terminators_inside_quotes_stay_in_one_sentence():
+    text = "他说：“快走！别回头。”她点头。「好？」"
+
+    assert _texts(segment_sentences(text)) == ["他说：“快走！别回头。”", "她点头。", "「好？」"]
+
+
+def test_newline_resets_an_unclosed_quote():
+    text = "“没有闭合的引号\n下一行。再一句。"
+
+    assert _texts(segment_sentences(text)) == ["“没有闭合的引号", "下一行。", "再一句。"]
+
+
+def test_spans_are_slices_of_the_source():
+    text = "  第一句。  第二句！\n\n  第三句  "
+
+    for span in segment_sentences(text):
+        assert text[span.start:span.end] == span.text
+        assert span.text == span.text.strip()
+    assert segment_sentences("") == []
+    assert segment_sentences(" \n ") == []
+
+
+@pytest.mark.parametrize("max_length", [5, 12, 40])
+def test_chunks_respect_max_length_and_keep_offsets(max_length):
+    text = "甲乙丙丁。" * 6 + "一个没有标点而且非常非常长的句子" * 2
+
+    chunks = chunk_text(text, max_length=max_length)
+
+    assert chunks
+    for chunk in chunks:
+        assert len(chunk.text) <= max_length
+        assert text[chunk.start:chunk.end] == chunk.text
+    assert "".join(chunk.text for chunk in chunks) == text
+
+
+def test_overlap_carries_whole_trailing_sentences():
+    text = "一二三。四五六。七八九。十十十。"
+
+    chunks = chunk_text(text, max_length=8, overlap=4)
+
+    assert _texts(chunks) == ["一二三。四五六。", "四五六。七八九。", "七八九。十十十。"]
+
+
+def test_overlap_is_clamped_below_max_length():
+    chunks = chunk_text("一二三。四五六。七八九。", max_length=4, overlap=10)
+
+    assert _texts(chunks) == ["一二三。", "四五六。", "七八九。"]
@@ -0,0 +1,106 @@
+# tests/test_token_budget.py
+# -*- coding: utf-8 -*-
+import pytest
+
+from novel_generator import token_budget
+from novel_generator.token_budget import (
+    TRUNCATION_MARKER,
+    PromptSection,
+    assemble_prompt,
+    count_tokens,
+    fit_sections,
+    input_token_budget,
+    resolve_context_window,
+    truncate_to_tokens,
+)
+
+
+@pytest.fixture(params=["tiktoken", "heuristic"])
+def tokenizer(request, monkeypatch):
+    if request.param == "heuristic":
+        monkeypatch.setattr(token_budget, "_encoding", None)
+        monkeypatch.setattr(token_budget, "_encoding_loaded", True)
+    elif token_budget._get_encoding() is None:
+        pytest.skip("tiktoken not installed")
+    return request.param
+
+
+def test_heuristic_counts_cjk_per_char_and_latin_per_four_chars(monkeypatch):
+    monkeypatch.setattr(token_budget, "_encoding", None)
+    monkeypatch.setattr(token_budget, "_encoding_loaded", True)
+    assert count_tokens("青霄剑宗") == 4
+    assert count_tokens("abcdefgh") == 2
+    assert count_tokens("") == 0
+
+
+def test_truncate_keeps_head_or_tail_within_limit(tokenizer):
+    text = "天地玄黄，宇宙洪荒。" * 50
+    head = truncate_to_tokens(text, 30)
+    tail = truncate_to_tokens(text, 30, keep="tail")
+
+    assert count_tokens(head) <= 30 and head.endswith(TRUNCATION_MARKER)
+    assert count_tokens(tail) <= 30 and tail.startswith(TRUNCATION_MARKER)
+    assert text.startswith(head[: -len(TRUNCATION_MARKER)])
+    assert text.endswith(tail[len(TRUNCATION_MARKER):])
+    assert truncate_to_tokens("短文本", 30) == "短文本"
+
+
+def test_input_budget_reserves_output_and_margin():
+    assert resolve_context_window(None) == token_budget.DEFAULT_CONTEXT_WINDOW
+    assert resolve_context_window("-5") == token_budget.DEFAULT_CONTEXT_WINDOW
+    assert input_token_budget(8000, 2000) == 8000 - 2000 - 400
+    assert input_token_budget(8000, 100000) == 8000 - 4000 - 400
+
+
+def test_fit_sections_applies_absolute_caps_and_trims_lowest_priority_first(tokenizer):
+    sections = [
+        PromptSection("low", "低" * 2000, priority=0),
+        PromptSection("high", "高" * 2000, priority=1, min_tokens=50),
+        PromptSection("capped", "限" * 2000, priority=2, max_tokens=100),
+    ]
+    texts, report = fit_sections(sections, 1000)
+
+    assert report["capped"]["tokens"] <= 100
+    assert sum(item["tokens"] for item in report.values()) <= 1000
+    assert report["low"]["tokens"] < report["high"]["tokens"]
+    assert texts["high"].startswith("高")
+
+    # 窗口很大时绝对上限仍然生效
+    _, report = fit_sections(sections, 1_000_000)
+    assert report["capped"]["tokens"] <= 100
+    assert report["low"]["tokens"] == report["low"]["original_tokens"]
+
+
+def test_assemble_prompt_reports_trimmed_sections(tokenizer):
+    prompt, report = assemble_prompt(
+        "标题：{title}\n{body}",
+        [PromptSection("body", "正文" * 5000, priority=0)],
+        context_window=2048,
+        max_output_tokens=512,
+        title="第一章",
+    )
+
+    assert prompt.startswith("标题：第一章")
+    assert report["trimmed"] == ["body"]
+    assert report["prompt_tokens"] <= report["input_budget"]
+
+
+@pytest.mark.parametrize(
+    "summary, truncated",
+    [("The hero reached the pass and waited. " * 80, False), ("主角在山门前拜师学艺，" * 400, True)],
+    ids=["long-latin-under-cap", "cjk-over-cap"],
+)
+def test_recent_summary_is_capped_by_tokens_not_characters(tokenizer, monkeypatch, summary, truncated):
+    from novel_generator import chapter
+
+    monkeypatch.setattr(chapter, "create_llm_adapter", lambda **kwargs: object())
+    monkeypatch.setattr(chapter, "invoke_with_cleaning_streaming", lambda *args, **kwargs: "当前章节摘要:" + summary)
+
+    result = chapter.summarize_recent_chapters(
+        "openai", "key", "http://localhost", "model", 0.7, 1024, ["前文"], 2, {}, {}
+    )
+
+    assert count_tokens(result) <= chapter.SUMMARY_OUTPUT_MAX_TOKENS
+    assert result.endswith(TRUNCATION_MARKER) is truncated
+    if not truncated:
+        assert result == summary.strip()
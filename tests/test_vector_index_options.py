@@ -0,0 +1,33 @@
+# tests/test_vector_index_options.py
+# -*- coding: utf-8 -*-
+import os
+
+from novel_generator.vectorstore_manager import apply_vector_index_options
+from novel_generator.vectorstore_utils import (
+    CHROMA_DB_FILE,
+    get_vectorstore_dir,
+    load_vector_index_options,
+    load_vector_store,
+    vector_store_exists,
+)
+
+
+def test_apply_options_without_store_does_not_create_chroma_db(tmp_path):
+    report = apply_vector_index_options(str(tmp_path), {"mode": "hnsw", "M": 32})
+
+    assert report == {"options": report["options"], "rebuilt": False, "documents": 0}
+    assert report["options"]["mode"] == "hnsw"
+    assert not os.path.exists(os.path.join(get_vectorstore_dir(str(tmp_path)), CHROMA_DB_FILE))
+    assert not vector_store_exists(str(tmp_path))
+    assert load_vector_store(None, str(tmp_path)) is None
+
+
+def test_partial_update_keeps_stored_options(tmp_path):
+    apply_vector_index_options(str(tmp_path), {"mode": "hnsw", "M": 32, "construction_ef": 200})
+    apply_vector_index_options(str(tmp_path), {"search_ef": 64})
+
+    options = load_vector_index_options(str(tmp_path))
+    assert options["mode"] == "hnsw"
+    assert options["M"] == 32
+    assert options["construction_ef"] == 200
+    assert options["search_ef"] == 64